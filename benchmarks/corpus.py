@@ -0,0 +1,65 @@
+"""
+Фразы из сценариев ручного тестирования (tests/*.md) для замеров.
+
+Фраза - содержимое блока ``` ... ```. Для каждой фразы известны файл сценария
+(create_note, search, ...) и ближайший заголовок над ней.
+"""
+import os
+import re
+from typing import Dict, List
+
+TESTS_DIRECTORY = "tests"
+
+
+def load_phrases(directory: str = TESTS_DIRECTORY) -> List[Dict[str, str]]:
+    """
+    :return: [{"text": фраза, "scenario": имя файла без .md, "section": заголовок}]
+             в порядке следования в файлах, без повторов
+    """
+    phrases, seen = [], set()
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(".md"):
+            continue
+        with open(os.path.join(directory, file_name), encoding="utf-8") as f:
+            content = f.read()
+        scenario = file_name[:-3]
+        section = ""
+        for match in re.finditer(r"^(#+)[ \t]*([^\n]+)$|^```\n(.*?)\n```", content, flags=re.M | re.S):
+            if match.group(2):
+                section = match.group(2).strip()
+                continue
+            text = match.group(3).strip()
+            if text and (scenario, text) not in seen:
+                seen.add((scenario, text))
+                phrases.append({"text": text, "scenario": scenario, "section": section})
+    return phrases
+
+
+# Намерение фраз сценария (промпт query_parser)
+SCENARIO_INTENTS = {"create_list": "create_list", "create_note": "create_note",
+                    "create_remidser": "create_reminder", "search": "search"}
+# Разделы сценария поиска с тестовыми данными: это заметки и создание списков, а не вопросы
+DATA_SECTIONS = {"Тестовые данные", "Расходы", "Кладовка"}
+CREATE_LIST = re.compile(r"^(создай|сделай|добавь|новый)\s+(список|папку|раздел)\b")
+
+
+def load_intents(directory: str = TESTS_DIRECTORY) -> List[Dict[str, str]]:
+    """
+    Фразы сценариев с намерением для проверки определения намерения.
+
+    :return: [{"text": фраза, "action": намерение, "scenario": имя файла, "section": заголовок}],
+             фраза, повторенная в нескольких сценариях, - один раз
+    """
+    intents, seen = [], set()
+    for phrase in load_phrases(directory):
+        action = SCENARIO_INTENTS.get(phrase["scenario"])
+        key = " ".join(phrase["text"].lower().replace("ё", "е").split())
+        if action is None or phrase["text"].startswith("✅") or key in seen:
+            continue
+        seen.add(key)
+        if CREATE_LIST.match(phrase["text"].lower()):
+            action = "create_list"
+        elif action == "search" and phrase["section"] in DATA_SECTIONS:
+            action = "create_note"
+        intents.append(dict(phrase, action=action))
+    return intents
@@ -0,0 +1,96 @@
+"""
+Сравнение бэкендов модели эмбеддингов (embedding_backend.py) на CPU.
+
+Для каждого бэкенда:
+- загрузка модели (с экспортом/квантизацией при первом запуске);
+- задержка эмбеддинга одного запроса (p50 / p95);
+- пропускная способность пакетного эмбеддинга (фраз в секунду);
+- качество поиска относительно torch: средний косинус между векторами одной фразы
+  и доля совпадения top-k соседей каждой фразы (recall@k).
+
+Корпус - фразы из сценариев tests/*.md (заметки, запросы, напоминания).
+
+Запуск из корня проекта:
+    python -m benchmarks.embedding_backends
+    python -m benchmarks.embedding_backends --backends torch onnx-int8 --threads 4 --k 5
+"""
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+from config import MODEL_NAME, ONNX_DIRECTORY, EMBEDDING_QUANTIZATION
+from embedding_backend import BACKENDS, create_embeddings
+from benchmarks.corpus import load_phrases
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def neighbours(vectors: np.ndarray, k: int) -> np.ndarray:
+    """Индексы k ближайших (по косинусу) фраз для каждой фразы, без нее самой."""
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, -np.inf)
+    return np.argsort(-similarity, axis=1)[:, :k]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение бэкендов модели эмбеддингов")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--threads", type=int, default=None, help="потоков на вычисление, по умолчанию - все ядра")
+    parser.add_argument("--k", type=int, default=5, help="соседей для recall@k")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов пакетного эмбеддинга")
+    args = parser.parse_args()
+
+    texts = [phrase["text"].lower() for phrase in load_phrases()]
+    print(f"Корпус: {len(texts)} фраз, модель {MODEL_NAME}, потоков: {args.threads or 'все'}\n")
+
+    results = {}
+    for backend in args.backends:
+        started = time.perf_counter()
+        model = create_embeddings(MODEL_NAME, backend=backend, threads=args.threads,
+                                  onnx_dir=ONNX_DIRECTORY, quantization=EMBEDDING_QUANTIZATION)
+        model.embed_query("прогрев")
+        load = time.perf_counter() - started
+
+        latencies = []
+        for text in texts:
+            started = time.perf_counter()
+            model.embed_query(text)
+            latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            vectors = model.embed_documents(texts)
+        batch = (time.perf_counter() - started) / args.repeat
+
+        results[backend] = normalize(np.array(vectors, dtype=np.float32))
+        print(f"[{backend}]")
+        print(f"  Загрузка:          {load:.2f} с")
+        print(f"  Запрос p50 / p95:  {statistics.median(latencies) * 1000:.1f} / "
+              f"{percentile(latencies, 0.95) * 1000:.1f} мс")
+        print(f"  Пакет:             {len(texts) / batch:.0f} фраз/с")
+
+    base = results.get("torch")
+    if base is None:
+        return
+    base_neighbours = neighbours(base, args.k)
+    print(f"\nКачество относительно torch:")
+    for backend, vectors in results.items():
+        if backend == "torch":
+            continue
+        cosine = float(np.mean(np.sum(base * vectors, axis=1)))
+        found = neighbours(vectors, args.k)
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(base_neighbours, found)])
+        print(f"  {backend:10} косинус {cosine:.4f}, recall@{args.k} {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
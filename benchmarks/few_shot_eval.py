@@ -0,0 +1,130 @@
+"""
+Проверка подбора примеров промптов под запрос (models/few_shot.py) на фразах
+сценариев tests/*.md.
+
+Для каждого промпта с примерами (<-examples->):
+- токены промпта со всеми примерами и с подобранными (среднее / p95, экономия);
+- время подбора примеров (эмбеддинг запроса и выбор);
+- с --llm: ответы модели с обоими вариантами промпта, совпадение разбора
+  (флаги поиска и намерение) и задержка. Эталон - промпт со всеми примерами.
+
+Запуск из корня проекта:
+    python -m benchmarks.few_shot_eval
+    python -m benchmarks.few_shot_eval --tokens 300 --k 3 --show 5
+    python -m benchmarks.few_shot_eval --llm --prompts search   # запросы к модели
+"""
+import time
+import json
+import argparse
+
+from config import (MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_THREADS, ONNX_DIRECTORY, EMBEDDING_QUANTIZATION,
+                    CONTEXT_ENCODING, FEW_SHOT_K, FEW_SHOT_K_BY_PROMPT, FEW_SHOT_TOKENS)
+from embedding_backend import create_embeddings
+from models.few_shot import MARKER, FewShotSelector, examples_path, fill_examples
+from benchmarks.corpus import load_intents
+
+# Промпт: намерение фраз, на которых он проверяется (None - все фразы)
+PROMPTS = {"search": "search", "search_combined": None}
+ADDITION = "Имеющиеся списки (папки):\nзаметка, покупка, расход, кладовка"
+FLAGS = ("need_filter", "query_is_about_lists", "need_count", "semantic", "need_analysis", "need_calculation")
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def summary(prompt_name: str, answer):
+    """Часть ответа, по которой сравниваются варианты промпта."""
+    if answer is None:
+        return None
+    if prompt_name == "search_combined":
+        search = answer.get("search") or {}
+        return answer.get("action"), tuple(search.get(flag, 0) for flag in FLAGS)
+    return tuple(answer.get(flag, 0) for flag in FLAGS)
+
+
+def ask(prompt_name: str, instructions: str, text: str):
+    """(разобранный ответ, сек.) модели на промпт с заданной User частью."""
+    from config import provider_client
+    from functions import extract_json_to_dict
+    from models.structured_output import COMBINED_RESPONSE_FORMAT, parse_combined
+
+    provider_client.load_prompt(prompt_name)
+    provider_client.instructions = instructions
+    provider_client.route(f"{prompt_name}:few_shot_eval", default="gpt-4.1-mini")
+    combined = prompt_name == "search_combined"
+    started = time.perf_counter()
+    answer = provider_client.chat_sync(" " + text, addition=ADDITION,
+                                       response_format=COMBINED_RESPONSE_FORMAT if combined else None)
+    seconds = time.perf_counter() - started
+    if not answer:
+        return None, seconds
+    return (parse_combined(answer) if combined else extract_json_to_dict(answer)), seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Проверка подбора примеров промптов под запрос")
+    parser.add_argument("--prompts", nargs="+", default=list(PROMPTS), choices=PROMPTS)
+    parser.add_argument("--k", type=int, default=FEW_SHOT_K, help="примеров в промпте")
+    parser.add_argument("--tokens", type=int, default=FEW_SHOT_TOKENS, help="бюджет токенов примеров")
+    parser.add_argument("--show", type=int, default=0, help="показать подобранные примеры для первых N фраз")
+    parser.add_argument("--llm", action="store_true", help="сравнить ответы модели (запросы к модели)")
+    args = parser.parse_args()
+
+    from models.provider_client import read_prompt
+
+    embeddings = create_embeddings(MODEL_NAME, backend=EMBEDDING_BACKEND, threads=EMBEDDING_THREADS,
+                                   onnx_dir=ONNX_DIRECTORY, quantization=EMBEDDING_QUANTIZATION)
+    selector = FewShotSelector(embeddings, k=args.k, budget=args.tokens, k_by_prompt=FEW_SHOT_K_BY_PROMPT,
+                               encoding=CONTEXT_ENCODING)
+    phrases = load_intents()
+
+    for prompt_name in args.prompts:
+        action = PROMPTS[prompt_name]
+        texts = [phrase["text"] for phrase in phrases if action is None or phrase["action"] == action]
+        system_prompt, instructions = read_prompt(prompt_name)
+        static = fill_examples(instructions, prompt_name)
+        static_tokens = selector.count_tokens(system_prompt) + selector.count_tokens(static)
+
+        dynamic, tokens, latencies = [], [], []
+        for text in texts:
+            started = time.perf_counter()
+            filled = selector.fill(instructions, prompt_name, text)
+            latencies.append(time.perf_counter() - started)
+            dynamic.append(filled)
+            tokens.append(selector.count_tokens(system_prompt) + selector.count_tokens(filled))
+
+        mean = sum(tokens) / len(tokens)
+        print(f"{prompt_name}: фраз {len(texts)}, модель эмбеддингов {MODEL_NAME} ({EMBEDDING_BACKEND})")
+        print(f"  токенов промпта: все примеры {static_tokens}, подобранные {mean:.0f} "
+              f"(p95 {percentile(tokens, 0.95)}), экономия {(1 - mean / static_tokens) * 100:.1f}%")
+        print(f"  подбор примеров, мс: p50 {percentile(latencies, 0.5) * 1000:.1f}, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.1f}")
+        path = examples_path(prompt_name, MARKER.search(instructions).group(1))
+        for text in texts[:args.show]:
+            print(f"  {text[:60]!r}:")
+            for example in selector.select(path, text):
+                print(f"      {example.splitlines()[0][:100]}")
+
+        if args.llm:
+            same, static_latency, dynamic_latency = 0, [], []
+            for text, filled in zip(texts, dynamic):
+                reference, seconds = ask(prompt_name, static, text)
+                static_latency.append(seconds)
+                answer, seconds = ask(prompt_name, filled, text)
+                dynamic_latency.append(seconds)
+                if summary(prompt_name, reference) == summary(prompt_name, answer):
+                    same += 1
+                else:
+                    print(f"  расхождение {text[:60]!r}: "
+                          f"{json.dumps(summary(prompt_name, reference), ensure_ascii=False)} -> "
+                          f"{json.dumps(summary(prompt_name, answer), ensure_ascii=False)}")
+            print(f"  совпадение разбора с промптом со всеми примерами: {same / len(texts):.3f}")
+            print(f"  задержка, мс: все примеры p50 {percentile(static_latency, 0.5) * 1000:.0f}, "
+                  f"подобранные p50 {percentile(dynamic_latency, 0.5) * 1000:.0f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
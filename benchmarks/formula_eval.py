@@ -0,0 +1,56 @@
+"""
+Замер вычисления формул в ответах llm_smart: eval("f'" + текст + "'") и safe_eval.render.
+
+Для каждого способа - время на ответ (мкс): render без кэша (разбор и проверка
+каждый раз) и с кэшем разобранных текстов; совпадение результатов с eval.
+
+Запуск из корня проекта:
+    python -m benchmarks.formula_eval
+    python -m benchmarks.formula_eval --repeat 20000
+"""
+import time
+import argparse
+
+from safe_eval import render, compile_template
+
+# Типичные ответы модели: формулы над числами записей и над итогами (ContextBuilder.aggregates)
+TEMPLATES = [
+    "Средний расход за июнь 2025 года составляет {round(sum([25, 3, 47.5, 120, 89.9]) / 5, 2)} рублей.",
+    "Всего потрачено {round(1500 + 45.5 + 89 + 320 + 1250.75, 2)} рублей, "
+    "самая большая покупка {max([1500, 45.5, 89])}.",
+    "На бензин ушло {round(1500 / (1500 + 45.5 + 89) * 100, 1)}% расходов.",
+    "Всего потрачено {money_rub_sum} рублей, в среднем {round(money_rub_avg, 2)} за покупку.",
+    "В кладовке {notes_count} вещей.",
+]
+NAMES = {"money_rub_sum": 1634.5, "money_rub_avg": 544.8333333333334, "notes_count": 12}
+
+
+def per_call(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Замер вычисления формул ответа")
+    parser.add_argument("--repeat", type=int, default=5000, help="повторов каждого ответа")
+    args = parser.parse_args()
+
+    print(f"{'ответ':50} {'eval':>8} {'render':>8} {'кэш':>8}  совпадает")
+    for template in TEMPLATES:
+        expected = eval("f'" + template + "'", {}, dict(NAMES))
+        result = render(template, NAMES)
+
+        def cold():
+            compile_template.cache_clear()
+            render(template, NAMES)
+
+        eval_time = per_call(lambda: eval("f'" + template + "'", {}, dict(NAMES)), args.repeat)
+        cold_time = per_call(cold, args.repeat)
+        cached_time = per_call(lambda: render(template, NAMES), args.repeat)
+        print(f"{template[:50]:50} {eval_time:8.1f} {cold_time:8.1f} {cached_time:8.1f}  {result == expected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Профиль времени импорта модулей проекта (python -X importtime).
+
+Показывает общее время импорта, самые долгие модули и какие тяжелые
+библиотеки (torch, chroma, openai, ...) загружаются при импорте.
+Каждый модуль импортируется в отдельном процессе, чтобы кэш не искажал замер.
+
+Запуск из корня проекта:
+    python -m benchmarks.import_profile
+    python -m benchmarks.import_profile --modules config functions user --top 20
+"""
+import sys
+import argparse
+import subprocess
+from typing import List, Tuple
+
+# Библиотеки, которые не должны загружаться при импорте config
+HEAVY = ("torch", "sentence_transformers", "transformers", "langchain_chroma", "chromadb",
+         "langchain_huggingface", "openai", "langsmith", "apscheduler", "httpx", "sqlalchemy")
+MARKER = "--- import profile ---"
+
+
+def profile(module: str) -> Tuple[float, List[Tuple[float, float, str]], List[str]]:
+    """
+    Импортирует модуль в отдельном процессе с -X importtime.
+    Модули, загружаемые при старте интерпретатора (site и т.п.), не учитываются.
+
+    :return: (общее время в сек.,
+              [(собственное время, накопленное время, модуль)] в сек.,
+              загруженные тяжелые библиотеки)
+    """
+    code = (f"import sys\n"
+            f"sys.stderr.write('{MARKER}\\n')\n"
+            f"import {module}\n"
+            f"print(','.join(m for m in {HEAVY!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    # Строки importtime выводятся по мере импорта: все после метки относится к замеру
+    lines = result.stderr.splitlines()
+    start = lines.index(MARKER) if MARKER in lines else -1
+    rows = []
+    for line in lines[start + 1:]:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(self_us) / 1e6, int(cumulative_us) / 1e6, name.rstrip()))
+
+    # Модули верхнего уровня (без отступа) в сумме дают все время импорта
+    total = sum(cumulative for _, cumulative, name in rows if not name.startswith("  "))
+    heavy = [m for m in result.stdout.strip().split(",") if m]
+    return total, rows, heavy
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Профиль времени импорта")
+    parser.add_argument("--modules", nargs="+", default=["config", "functions", "user", "commands"],
+                        help="модули для замера")
+    parser.add_argument("--top", type=int, default=10, help="самых долгих модулей в выводе")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        print(f"\n=== import {module}")
+        try:
+            total, rows, heavy = profile(module)
+        except RuntimeError as e:
+            print(f"⚠️ Не импортируется: {e}")
+            continue
+        print(f"Время импорта:       {total:.3f} с")
+        print(f"Тяжелые библиотеки:  {', '.join(heavy) or 'нет'}")
+        print(f"Самые долгие (накопленное / собственное время, с):")
+        for self_time, cumulative, name in sorted(rows, key=lambda row: row[1], reverse=True)[:args.top]:
+            print(f"  {cumulative:7.3f} {self_time:7.3f}  {name.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Проверка локального определения намерения (models/intent_classifier.py) на фразах
+сценариев tests/*.md: точность, доля запросов без модели при пороге уверенности,
+калибровка уверенности и задержка. С --llm то же для промпта query_parser.
+
+Классификатор проверяется перекрестно: фразы делятся на части, каждая часть
+классифицируется по примерам остальных (в примерах нет проверяемой фразы).
+
+Запуск из корня проекта:
+    python -m benchmarks.intent_eval
+    python -m benchmarks.intent_eval --threshold 0.8 --k 5
+    python -m benchmarks.intent_eval --llm          # сравнение с query_parser (запросы к модели)
+    python -m benchmarks.intent_eval --seed         # записать фразы в примеры рабочей базы
+"""
+import os
+import time
+import json
+import random
+import argparse
+import tempfile
+
+import numpy as np
+
+from config import (MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_THREADS, ONNX_DIRECTORY, EMBEDDING_QUANTIZATION,
+                    INTENT_K, INTENT_TEMPERATURE, INTENT_THRESHOLD)
+from sql_db import SQLiteClient
+from create_tables import SQLiteTableCreator
+from embedding_backend import create_embeddings
+from models.intent_classifier import IntentClassifier
+from benchmarks.corpus import load_intents
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+class CachedEmbeddings:
+    """Эмбеддинги фраз считаются один раз на все части проверки."""
+
+    def __init__(self, model):
+        self.model = model
+        self.cache = {}
+
+    def embed_documents(self, texts):
+        missing = [text for text in texts if text not in self.cache]
+        if missing:
+            self.cache.update(zip(missing, self.model.embed_documents(missing)))
+        return [self.cache[text] for text in texts]
+
+    def embed_query(self, text):
+        if text not in self.cache:
+            self.cache[text] = self.model.embed_query(text)
+        return self.cache[text]
+
+
+def folds(phrases, count: int, seed: int):
+    """Части с одинаковой долей намерений в каждой."""
+    rng = random.Random(seed)
+    parts = [[] for _ in range(count)]
+    by_action = {}
+    for phrase in phrases:
+        by_action.setdefault(phrase["action"], []).append(phrase)
+    position = 0
+    for group in by_action.values():
+        rng.shuffle(group)
+        for phrase in group:
+            parts[position % count].append(phrase)
+            position += 1
+    return parts
+
+
+def evaluate_local(phrases, embeddings, args):
+    """[(фраза, намерение, уверенность, сек.)] по перекрестной проверке."""
+    results = []
+    directory = tempfile.mkdtemp(prefix="intent_eval_")
+    for number, test in enumerate(folds(phrases, args.folds, args.seed_split)):
+        db_path = os.path.join(directory, f"fold_{number}.sqlite")
+        SQLiteTableCreator(db_path).create_tables_sync()
+        db = SQLiteClient(db_path)
+        for phrase in phrases:
+            if phrase not in test:
+                db.execute_sync("INSERT OR IGNORE INTO intent_examples (created_at, text, action, source) "
+                                "VALUES (?, ?, ?, ?)",
+                                (time.time(), IntentClassifier._clean(phrase["text"]), phrase["action"], "tests"))
+        classifier = IntentClassifier(db, embeddings, k=args.k, temperature=args.temperature,
+                                      threshold=args.threshold, min_examples=0)
+        for phrase in test:
+            started = time.perf_counter()
+            action, confidence = classifier.predict(phrase["text"])
+            results.append((phrase, action, confidence, time.perf_counter() - started))
+    return results
+
+
+def evaluate_llm(phrases):
+    """[(фраза, намерение, сек.)] ответов промпта query_parser."""
+    from config import provider_client
+
+    results = []
+    for phrase in phrases:
+        provider_client.load_prompt("query_parser")
+        provider_client.route("query_parser", default="gpt-4.1-mini")
+        started = time.perf_counter()
+        answer = provider_client.chat_parsed(phrase["text"], parse=json.loads,
+                                             addition="Имеющиеся списки (папки):\nзаметка, покупка, расход, кладовка")
+        results.append((phrase, (answer or {}).get("action"), time.perf_counter() - started))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Проверка локального определения намерения")
+    parser.add_argument("--k", type=int, default=INTENT_K, help="соседей в голосовании")
+    parser.add_argument("--temperature", type=float, default=INTENT_TEMPERATURE, help="температура весов соседей")
+    parser.add_argument("--threshold", type=float, default=INTENT_THRESHOLD, help="порог уверенности")
+    parser.add_argument("--folds", type=int, default=5, help="частей перекрестной проверки")
+    parser.add_argument("--seed-split", type=int, default=0, help="случайное разбиение на части")
+    parser.add_argument("--llm", action="store_true", help="сравнить с промптом query_parser (запросы к модели)")
+    parser.add_argument("--seed", action="store_true", help="записать фразы в примеры рабочей базы и выйти")
+    args = parser.parse_args()
+
+    phrases = load_intents()
+
+    if args.seed:
+        from config import intent_classifier
+        for phrase in phrases:
+            intent_classifier.add(phrase["text"], phrase["action"], source="tests")
+        print(f"Записано примеров: {len(phrases)}")
+        print(json.dumps(intent_classifier.stats(), ensure_ascii=False, indent=2))
+        return
+
+    counts = {}
+    for phrase in phrases:
+        counts[phrase["action"]] = counts.get(phrase["action"], 0) + 1
+    print(f"Фраз: {len(phrases)} {counts}, модель эмбеддингов {MODEL_NAME} ({EMBEDDING_BACKEND})\n")
+
+    embeddings = CachedEmbeddings(create_embeddings(MODEL_NAME, backend=EMBEDDING_BACKEND, threads=EMBEDDING_THREADS,
+                                                    onnx_dir=ONNX_DIRECTORY, quantization=EMBEDDING_QUANTIZATION))
+    started = time.perf_counter()
+    embeddings.embed_documents([phrase["text"].lower() for phrase in phrases])
+    per_phrase = (time.perf_counter() - started) / len(phrases)
+
+    results = evaluate_local(phrases, embeddings, args)
+    correct = np.array([action == phrase["action"] for phrase, action, _, _ in results])
+    confidence = np.array([value for _, _, value, _ in results])
+    covered = confidence >= args.threshold
+    latencies = [seconds for _, _, _, seconds in results]
+
+    print(f"Локально (k={args.k}, порог {args.threshold}):")
+    print(f"  точность по всем фразам:      {correct.mean():.3f}")
+    print(f"  ответов без модели:           {covered.mean():.3f}")
+    print(f"  точность ответов без модели:  {correct[covered].mean() if covered.any() else 0.0:.3f}")
+    print(f"  задержка классификации, мс:   p50 {percentile(latencies, 0.5) * 1000:.2f}, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.2f} (+ эмбеддинг ~{per_phrase * 1000:.1f})")
+    print("  калибровка (уверенность -> доля верных):")
+    for low, high in ((0.0, 0.5), (0.5, 0.8), (0.8, 0.9), (0.9, 0.95), (0.95, 1.01)):
+        mask = (confidence >= low) & (confidence < high)
+        if mask.any():
+            print(f"    {low:.2f}-{min(high, 1.0):.2f}: {mask.sum():4d} фраз, "
+                  f"уверенность {confidence[mask].mean():.3f}, верных {correct[mask].mean():.3f}")
+    errors = [(phrase, action, value) for (phrase, action, value, _), ok in zip(results, correct) if not ok]
+    for phrase, action, value in errors[:10]:
+        print(f"  ошибка: {phrase['text'][:60]!r} {phrase['action']} -> {action} ({value:.2f})")
+
+    if args.llm:
+        llm = evaluate_llm(phrases)
+        llm_correct = np.array([action == phrase["action"] for phrase, action, _ in llm])
+        llm_latencies = [seconds for _, _, seconds in llm]
+        print("\nПромпт query_parser:")
+        print(f"  точность:     {llm_correct.mean():.3f}")
+        print(f"  задержка, мс: p50 {percentile(llm_latencies, 0.5) * 1000:.0f}, "
+              f"p95 {percentile(llm_latencies, 0.95) * 1000:.0f}")
+
+
+if __name__ == "__main__":
+    main()
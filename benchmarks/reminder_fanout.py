@@ -0,0 +1,85 @@
+"""
+Замер пропускной способности доставки напоминаний: очередь -> воркер -> транспорт.
+
+Имитирует одновременное срабатывание напоминаний у многих пользователей
+(например, cron на 09:00): потоки планировщика пишут в очередь,
+воркер доставляет через локальный приемник, без сети и рабочего стола.
+
+Запуск из корня проекта:
+    python -m benchmarks.reminder_fanout --users 200 --reminders 10 --threads 10
+    python -m benchmarks.reminder_fanout --no-batch
+    python -m benchmarks.reminder_fanout --coalesce 2
+"""
+import os
+import time
+import argparse
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from sql_db import SQLiteClient
+from create_tables import SQLiteTableCreator
+from notifications import NotificationOutbox, DeliveryWorker, LocalSinkTransport
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Замер доставки напоминаний через очередь")
+    parser.add_argument("--users", type=int, default=200, help="пользователей")
+    parser.add_argument("--reminders", type=int, default=10, help="напоминаний на пользователя")
+    parser.add_argument("--threads", type=int, default=10, help="потоков планировщика (запись в очередь)")
+    parser.add_argument("--batch-size", type=int, default=200, help="записей очереди за проход воркера")
+    parser.add_argument("--no-batch", action="store_true", help="отправлять по одному сообщению")
+    parser.add_argument("--coalesce", type=float, default=0.0, help="окно сбора сводки, сек")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="fanout_"), "bench.sqlite")
+    SQLiteTableCreator(db_path).create_tables_sync()
+    outbox = NotificationOutbox(SQLiteClient(db_path))
+
+    sink = LocalSinkTransport()
+    if args.no_batch:
+        sink.max_batch = 1
+    worker = DeliveryWorker(outbox, {sink.name: sink}, batch_size=args.batch_size, poll_interval=0.5,
+                            coalesce_window=args.coalesce)
+    worker.start()
+
+    total = args.users * args.reminders
+
+    def fire(i: int) -> None:
+        # Как reminder_job: одно сообщение, один получатель на пользователя
+        user_id = i % args.users
+        outbox.enqueue(f"{time.time()}|напоминание {i}", [("local", f"user_{user_id}")], job_id=f"bench_{i}",
+                       coalesce_window=args.coalesce)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(fire, range(total)))
+    enqueued = time.perf_counter() - started
+
+    latencies = []
+    while len(latencies) < total:
+        record = sink.messages.get(timeout=60)
+        enqueued_at = float(record["message"].split("|", 1)[0])
+        latencies.append(record["delivered_at"] - enqueued_at)
+    delivered = time.perf_counter() - started
+    worker.stop()
+
+    print(f"Напоминаний:              {total} ({args.users} польз. x {args.reminders})")
+    print(f"Пакетная отправка:        {'нет' if args.no_batch else 'да'}")
+    print(f"Окно сводки:              {args.coalesce:.1f} с")
+    print(f"Исходящих отправок:       {sink.batches}")
+    print(f"Запись в очередь:         {enqueued:.2f} с ({total / enqueued:.0f} в сек.)")
+    print(f"Доставка (всего):         {delivered:.2f} с ({total / delivered:.0f} в сек.)")
+    print(f"Задержка p50 / p95 / max: {statistics.median(latencies):.3f} / "
+          f"{percentile(latencies, 0.95):.3f} / {max(latencies):.3f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Нагрузочный тест планировщика напоминаний на BulkSQLAlchemyJobStore.
+
+1. Регистрация: по одному заданию (scheduler.add_job, транзакция на задание)
+   и пакетом (job_store.batch()).
+2. Срабатывание: десятки тысяч заданий в коротком окне времени,
+   замер пропускной способности, опоздания и пропущенных (misfire) заданий.
+
+Запуск из корня проекта:
+    python -m benchmarks.reminder_scheduling --jobs 20000 --single 2000
+"""
+import os
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+from datetime import datetime, timedelta, timezone
+
+from apscheduler.events import EVENT_JOB_MISSED
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from job_store import BulkSQLAlchemyJobStore
+
+_lock = threading.Lock()
+_lateness = []  # Опоздание срабатывания, сек
+_missed = []
+
+
+def fired(run_at: float) -> None:
+    """Задание теста: запоминает опоздание относительно заданного времени."""
+    lateness = time.time() - run_at
+    with _lock:
+        _lateness.append(lateness)
+
+
+def create_scheduler(path: str, threads: int, misfire_grace_time: int) -> (BackgroundScheduler, BulkSQLAlchemyJobStore):
+    job_store = BulkSQLAlchemyJobStore(url=f"sqlite:///{path}")
+    scheduler = BackgroundScheduler(
+        jobstores={"default": job_store},
+        executors={"default": ThreadPoolExecutor(threads)},
+        job_defaults={"misfire_grace_time": misfire_grace_time},
+        timezone=timezone.utc,
+    )
+    scheduler.start(paused=True)  # Задания пишутся в хранилище, но не выполняются
+    return scheduler, job_store
+
+
+def register(scheduler: BackgroundScheduler, count: int, start: datetime, spread: float, prefix: str) -> None:
+    for i in range(count):
+        run_date = start + timedelta(seconds=spread * i / max(1, count))
+        scheduler.add_job(fired, trigger="date", run_date=run_date, id=f"{prefix}_{i}",
+                          kwargs={"run_at": run_date.timestamp()})
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест планировщика напоминаний")
+    parser.add_argument("--jobs", type=int, default=20000, help="заданий для пакетной регистрации и срабатывания")
+    parser.add_argument("--single", type=int, default=2000, help="заданий для регистрации по одному")
+    parser.add_argument("--spread", type=float, default=10.0, help="окно срабатывания, сек")
+    parser.add_argument("--lead", type=float, default=5.0, help="пауза между регистрацией и первым срабатыванием, сек")
+    parser.add_argument("--threads", type=int, default=10, help="потоков выполнения заданий")
+    parser.add_argument("--misfire", type=int, default=60, help="misfire_grace_time, сек")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="scheduling_")
+    far_future = datetime.now(timezone.utc) + timedelta(days=1)
+
+    # 1. Регистрация по одному
+    scheduler, _ = create_scheduler(os.path.join(directory, "single.sqlite"), args.threads, args.misfire)
+    started = time.perf_counter()
+    register(scheduler, args.single, far_future, args.spread, "single")
+    single = time.perf_counter() - started
+    scheduler.shutdown(wait=False)
+
+    # 2. Пакетная регистрация с последующим срабатыванием
+    scheduler, job_store = create_scheduler(os.path.join(directory, "bulk.sqlite"), args.threads, args.misfire)
+    scheduler.add_listener(lambda event: _missed.append(event.job_id), EVENT_JOB_MISSED)
+    first_run = datetime.now(timezone.utc) + timedelta(seconds=args.lead)
+    started = time.perf_counter()
+    with job_store.batch():
+        register(scheduler, args.jobs, first_run, args.spread, "bulk")
+    bulk = time.perf_counter() - started
+
+    print(f"Регистрация по одному:  {args.single} за {single:.2f} с ({args.single / single:.0f} в сек.)")
+    print(f"Регистрация пакетом:    {args.jobs} за {bulk:.2f} с ({args.jobs / bulk:.0f} в сек.)")
+    if bulk > args.lead:
+        print("⚠️ Регистрация дольше --lead, первые задания сработают с опозданием")
+
+    scheduler.resume()
+    deadline = time.time() + args.lead + args.spread + args.misfire + 30
+    while time.time() < deadline:
+        with _lock:
+            done = len(_lateness) + len(_missed)
+        if done >= args.jobs:
+            break
+        time.sleep(0.2)
+    scheduler.shutdown(wait=True)
+
+    fire_window = max(_lateness) + args.spread if _lateness else 0
+    print(f"Сработало:              {len(_lateness)} из {args.jobs}, пропущено (misfire): {len(_missed)}")
+    if _lateness:
+        print(f"Срабатываний в сек.:    {len(_lateness) / fire_window:.0f} (окно {args.spread:.0f} с)")
+        print(f"Опоздание p50 / p95 / max: {statistics.median(_lateness):.3f} / "
+              f"{percentile(_lateness, 0.95):.3f} / {max(_lateness):.3f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Контрольные фразы локального разбора дат (temporal_parser) и величин (quantity_parser):
+дробные числа не должны читаться как даты, длительности и отдельные числа - как дни,
+год без месяца - промежуток на весь год, служебные слова ("и") - как единицы.
+
+Выводит расхождения с ожидаемым разбором, при расхождениях завершается с кодом 1.
+
+Запуск из корня проекта:
+    python -m benchmarks.temporal_cases
+"""
+import sys
+from datetime import datetime
+
+import pytz
+
+from temporal_parser import USER_TIMEZONE, parse_period
+from quantity_parser import quantity_filters
+
+NOW = pytz.timezone(USER_TIMEZONE).localize(datetime(2025, 6, 18, 12, 0))
+
+# Фраза: ожидаемый промежуток (начало, конец) в формате ГГГГ-ММ-ДД или None
+PERIODS = {
+    "молоко 1.5 литра": None,
+    "сколько стоит 2.5 кг яблок": None,
+    "потратил 12.50 рублей": None,
+    "бензин 3.7 литра по 2.45": None,
+    "я спал 8 часов": None,
+    "бегал 30 минут": None,
+    "заметки 5 дней": None,
+    "1999 рублей потратил": None,
+    "за 2000 рублей": None,
+    "в 3000 году": None,
+    "в 2023 году": ("2023-01-01", "2023-12-31"),
+    "за 2023 год": ("2023-01-01", "2023-12-31"),
+    "что купил в 2024": ("2024-01-01", "2024-12-31"),
+    "15.06": ("2025-06-15", "2025-06-15"),
+    "расходы 03.05": ("2025-05-03", "2025-05-03"),
+    "заметка от 3.5.2024": ("2024-05-03", "2024-05-03"),
+    "встреча 7 ноября 2024 г": ("2024-11-07", "2024-11-07"),
+}
+
+# Фраза: ожидаемые фильтры величин
+QUANTITIES = {
+    "молоко 1.5 литра": [{"volume_l": {"$eq": 1.5}}],
+    "сколько стоит 2.5 кг яблок": [{"mass_kg": {"$eq": 2.5}}],
+    "расходы 03.05 больше 2.5 рублей": [{"money_rub": {"$gt": 2.5}}],
+    # "и" - союз, а не основа "иены"; единица диапазона - после второго числа
+    "между 5 и 10 кг": [{"mass_kg": {"$gte": 5}}, {"mass_kg": {"$lte": 10}}],
+    "от 100 и до 200 рублей": [{"money_rub": {"$gte": 100}}, {"money_rub": {"$lte": 200}}],
+    "от 5 и до 10 кг": [{"mass_kg": {"$gte": 5}}, {"mass_kg": {"$lte": 10}}],
+    "1000 иен": [{"money_jpy": {"$eq": 1000}}],
+    "сопротивление 5 ом": [{"resistance_ohm": {"$eq": 5}}],
+}
+
+
+def main() -> None:
+    failed = 0
+    for text, expected in PERIODS.items():
+        period = parse_period(text, now=NOW)
+        result = period and tuple(moment.strftime("%Y-%m-%d") for moment in period)
+        if result != expected:
+            failed += 1
+            print(f"дата {text!r}: ожидалось {expected}, получено {result}")
+    for text, expected in QUANTITIES.items():
+        result = quantity_filters(text)
+        if result != expected:
+            failed += 1
+            print(f"величина {text!r}: ожидалось {expected}, получено {result}")
+    print(f"фраз {len(PERIODS) + len(QUANTITIES)}, расхождений {failed}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Сжатие векторов заметок (vector_compression.py): размер и качество поиска.
+
+Корпус - фразы tests/*.md и список метаданных. Для большого числа заметок
+корпус размножается с небольшим шумом (--notes), чтобы оценить время поиска.
+
+Для каждого варианта (метод, размерность, формат sidecar):
+- байт на заметку: индекс (float32 сжатой размерности) + sidecar;
+- recall@k по сжатым векторам и после переранжирования по полным (из sidecar)
+  относительно точного поиска по полным float32-векторам;
+- время поиска перебором по всем заметкам на один запрос.
+
+Запуск из корня проекта:
+    python -m benchmarks.vector_compression
+    python -m benchmarks.vector_compression --dims 64 128 256 --notes 50000
+"""
+import time
+import argparse
+
+import numpy as np
+
+from config import MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_THREADS, ONNX_DIRECTORY, EMBEDDING_QUANTIZATION
+from embedding_backend import create_embeddings
+from embedding_db import EmbeddingDatabase, METADATA_LIST_PATH
+from vector_compression import VectorCompressor, VectorSidecar
+from benchmarks.corpus import load_phrases
+
+
+def squared_l2(queries: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """Квадрат L2 между каждым запросом и каждым вектором (как в Chroma)."""
+    return (np.sum(queries ** 2, axis=1)[:, None] - 2 * queries @ vectors.T
+            + np.sum(vectors ** 2, axis=1)[None, :])
+
+
+def top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def recall(expected: np.ndarray, found: np.ndarray) -> float:
+    k = expected.shape[1]
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(expected, found)]))
+
+
+def roundtrip(vectors: np.ndarray, dtype: str) -> np.ndarray:
+    """Векторы после записи и чтения в формате sidecar."""
+    sidecar = VectorSidecar(":memory:", dtype)
+    ids = [str(i) for i in range(len(vectors))]
+    sidecar.put(ids, vectors)
+    stored = sidecar.get(ids)
+    return np.array([stored[id_] for id_ in ids])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сжатие векторов заметок: размер и качество поиска")
+    parser.add_argument("--dims", type=int, nargs="+", default=[64, 128, 256], help="размерности сжатых векторов")
+    parser.add_argument("--notes", type=int, default=20000, help="заметок для замера времени поиска")
+    parser.add_argument("--k", type=int, default=4, help="выдаваемых записей (как в get_notes_semantic)")
+    parser.add_argument("--rerank-factor", type=int, default=4, help="кандидатов на одну выдаваемую запись")
+    args = parser.parse_args()
+
+    model = create_embeddings(MODEL_NAME, backend=EMBEDDING_BACKEND, threads=EMBEDDING_THREADS,
+                              onnx_dir=ONNX_DIRECTORY, quantization=EMBEDDING_QUANTIZATION)
+    texts = [phrase["text"].lower() for phrase in load_phrases()]
+    texts += [doc.page_content for doc in EmbeddingDatabase.load_metadata_entries(METADATA_LIST_PATH)]
+    texts = list(dict.fromkeys(texts))
+    corpus = np.array(model.embed_documents(texts), dtype=np.float32)
+    full_dims = corpus.shape[1]
+
+    # Корпус для замера: исходные векторы и их копии с шумом
+    rng = np.random.default_rng(0)
+    scale = float(np.std(corpus)) * 0.3
+    notes = np.concatenate([corpus] + [corpus + rng.normal(0, scale, corpus.shape).astype(np.float32)
+                                       for _ in range(max(0, args.notes // len(corpus) - 1))])
+    queries = corpus
+    print(f"Корпус: {len(texts)} текстов, заметок для поиска: {len(notes)}, размерность {full_dims}\n")
+
+    started = time.perf_counter()
+    exact = top_k(squared_l2(queries, notes), args.k)
+    full_time = (time.perf_counter() - started) / len(queries)
+    print(f"{'вариант':24} {'байт/заметку':>12} {'recall':>7} {'+rerank':>8} {'поиск, мс':>10}")
+    print(f"{'float32 ' + str(full_dims):24} {full_dims * 4:12d} {1.0:7.3f} {'-':>8} {full_time * 1000:10.2f}")
+
+    candidates = args.k * args.rerank_factor
+    stored_notes = {dtype: roundtrip(notes, dtype) for dtype in ("float16", "int8")}
+    for dims in args.dims:
+        compressors = [VectorCompressor.truncate(full_dims, dims)]
+        if len(corpus) >= dims:
+            compressors.append(VectorCompressor.fit_pca(corpus, dims))
+        for compressor in compressors:
+            reduced_notes = compressor.transform(notes)
+            reduced_queries = compressor.transform(queries)
+
+            started = time.perf_counter()
+            distances = squared_l2(reduced_queries, reduced_notes)
+            search_time = (time.perf_counter() - started) / len(queries)
+            found = top_k(distances, args.k)
+            shortlist = top_k(distances, candidates)
+
+            for dtype, width in (("float16", 2), ("int8", 1)):
+                stored = stored_notes[dtype]
+                reranked = np.array([
+                    shortlist[i][np.argsort(np.sum((stored[shortlist[i]] - queries[i]) ** 2, axis=1))[:args.k]]
+                    for i in range(len(queries))
+                ])
+                size = dims * 4 + full_dims * width
+                print(f"{compressor.method + ' ' + str(dims) + ' + ' + dtype:24} {size:12d} "
+                      f"{recall(exact, found):7.3f} {recall(exact, reranked):8.3f} {search_time * 1000:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,5 +2,6 @@ from .create_list import create_list
 from .create_note import create_note
 from .create_reminder import create_reminder
 from .search import search_manager
+from .dispatcher import dispatch
 
-__all__ = ["create_list", "create_note", "search_manager", "create_reminder"]
+__all__ = ["create_list", "create_note", "search_manager", "create_reminder", "dispatch"]
@@ -32,7 +32,7 @@ def create_note(answer: dict) -> str:
         list_name = DEFAULT_LIST
 
     provider_client.load_prompt("create_note")  # Загрузка промпта
-    provider_client.set_model("gpt-4.1-mini")  # gpt-4.1-mini
+    provider_client.route(default="gpt-4.1-mini")  # Выбор модели по статистике
 
     # Логирование
     logger.add_separator(type_sep=2)
@@ -41,13 +41,13 @@ def create_note(answer: dict) -> str:
     logger.add_text(f"Запрос: {query}")
     logger.output()
 
-    answer = provider_client.chat_sync(" " + query,
-                                       addition=f"Имеющиеся списки (папки):\n{user.get_list_str()}")
+    # Ответ в list[dict], неразобранный ответ повторяется на более сильной модели
+    notes = provider_client.chat_parsed(" " + query, parse=extract_json_to_dict,
+                                        addition=f"Имеющиеся списки (папки):\n{user.get_list_str()}")
 
-    if not answer:
+    if notes is None:
         raise ModelAnswerError("Нет ответа.")
     try:
-        notes = extract_json_to_dict(answer)  # Преобразуем ответ в list[dict]
         if not notes:
             raise
         # Логирование результата только в файл
@@ -0,0 +1,213 @@
+import json
+from typing import Optional
+from dateparser.search import search_dates
+
+from user import user
+from logger import logger
+from config import (provider_client, model_router, intent_classifier, LLM_COMBINED_SEARCH, INTENT_CLASSIFIER,
+                    INTENT_LOCAL_ACTIONS)
+from errors import QueryEmptyError, ModelAnswerError
+from temporal_parser import parse_period
+from models.structured_output import parse_combined, COMBINED_RESPONSE_FORMAT
+from models.intent_classifier import match_list_name
+from .create_list import create_list
+from .create_note import create_note
+from .create_reminder import create_reminder
+from .search import search_manager
+
+
+def dispatch(user_message: str) -> str:
+    """
+    Определяет намерение пользователя и выполняет соответствующую команду.
+    Пользователь должен быть загружен заранее (`user.load_by_alice_id()`).
+
+    Используется терминалом (main.py) и HTTP-сервером (server.py).
+
+    Args:
+        user_message (str): Запрос пользователя без изменений.
+
+    Returns:
+        str: Ответ пользователю
+    """
+    logger.timer_start("Общее время")
+
+    # Логирование только в файл
+    logger.add_text("\n")
+    logger.add_separator(type_sep=1)
+    logger.add_text(f"Запрос: {user_message}")  # Модель и промпт
+    logger.output(console=False)  # Вывод сообщения в файл
+
+    addition = f"Имеющиеся списки (папки):\n{user.get_list_str()}"
+    # Даты, которые разбираются локально (temporal_parser), сильной модели не требуют
+    local_dates = parse_period(user_message) is not None
+
+    # Намерение по размеченным запросам, без модели. Только для команд, которым
+    # query_parser передает запрос без изменений, остальным модель готовит запрос и список
+    search_answer = None  # Разбор поискового запроса, None - его выполнит search_manager
+    matadata = local_intent(user_message) if INTENT_CLASSIFIER else None
+
+    # Намерение и разбор поиска одним запросом, при ошибке - по отдельности
+    if matadata is None and LLM_COMBINED_SEARCH:
+        matadata = combined_parse(user_message, addition, local_dates)
+        if matadata is not None:
+            search_answer = matadata.pop("search")
+            remember_intent(user_message, matadata.get("action"))
+
+    if matadata is None:
+        provider_client.load_prompt("query_parser")  # Загрузка промпта
+        # Выбор модели по статистике. Слабые модели плохо работают с датами, а ошибки в датах
+        # статистика не видит, поэтому запросы с датами - отдельный маршрут не слабее gpt-4.1.
+        if search_dates(user_message) and not local_dates:
+            provider_client.route("query_parser:dates", default="gpt-4.1", floor="gpt-4.1")
+        else:
+            provider_client.route("query_parser", default="gpt-4.1-mini")
+
+        # Логирование
+        logger.add_separator(type_sep=1)
+        logger.timer_start("Определение намерения")
+        logger.add_text(provider_client.report())  # Модель и промпт
+
+        # matadata = {'action': 'create_note', 'list_name': 'заметка', 'query': user_input}
+        matadata = provider_client.chat_parsed(user_message, parse=json.loads, addition=addition)
+        if not matadata:
+            raise ModelAnswerError("Нет ответа.")
+
+        # Логирование результата
+        logger.add_separator(type_sep=2)
+        logger.add_text(f"Ответ модели {provider_client.model}:")
+        logger.add_json_answer(matadata)
+        logger.timer_stop("Определение намерения")
+        logger.output()
+        remember_intent(user_message, matadata.get("action"))
+
+    action = matadata.get("action")
+    list_name = matadata.get("list_name", "")
+
+    # Проверяем название списка, если оно есть, но отсутствует
+    # в списках пользователя и это не создание списка - отменяем выполнение
+    if list_name and list_name not in user.get_list_str() and action != "create_list":
+        logger.add_separator(type_sep=1)
+        logger.timer_stop("Общее время")
+        logger.add_separator(type_sep=1)
+        logger.output()
+        return "Нет указанного списка."
+
+    # ----------------------------- Создание списка -----------------------------
+    if action == "create_list":
+        answer = create_list(matadata)
+
+    # ----------------------------- Создание заметки ---------------------------
+    elif action == "create_note":
+        try:
+            answer = create_note(matadata)
+        except (QueryEmptyError, ModelAnswerError) as e:
+            answer = str(e)
+
+    # ----------------------------- Создание напоминания ---------------------------
+    elif action == "create_reminder":
+        try:
+            answer = create_reminder(matadata, question=user_message)
+        except (QueryEmptyError, ModelAnswerError) as e:
+            answer = str(e)
+
+    # ----------------------------- Поиск ---------------------------
+    elif action == "search":
+        try:
+            answer = search_manager(answer=matadata, question=user_message, parsed=search_answer)
+        except (QueryEmptyError, ModelAnswerError) as e:
+            answer = str(e)
+
+    # -------------------------- Очистка списка ---------------------------
+    elif action == "clear_list":
+        answer = search_manager(list_name)
+
+    logger.add_separator(type_sep=1)
+    logger.add_text("Ответ:")
+    logger.add_text(answer)
+    logger.add_separator(type_sep=1)
+    logger.timer_stop("Общее время")
+    logger.add_separator(type_sep=1)
+    logger.output()
+
+    return answer
+
+
+def local_intent(user_message: str) -> Optional[dict]:
+    """
+    Намерение без модели (config.intent_classifier), если классификатор уверен
+    и команде не нужна подготовка запроса (config.INTENT_LOCAL_ACTIONS).
+
+    :return: {"action", "query", "list_name"} как у query_parser или None - нужна модель
+    """
+    try:
+        action = intent_classifier.classify(user_message)
+    except Exception as e:
+        print(f"⚠️ Намерение не определено локально: {e}")
+        return None
+    if action not in INTENT_LOCAL_ACTIONS:
+        return None
+
+    lists = user.get_list_str()
+    if action == "create_reminder":
+        list_name = "напоминание" if "напоминание" in lists else ""
+    else:
+        list_name = match_list_name(user_message, lists)
+    matadata = {"action": action, "query": user_message, "list_name": list_name}
+
+    # Логирование
+    logger.add_separator(type_sep=1)
+    logger.add_text("Намерение определено без модели:")
+    logger.add_json_answer(matadata)
+    logger.output()
+    return matadata
+
+
+def remember_intent(user_message: str, action) -> None:
+    """Ответ модели о намерении - размеченный пример для классификатора."""
+    if not INTENT_CLASSIFIER or not isinstance(action, str):
+        return  # Подтверждение (true/false) - не намерение запроса
+    try:
+        intent_classifier.add(user_message, action)
+    except Exception as e:
+        print(f"⚠️ Пример намерения не записан: {e}")
+
+
+def combined_parse(user_message: str, addition: str, local_dates: bool) -> Optional[dict]:
+    """
+    Намерение и, для поиска, разбор поискового запроса одним запросом к модели
+    (промпт search_combined) вместо query_parser, search и search_filter.
+    Ответ задан JSON схемой и проверяется по ней (models/structured_output.py).
+
+    :param user_message: запрос пользователя
+    :param addition: списки пользователя
+    :param local_dates: даты запроса разобраны локально
+    :return: {"action", "query", "list_name", "search"} или None - ответ не получен
+        или не прошел проверку, нужен прежний путь
+    """
+    provider_client.load_prompt("search_combined", user_message)
+    # Как у query_parser: сильная модель только для дат, которые не разбираются локально
+    if search_dates(user_message) and not local_dates:
+        provider_client.route("search_combined:dates", default="gpt-4.1", floor="gpt-4.1")
+    else:
+        provider_client.route("search_combined", default="gpt-4.1-mini")
+
+    # Логирование
+    logger.add_separator(type_sep=1)
+    logger.timer_start("Определение намерения")
+    logger.add_text(provider_client.report())  # Модель и промпт
+
+    answer = provider_client.chat_sync(user_message, addition=addition, response_format=COMBINED_RESPONSE_FORMAT)
+    matadata = parse_combined(answer) if answer else None
+
+    # Логирование результата
+    logger.add_separator(type_sep=2)
+    logger.add_text(f"Ответ модели {provider_client.model}:")
+    if matadata is None:
+        if answer:
+            model_router.record_parse_failure(provider_client.route_name, provider_client.model)
+        logger.add_text("Ответ не прошел проверку схемы, разбор по отдельности")
+    else:
+        logger.add_json_answer(matadata)
+    logger.timer_stop("Определение намерения")
+    logger.output()
+    return matadata
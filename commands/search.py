@@ -1,18 +1,20 @@
 import re
-
-from sympy.polys.polyconfig import query
+from typing import Optional
 
 from user import user
 from logger import logger, Logger, read_filter, LOGGER_CONFIG
 from models.provider_client import WorkerThread
-from config import embedding_db, provider_client
-from errors import QueryEmptyError, ModelAnswerError
+from config import embedding_db, provider_client, context_builder
+from errors import QueryEmptyError, ModelAnswerError, FormulaError
 from models.llm_task_runner import LLMTaskRunner
+from temporal_parser import date_filters
+from quantity_parser import quantity_filters
+from safe_eval import render
 from functions import (extract_json_to_dict, transform_filters,
                        get_filter_response_llm)
 
 
-def search_manager(answer: dict, question: str = "") -> str:
+def search_manager(answer: dict, question: str = "", parsed: dict = None) -> str:
     """
         :argument: answer (dict): Ответ модели:
             {
@@ -21,6 +23,8 @@ def search_manager(answer: dict, question: str = "") -> str:
                 "list_name": название списка из списка ниже, если он указан
             }
         :argument: оригинальный запрос пользователя
+        :argument: parsed (dict): Разбор запроса, полученный вместе с намерением
+            (промпт search_combined), None - разбор промптами search и search_filter
 
         :return:
             str: ответ
@@ -34,28 +38,40 @@ def search_manager(answer: dict, question: str = "") -> str:
 
     list_name = answer.get("list_name", "")  # Получаем название списка
 
-    # Определяем наличие в тексте цифр и если они есть, запускаем параллельно
-    # модель для нахождения метаданных в тексте
-    is_metadata = True if bool(re.search(r'\d', query)) else False
+    # Числа и единицы измерения разбираются локально. Модель для нахождения
+    # метаданных запускается параллельно, только если в запросе есть число,
+    # единицу которого определить не удалось
+    add_filter = quantity_filters(query)
+    if add_filter is None and parsed is not None:
+        add_filter = get_filter_response_llm(parsed.get("numbers", []))  # Числа из общего разбора
+    is_metadata = add_filter is None
     if is_metadata:
         # Запуск модели поиска метаданных
-        searcher_metadata = LLMTaskRunner(query, "search_filter", "gpt-4.1-mini", timer_label="Поиск метаданных")
+        searcher_metadata = LLMTaskRunner(query, "search_filter", default_model="gpt-4.1-mini",
+                                          timer_label="Поиск метаданных")
         searcher_metadata.start()
 
-    # Запуск модели парсинга поискового запроса
-    searcher_parser = LLMTaskRunner(
-        query=query,
-        prompt_name="search",
-        model="gpt-4.1",
-        addition=f"Имеющиеся списки (папки):\n{user.get_list_str()}",
-        timer_label="Анализ поискового запроса")
-    # Запускаем анализ и тут же ожидание ответа и получаем ответ
-    answer_dict = searcher_parser.start().finish()
+    # Даты разбираются локально. Если получилось, модели остается только
+    # разбор остального запроса, с ним справляется модель попроще
+    period_filters = date_filters(query)
+
+    if parsed is not None:
+        answer_dict = parsed  # Запрос уже разобран вместе с намерением
+    else:
+        # Запуск модели парсинга поискового запроса
+        searcher_parser = LLMTaskRunner(
+            query=query,
+            prompt_name="search",
+            default_model="gpt-4.1-mini" if period_filters else "gpt-4.1",
+            route="search:local_dates" if period_filters else "search",
+            addition=f"Имеющиеся списки (папки):\n{user.get_list_str()}",
+            timer_label="Анализ поискового запроса")
+        # Запускаем анализ и тут же ожидание ответа и получаем ответ
+        answer_dict = searcher_parser.start().finish()
 
     # Получаем ответ парсера метаданных если он был запущен
-    add_filter = []
     if is_metadata:
-        add_filter = searcher_metadata.finish()
+        add_filter = get_filter_response_llm(searcher_metadata.finish() or [])  # Единицы - в поля метаданных
 
     # print(f"""
     # Вернуть список:     {answer_dict.get("need_filter", 0)}
@@ -67,16 +83,8 @@ def search_manager(answer: dict, question: str = "") -> str:
     # """)
     # return ""
 
-    # Определяем сложность запроса для выбора модели
-    complex = answer_dict.get("complex", 2.0)
-    model = "gpt-4.1-mini"
-    try:
-        if complex < 1:
-            model = "gpt-4.1-nano"
-        elif complex > 2:
-            model = "gpt-4.1"
-    except:
-        pass
+    # Сложность запроса - маршрут выбора модели для ответа
+    route, default_model = llm_smart_route(answer_dict.get("complex", 2.0))
 
     # Подготовка фильтров ---------------------------------------
 
@@ -84,6 +92,9 @@ def search_manager(answer: dict, question: str = "") -> str:
     f = answer_dict.get("filters", [])
     # выбираем только нужные поля
     filters = add_filter
+    if period_filters:
+        filters.extend(period_filters)  # Даты разобраны локально, даты модели не нужны
+        f = []
     try:
         for item in f:
             field, f = next(iter(item.items()))
@@ -123,19 +134,15 @@ def search_manager(answer: dict, question: str = "") -> str:
 
         essence = answer_dict.get("essence", question)  # Суть поисковой фразы
         # Поиск по смыслу с фильтрами
-        answer = embedding_db.get_notes_semantic(query_text=essence, filter_metadata=filters)
+        # Если указано слово, остаются только заметки с ним (по индексу слов, с учетом словоформ)
+        answer = embedding_db.get_notes_semantic(query_text=essence, filter_metadata=filters,
+                                                 word_for_search=where_document or None)
         logger_title = "Ответ после семантического поиска"  # Логирование
 
     # 2 Фильтр по слову или фразе
     if where_document:
         need_filter = 1
 
-        if semantic:
-            answer = [
-                item for item in answer
-                if where_document.lower() not in item["page_content"].lower()
-            ]
-
     # 3 Нужно выполнить арифметические действия
     if need_calculation:
         need_analysis = 1
@@ -159,26 +166,27 @@ def search_manager(answer: dict, question: str = "") -> str:
             if answer is None:
                 return "Ничего нет"
             return f"Количество: {len(answer)}"
-        if answer is not None:
-            answer = f"Количество записей/заметок: {len(answer)}\n\n{answer}"
+        # Количество записей выводится в заголовке контекста (шаг 7)
 
     # 7 Получение ответа от модели (аналитика)
     if need_analysis:
-        # Запуск модели для ответа
+        # Записи в компактном виде в пределах бюджета токенов
+        context = pack_context(answer, question)
+        totals = context_builder.aggregates(answer)  # Переменные формул ответа
+        # Запуск модели для ответа. Ответ с формулой, которая не вычисляется,
+        # не разобран: повтор на более сильной модели
         answer = LLMTaskRunner(
-            query=f"\n{answer}\n\nВопрос: {question}",
+            query=f"\n{context}\n\nВопрос: {question}",
             prompt_name="llm_smart",
-            model=model,
+            default_model=default_model,
+            route=route,
             addition=f"Имеющиеся списки (папки):\n{", ".join(user.get_list_str())}",
-            timer_label=logger_title)
+            timer_label=logger_title,
+            parse=lambda text: answer_text(text, totals))
         # Запускаем анализ и тут же ожидание ответа и получаем ответ
-        answer = answer.start().finish()
-
-        out = "Возникла ошибка, ответ не получен."
-        try:
-            out = eval("f'" + answer.get("text", out) + "'")
-        except:
-            pass
+        out = answer.start().finish()
+        if not isinstance(out, str):
+            raise ModelAnswerError("Ответ не получен.")
         return out
 
     # 8 Вывод записей без обработки
@@ -191,6 +199,61 @@ def search_manager(answer: dict, question: str = "") -> str:
     return "Ответа нет"
 
 
+def answer_text(answer: str, totals: dict) -> Optional[str]:
+    """
+    Текст ответа промпта llm_smart с вычисленными формулами (safe_eval.render).
+
+    :param answer: ответ модели {"text": текст с формулами в фигурных скобках}
+    :param totals: переменные формул - итоги записей (ContextBuilder.aggregates)
+    :return: текст ответа, None - ответ не разобран
+    :raises FormulaError: формула не прошла проверку или не вычислена
+    """
+    answer = extract_json_to_dict(answer)
+    text = answer.get("text") if isinstance(answer, dict) else None
+    if not isinstance(text, str):
+        return None
+    try:
+        return render(text, totals)
+    except FormulaError as e:
+        print(f"{e} Ответ: {text[:200]}")
+        raise
+
+
+def llm_smart_route(complex) -> tuple:
+    """
+    Маршрут выбора модели для промпта llm_smart по оценке сложности запроса
+    от модели-парсера: у простых и сложных вопросов отдельная статистика.
+
+    :param complex: сложность запроса (0-3)
+    :return: (маршрут, модель по умолчанию)
+    """
+    try:
+        if complex < 1:
+            return "llm_smart:simple", "gpt-4.1-nano"
+        if complex > 2:
+            return "llm_smart:hard", "gpt-4.1"
+    except TypeError:
+        pass
+    return "llm_smart", "gpt-4.1-mini"
+
+
+def pack_context(notes, question: str) -> str:
+    """
+    Упаковывает записи из БД для промпта llm_smart (context_builder.py)
+    и пишет в лог, сколько токенов сэкономлено.
+
+    :param notes: записи [{"metadata": dict, "page_content": str}] или None
+    :param question: вопрос пользователя
+    :return: текст записей для запроса к модели
+    """
+    context, stats = context_builder.pack(notes, question)
+    logger.add_text(f"Контекст: записей {stats['notes']}, строк {stats['lines']}, "
+                    f"повторов {stats['duplicates']}, не показано {stats['omitted']}, "
+                    f"токенов {stats['raw_tokens']} -> {stats['tokens']} (сэкономлено {stats['saved']})")
+    logger.output()
+    return context
+
+
 def search(answer: dict, question: str = "") -> str:
     """
     :argument: answer (dict): Ответ модели:
@@ -213,20 +276,19 @@ def search(answer: dict, question: str = "") -> str:
         # В потоке запускаем поиск метаданных в запросе
         logger_thread = Logger(**LOGGER_CONFIG)  # Создаем экземпляр логера
         prompt_name = "search_filter"
-        model = "gpt-4.1-mini"
-        thread = WorkerThread(prompt_name=prompt_name, query=query, model=model)
+        thread = WorkerThread(prompt_name=prompt_name, query=query, default_model="gpt-4.1-mini")
 
         # Логирование
         logger_thread.add_separator(type_sep=3)
         logger_thread.timer_start("Поиск метаданных")
-        logger_thread.add_text(f"Модель: {model}, Промпт: {prompt_name}")
+        logger_thread.add_text(f"Модель: по статистике, Промпт: {prompt_name}")
         logger_thread.add_text(f"Запрос: {query}")
 
         thread.start()
 
     # Запрос к LLM
-    provider_client.load_prompt("search")  # Загрузка промпта
-    provider_client.set_model("gpt-4.1")  # gpt-4.1-mini
+    provider_client.load_prompt("search", query)  # Загрузка промпта, примеры под запрос
+    provider_client.route(default="gpt-4.1")  # Выбор модели по статистике
 
     # Логирование
     logger.add_separator(type_sep=2)
@@ -298,17 +360,8 @@ def search(answer: dict, question: str = "") -> str:
     except:
         pass
 
-    # Определяем сложность запроса для выбора модели
-    complex = answer_dict.get("complex", 2.0)
-    model = "gpt-4.1-mini"
-    try:
-        if complex < 1:
-            model = "gpt-4.1-nano"
-        elif complex > 2:
-            model = "gpt-4.1"
-    except:
-        pass
-    provider_client.set_model(model)
+    # Сложность запроса - маршрут выбора модели для ответа
+    route, default_model = llm_smart_route(answer_dict.get("complex", 2.0))
 
     search = answer_dict.get("search", "semantic")  # Способ поиска
     where_document = answer_dict.get("where_document", "")  # Поиск слова в документе
@@ -352,6 +405,8 @@ def search(answer: dict, question: str = "") -> str:
         # provider_client.set_model("gpt-4.1-mini")  # gpt-4.1-mini
         logger_title = "Модель после фильтра"  # Логирование
 
+    provider_client.route(route, default=default_model)  # Модель для ответа по сложности запроса
+
     # Логирование
     logger.add_separator(type_sep=2)
     logger.timer_start(logger_title)
@@ -359,7 +414,8 @@ def search(answer: dict, question: str = "") -> str:
     logger.add_text(f"В запросе: ответ БД и вопрос: {question}")
     logger.output()
 
-    answer = provider_client.chat_sync(f"\n{answer}\n\nВопрос: {question}", addition=f"Имеющиеся списки (папки):\n{user.get_list_str()}")
+    context = pack_context(answer, question)  # Записи в компактном виде
+    answer = provider_client.chat_sync(f"\n{context}\n\nВопрос: {question}", addition=f"Имеющиеся списки (папки):\n{user.get_list_str()}")
 
     # Логирование результата
     logger.add_separator(type_sep=2)
@@ -1,46 +1,279 @@
 import os
+from typing import Dict, Iterable, Optional
 from dotenv import load_dotenv
 
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
-
-from sql_db import SQLiteClient
-from models.provider_client import AIClient
-from embedding_db import EmbeddingDatabase
-from create_tables import SQLiteTableCreator
+from lazy_service import LazyService
 
 # Загрузка переменных окружения
 load_dotenv()
 
 LANGSMITH_API_KEY = os.getenv("LANGSMITH_API_KEY")
 TG_TOKEN = os.getenv("TG_TOKEN")
+TG_CHAT_ID = os.getenv("TG_CHAT_ID", "249503190")
 PERSIST_DIRECTORY = "./chroma_db"
 MODEL_NAME = "ai-forever/ru-en-RoSBERTa"
 # MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch, onnx, onnx-int8 (embedding_backend.py)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", 0)) or None  # Потоков на эмбеддинги, 0 - по числу ядер
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "avx2")  # Набор инструкций для onnx-int8
+ONNX_DIRECTORY = "./onnx_models"
+VECTOR_COMPRESSION = os.getenv("VECTOR_COMPRESSION", "none")  # Сжатие векторов в Chroma: none, truncate, pca
+VECTOR_DIMS = int(os.getenv("VECTOR_DIMS", 128))  # Размерность сжатых векторов
+VECTOR_SIDECAR_DTYPE = os.getenv("VECTOR_SIDECAR_DTYPE", "float16")  # Полные векторы для переранжирования: float16, int8
+VECTOR_RERANK_FACTOR = 4  # Кандидатов по сжатым векторам на одну выдаваемую запись
+VECTOR_PARTITION_BY_LIST = os.getenv("VECTOR_PARTITION_BY_LIST", "0") == "1"  # Коллекция на список, а не на пользователя
+VECTOR_OPEN_COLLECTIONS = int(os.getenv("VECTOR_OPEN_COLLECTIONS", 64))  # Открытых коллекций пользователей (LRU)
+VECTOR_MEMORY_LIMIT_MB = int(os.getenv("VECTOR_MEMORY_LIMIT_MB", 0))  # Память Chroma на индексы (LRU), 0 - без лимита
+TEXT_INDEX = os.getenv("TEXT_INDEX", "1") == "1"  # Индекс слов заметок: BM25 в семантическом поиске, поиск слова
+HYBRID_RRF_K = 60  # Сглаживание при объединении векторного поиска и BM25
+SEMANTIC_K_START = 4  # Записей в первом проходе семантического поиска, дальше k удваивается
+SEMANTIC_K_MAX = int(os.getenv("SEMANTIC_K_MAX", 32))  # Максимум записей в ответе семантического поиска
+SEMANTIC_DISTANCE_LIMIT = float(os.getenv("SEMANTIC_DISTANCE_LIMIT", 1.1))  # Записи дальше не попадают в ответ
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "")  # Например DiTy/cross-encoder-russian-msmarco, "" - без него
+CROSS_ENCODER_TOP = 20  # Кандидатов для переранжирования
+CROSS_ENCODER_MIN_SCORE = float(os.getenv("CROSS_ENCODER_MIN_SCORE")) if os.getenv("CROSS_ENCODER_MIN_SCORE") else None
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))  # Токенов записей в промпте llm_smart
+CONTEXT_ENCODING = "o200k_base"  # Токенизатор tiktoken моделей gpt-4.1
+
+# Выбор модели (models/router.py): от дешевой к сильной, цена $ за 1М входных и выходных токенов
+MODEL_TIERS = {
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+MODEL_SLO_LATENCY = float(os.getenv("MODEL_SLO_LATENCY", 8.0))  # Допустимый p95 задержки ответа модели, сек.
+MODEL_SLO_FAILURE_RATE = 0.05  # Допустимая доля ошибок и неразобранных ответов
+ROUTER_MIN_SAMPLES = 20  # Вызовов модели на маршруте, после которых выбор идет по статистике
+ROUTER_WINDOW = 200  # Последних вызовов в расчете задержки
+ROUTER_EXPLORE = 0.05  # Вероятность попробовать более дешевую модель без статистики
+
+# Вызовы модели (models/call_policy.py)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 20))  # Сек. на одну попытку запроса к модели
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", 45))  # Сек. на вызов с повторами, меньше SERVER_REQUEST_TIMEOUT
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", 2))  # Повторов при временных ошибках
+LLM_BACKOFF_BASE = 0.5  # Сек. паузы перед первым повтором (случайная до этого значения), дальше удваивается
+LLM_BACKOFF_MAX = 8.0  # Максимальная пауза между повторами
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"  # Дублирующий запрос, если ответа нет дольше p95
+LLM_HEDGE_MIN_DELAY = 1.0  # Сек., раньше дубль не отправляется
+# Лимиты аккаунта провайдера: запросов и токенов в минуту по моделям (models/rate_governor.py)
+LLM_RATE_LIMITS = {
+    "gpt-4.1-nano": (500, 200000),
+    "gpt-4.1-mini": (500, 200000),
+    "gpt-4.1": (500, 30000),
+}
+LLM_RATE_DEFAULT = (500, 30000)  # Лимиты прочих моделей
+LLM_COMPLETION_ESTIMATE = 500  # Токенов ответа в оценке запроса до его выполнения
+# Классы приоритета промптов: 0 - разбор намерения, 1 - остальные, 2 - фон
+LLM_PRIORITIES = {"query_parser": 0, "search_combined": 0}
+# Порядок частей запроса (AIClient.build_messages): "cache" - сначала неизменные инструкции промпта,
+# дата и списки пользователя в конце (провайдер кэширует начало запроса), "legacy" - прежний порядок
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "cache")
+PROMPT_TIME_PRECISION = {"search_filter": "day", "llm_smart": "day"}  # Точность даты в промпте, по умолчанию минуты
+LLM_SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "1") == "1"  # Одинаковые одновременные запросы - один вызов
+# Намерение и разбор поискового запроса одним запросом с JSON схемой ответа (промпт search_combined),
+# при непрошедшем проверку ответе - прежний путь: query_parser, затем search и search_filter. По умолчанию выключено
+LLM_COMBINED_SEARCH = os.getenv("LLM_COMBINED_SEARCH", "0") == "1"
+# Локальное определение намерения по эмбеддингам (models/intent_classifier.py), модель - при низкой уверенности
+INTENT_CLASSIFIER = os.getenv("INTENT_CLASSIFIER", "1") == "1"
+INTENT_K = 7  # Соседей в голосовании
+INTENT_TEMPERATURE = 0.05  # Вес соседа: softmax(сходство / температура)
+INTENT_THRESHOLD = float(os.getenv("INTENT_THRESHOLD", 0.9))  # Калиброванная уверенность ответа без модели
+INTENT_MIN_EXAMPLES = 30  # Размеченных запросов, до которых решает модель
+# Намерения, для которых query_parser передает запрос без изменений, - их можно выполнить без модели
+INTENT_LOCAL_ACTIONS = ("search", "create_reminder")
+# Примеры в промптах (<-examples->, models/prompts/examples): только похожие на запрос (models/few_shot.py)
+FEW_SHOT = os.getenv("FEW_SHOT", "1") == "1"
+FEW_SHOT_K = 4  # Примеров в промпте
+FEW_SHOT_K_BY_PROMPT = {}  # Файлы примеров с другим числом примеров
+FEW_SHOT_TOKENS = int(os.getenv("FEW_SHOT_TOKENS", 400))  # Токенов примеров в промпте
 
 DEFAULT_LIST = "заметка"  # Список который должен существовать при старте системы
 
-# Инициализация модели эмбеддингов и подключение к базе данных
-print("✅ Инициализация БД и модели эмбеддингов")
-embedding_db = EmbeddingDatabase(persist_directory=PERSIST_DIRECTORY, model_name=MODEL_NAME)
+# HTTP-сервер (server.py)
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", 8000))
+SERVER_CONCURRENCY = int(os.getenv("SERVER_CONCURRENCY", 4))  # Команд выполняется одновременно
+SERVER_QUEUE_SIZE = int(os.getenv("SERVER_QUEUE_SIZE", 16))  # Команд ожидает свободного потока, дальше 429
+SERVER_REQUEST_TIMEOUT = float(os.getenv("SERVER_REQUEST_TIMEOUT", 60))  # Сек. на команду, дальше 504
+SERVER_SHUTDOWN_TIMEOUT = float(os.getenv("SERVER_SHUTDOWN_TIMEOUT", 30))  # Сек. на завершение начатых команд
+
+# Доставка уведомлений (notifications/)
+NOTIFY_RECIPIENTS = [("desktop", ""), ("telegram", TG_CHAT_ID)]  # По умолчанию (транспорт, получатель)
+NOTIFY_SINK_PATH = os.getenv("NOTIFY_SINK_PATH", "notifications.jsonl")  # Файл локального приемника
+OUTBOX_BATCH_SIZE = 50  # Записей очереди за один проход воркера
+OUTBOX_POLL_INTERVAL = 5.0  # Сек. между проверками очереди, если воркер не разбудили
+OUTBOX_MAX_ATTEMPTS = 8  # Попыток доставки
+OUTBOX_RETRY_BASE = 2.0  # Сек. до первого повтора, дальше удваивается
+OUTBOX_RETRY_MAX = 600.0  # Максимальная пауза между повторами
+TG_RATE_GLOBAL = 30.0  # Лимит Telegram: сообщений в секунду для бота
+TG_RATE_PER_CHAT = 1.0  # Лимит Telegram: сообщений в секунду в один чат
+
+# Планировщик напоминаний (APScheduler)
+JOBS_BATCH_SIZE = 500  # Заданий в одном запросе INSERT при пакетной регистрации
+JOBS_THREADS = 10  # Потоков выполнения заданий
+JOBS_MISFIRE_GRACE_TIME = 60  # Сек. опоздания, при котором задание еще выполняется
+REMINDER_COALESCE_WINDOW = 5.0  # Сек. сбора напоминаний пользователя в одну сводку, 0 - без сводок
+
+# Сервисы создаются при первом обращении (или в preload), тяжелые модули
+# импортируются внутри фабрик: импорт config не загружает модель, БД и планировщик.
+
+def _create_embedding_db():
+    from embedding_db import EmbeddingDatabase
+    print("✅ Инициализация БД и модели эмбеддингов")
+    return EmbeddingDatabase(persist_directory=PERSIST_DIRECTORY, model_name=MODEL_NAME,
+                             backend=EMBEDDING_BACKEND, threads=EMBEDDING_THREADS,
+                             onnx_dir=ONNX_DIRECTORY, quantization=EMBEDDING_QUANTIZATION,
+                             compression=VECTOR_COMPRESSION, compression_dims=VECTOR_DIMS,
+                             sidecar_dtype=VECTOR_SIDECAR_DTYPE, rerank_factor=VECTOR_RERANK_FACTOR,
+                             partition_by_list=VECTOR_PARTITION_BY_LIST, max_open_collections=VECTOR_OPEN_COLLECTIONS,
+                             memory_limit_mb=VECTOR_MEMORY_LIMIT_MB, text_index=TEXT_INDEX, rrf_k=HYBRID_RRF_K,
+                             k_start=SEMANTIC_K_START, k_max=SEMANTIC_K_MAX, distance_limit=SEMANTIC_DISTANCE_LIMIT,
+                             cross_encoder=CROSS_ENCODER_MODEL, cross_encoder_top=CROSS_ENCODER_TOP,
+                             cross_encoder_min_score=CROSS_ENCODER_MIN_SCORE)
+
+
+def _create_provider_client():
+    from models.provider_client import LocalAIClient
+    print("✅ Инициализация клиента модели")
+    return LocalAIClient()
+
+
+def _create_model_router():
+    from models.router import ModelRouter
+    return ModelRouter(MODEL_TIERS, slo_latency=MODEL_SLO_LATENCY, slo_failure_rate=MODEL_SLO_FAILURE_RATE,
+                       min_samples=ROUTER_MIN_SAMPLES, window=ROUTER_WINDOW, explore=ROUTER_EXPLORE)
+
+
+def _create_call_policy():
+    from models.call_policy import CallPolicy
+    return CallPolicy(timeout=LLM_TIMEOUT, deadline=LLM_DEADLINE, retries=LLM_RETRIES,
+                      backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX,
+                      hedge=LLM_HEDGE, hedge_min_delay=LLM_HEDGE_MIN_DELAY)
+
+
+def _create_rate_governor():
+    from models.rate_governor import RateGovernor
+    return RateGovernor(LLM_RATE_LIMITS, default=LLM_RATE_DEFAULT)
+
+
+def _create_single_flight():
+    from models.single_flight import SingleFlight
+    return SingleFlight()
+
 
-# Инициализация LLM
-# llm = ChatOpenAI(model="gpt-4.1-nano", api_key=COMETAPI_KEY)
+def _create_intent_classifier():
+    from models.intent_classifier import IntentClassifier
+    print("✅ Инициализация классификатора намерений")
+    return IntentClassifier(sql_db.get(), embedding_db.embedding_model, k=INTENT_K, temperature=INTENT_TEMPERATURE,
+                            threshold=INTENT_THRESHOLD, min_examples=INTENT_MIN_EXAMPLES)
+
+
+def _create_few_shot():
+    from models.few_shot import FewShotSelector
+    return FewShotSelector(embedding_db.embedding_model, k=FEW_SHOT_K, budget=FEW_SHOT_TOKENS,
+                           k_by_prompt=FEW_SHOT_K_BY_PROMPT, encoding=CONTEXT_ENCODING)
+
+
+def _create_context_builder():
+    from context_builder import ContextBuilder
+    return ContextBuilder(budget=CONTEXT_TOKEN_BUDGET, encoding=CONTEXT_ENCODING)
 
-print("✅ Инициализация клиента модели")
-provider_client = AIClient()
 
 # Путь к дополнительной базе данных SQLite
 db_path = "database.sqlite"
 
-# Сначала создаем таблицы (при запуске)
-table_creator = SQLiteTableCreator(db_path)
-table_creator.create_tables_sync()
 
-sql_db = SQLiteClient(db_path)
+def _create_sql_db():
+    from sql_db import SQLiteClient
+    from create_tables import SQLiteTableCreator
+    SQLiteTableCreator(db_path).create_tables_sync()  # Сначала создаем таблицы
+    return SQLiteClient(db_path)
+
+
+def _create_usage_meter():
+    from models.usage_meter import UsageMeter
+    return UsageMeter(sql_db.get(), MODEL_TIERS)
+
+
+def _create_outbox():
+    from notifications import NotificationOutbox
+    print("✅ Инициализация очереди уведомлений")
+    return NotificationOutbox(sql_db.get())
+
+
+def _create_delivery_worker():
+    from notifications import (DeliveryWorker, TelegramTransport, DesktopTransport,
+                               WebhookTransport, LocalSinkTransport)
+    transports = {
+        transport.name: transport for transport in (
+            TelegramTransport(TG_TOKEN, rate_global=TG_RATE_GLOBAL, rate_per_chat=TG_RATE_PER_CHAT),
+            DesktopTransport(),
+            WebhookTransport(),
+            LocalSinkTransport(NOTIFY_SINK_PATH, keep_in_memory=False),
+        )
+    }
+    return DeliveryWorker(
+        outbox.get(), transports,
+        batch_size=OUTBOX_BATCH_SIZE, poll_interval=OUTBOX_POLL_INTERVAL,
+        max_attempts=OUTBOX_MAX_ATTEMPTS, retry_base=OUTBOX_RETRY_BASE, retry_max=OUTBOX_RETRY_MAX,
+        coalesce_window=REMINDER_COALESCE_WINDOW
+    )
+
+
+def _create_job_store():
+    from job_store import BulkSQLAlchemyJobStore
+    return BulkSQLAlchemyJobStore(url='sqlite:///jobs.sqlite', batch_size=JOBS_BATCH_SIZE)
+
+
+def _create_scheduler():
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.executors.pool import ThreadPoolExecutor
+    print("✅ Инициализация службы оповещений")
+    return BackgroundScheduler(
+        jobstores={"default": job_store.get()},
+        executors={"default": ThreadPoolExecutor(JOBS_THREADS)},
+        # coalesce: пропущенные запуски interval/cron задания выполняются один раз, а не серией
+        job_defaults={"misfire_grace_time": JOBS_MISFIRE_GRACE_TIME, "coalesce": True}
+    )
+
+
+embedding_db = LazyService("embedding_db", _create_embedding_db)
+provider_client = LazyService("provider_client", _create_provider_client)
+model_router = LazyService("model_router", _create_model_router)
+call_policy = LazyService("call_policy", _create_call_policy)
+single_flight = LazyService("single_flight", _create_single_flight)
+rate_governor = LazyService("rate_governor", _create_rate_governor)
+context_builder = LazyService("context_builder", _create_context_builder)
+intent_classifier = LazyService("intent_classifier", _create_intent_classifier)
+few_shot = LazyService("few_shot", _create_few_shot)
+sql_db = LazyService("sql_db", _create_sql_db)
+usage_meter = LazyService("usage_meter", _create_usage_meter)
+outbox = LazyService("outbox", _create_outbox)
+delivery_worker = LazyService("delivery_worker", _create_delivery_worker)
+job_store = LazyService("job_store", _create_job_store)
+scheduler = LazyService("scheduler", _create_scheduler)
+
+SERVICES = {service.name: service for service in (
+    sql_db, usage_meter, model_router, call_policy, single_flight, rate_governor, provider_client, context_builder, embedding_db,
+    intent_classifier, few_shot, outbox, delivery_worker, job_store, scheduler
+)}
+
+
+def preload(names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+    """
+    Создает сервисы заранее, чтобы первый запрос не ждал загрузки модели и БД.
+    Вызывается серверами при старте; короткие скрипты и замеры обходятся без него.
 
-print("✅ Инициализация службы оповещений")
-# Инициализация APScheduler
-scheduler = BackgroundScheduler(
-    jobstores={"default": SQLAlchemyJobStore(url='sqlite:///jobs.sqlite')}
-)
+    :param names: имена сервисов из SERVICES, None - все
+    :return: {имя: сек. на создание} для созданных в этом вызове
+    """
+    timings = {}
+    for name in (names or SERVICES):
+        service = SERVICES[name]
+        if not service.initialized:
+            service.get()
+            timings[name] = service.init_time
+    if timings:
+        print(f"✅ Сервисы готовы за {sum(timings.values()):.2f} с")
+    return timings
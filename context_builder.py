@@ -0,0 +1,207 @@
+import re
+import math
+from typing import Dict, List, Optional, Tuple
+
+import tiktoken
+
+# Служебные поля метаданных, модели для ответа не нужны
+HIDDEN_FIELDS = {"user", "completed", "job_id", "trigger", "system"}
+# Поля дат: выводятся коротко "ГГГГ-ММ-ДД ЧЧ:ММ", timestamp_* дублируют их и не выводятся
+DATE_FIELDS = {"datetime_create": "создано", "date_reminder": "напомнить", "start_date": "с", "end_date": "по"}
+FIELD_NAMES = {"list_name": "список"}
+# Дата создания нужна, только если вопрос о времени
+TIME_WORDS = re.compile(
+    r"\d|когда|дат|числ|день|дня|дне|недел|месяц|год|сегодня|вчера|завтра|утр|вечер|ноч|час|"
+    r"январ|феврал|март|апрел|ма[йяе]|июн|июл|август|сентябр|октябр|ноябр|декабр|"
+    r"понедельник|вторник|сред|четверг|пятниц|суббот|воскресен|последн|перв|недавн|давно|раньше|позже",
+    re.IGNORECASE)
+
+
+def short_date(value) -> str:
+    """ISO-дата без секунд и часового пояса: "2025-06-16T07:38:00+03:00" -> "2025-06-16 07:38"."""
+    match = re.match(r"(\d{4}-\d{2}-\d{2})(?:[T ](\d{2}:\d{2}))?", str(value))
+    if not match:
+        return str(value)
+    return match.group(1) + (" " + match.group(2) if match.group(2) else "")
+
+
+def normalize_text(text: str) -> str:
+    """Текст для сравнения заметок: регистр, "ё", пунктуация и пробелы не важны."""
+    return " ".join(re.findall(r"\w+", str(text).lower().replace("ё", "е")))
+
+
+class ContextBuilder:
+    """
+    Упаковка записей из БД в контекст промпта llm_smart.
+
+    Вместо Python-представления списка словарей со всеми метаданными
+    каждая запись выводится одной строкой: текст и только нужные поля
+    (служебные поля и timestamp_* отброшены, дата создания - только для вопросов о времени).
+    Поля с одинаковым значением у всех записей выводятся один раз в заголовке,
+    там же итоги счетных полей (aggregates) - переменные для формул ответа.
+    Одинаковые записи (текст и поля) выводятся один раз с числом повторов.
+
+    Размер контекста ограничен бюджетом токенов (токенизатор tiktoken).
+    Записи, не вошедшие в бюджет, заменяются строкой-сводкой: их число,
+    списки, период и суммы числовых полей. Результат зависит только от входа.
+    """
+
+    def __init__(self, budget: int = 3000, encoding: str = "o200k_base"):
+        """
+        :param budget: максимум токенов контекста
+        :param encoding: кодировка tiktoken (o200k_base - модели gpt-4.1 и gpt-4o)
+        """
+        self.budget = budget
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def fields(self, notes: List[Dict], question: str) -> List[str]:
+        """Поля метаданных, которые выводятся для записей, в порядке первого появления."""
+        need_time = bool(TIME_WORDS.search(question or ""))
+        out = []
+        for note in notes:
+            for field in (note.get("metadata") or {}):
+                if field in out or field in HIDDEN_FIELDS or field.startswith("timestamp_"):
+                    continue
+                if field == "datetime_create" and not need_time:
+                    continue
+                out.append(field)
+        return out
+
+    @staticmethod
+    def value(field: str, value) -> str:
+        if field in DATE_FIELDS:
+            return short_date(value)
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+
+    @staticmethod
+    def countable(field: str, value) -> bool:
+        """Поле - счетная величина: число, не служебное и не порядковое (номер полки, дома не суммируются)."""
+        return (field not in HIDDEN_FIELDS and not field.startswith(("timestamp_", "number"))
+                and isinstance(value, (int, float)) and not isinstance(value, bool))
+
+    @staticmethod
+    def label(field: str) -> str:
+        return DATE_FIELDS.get(field) or FIELD_NAMES.get(field, field)
+
+    def pack(self, notes: Optional[List[Dict]], question: str = "") -> Tuple[str, Dict[str, int]]:
+        """
+        :param notes: записи [{"metadata": dict, "page_content": str}]
+        :param question: вопрос пользователя (для выбора полей)
+        :return: (контекст, метрики: записей, строк, повторов, не показано, токенов до и после, сэкономлено)
+        """
+        notes = notes or []
+        raw_tokens = self.count_tokens(str(notes))
+        fields = self.fields(notes, question)
+
+        # Поля с одним значением у всех записей - в заголовок
+        common = {}
+        if len(notes) > 1:
+            for field in fields:
+                values = {self.value(field, (note.get("metadata") or {}).get(field)) for note in notes}
+                if len(values) == 1 and (notes[0].get("metadata") or {}).get(field) is not None:
+                    common[field] = values.pop()
+        fields = [field for field in fields if field not in common]
+
+        # Строки записей, одинаковые склеиваются
+        rows: Dict[tuple, list] = {}
+        for note in notes:
+            meta = note.get("metadata") or {}
+            shown = tuple((field, self.value(field, meta[field])) for field in fields if meta.get(field) is not None)
+            key = (normalize_text(note.get("page_content", "")), shown)
+            if key in rows:
+                rows[key][1] += 1
+            else:
+                rows[key] = [note, 1]
+
+        header = f"Всего записей: {len(notes)}"
+        if common:
+            header += "\nУ всех записей: " + "; ".join(f"{self.label(f)}: {v}" for f, v in common.items())
+        totals = self.aggregates(notes)
+        if len(totals) > 1:
+            header += "\nИтоги по всем записям (переменные для формул): " + "; ".join(
+                f"{name} = {self.value(name, round(value, 2))}" for name, value in totals.items())
+        if not notes:
+            header += "\nЗаписей нет"
+
+        lines, used = [header], self.count_tokens(header)
+        reserve = 80  # Токенов на строку-сводку
+        omitted = []
+        for (_, shown), (note, repeats) in rows.items():
+            line = "- " + str(note.get("page_content", "")).strip()
+            if shown:
+                line += " (" + "; ".join(f"{self.label(f)}: {v}" for f, v in shown) + ")"
+            if repeats > 1:
+                line += f" ×{repeats}"
+            tokens = self.count_tokens(line) + 1
+            if omitted or used + tokens > self.budget - reserve:
+                omitted += [note] * repeats
+                continue
+            lines.append(line)
+            used += tokens
+        if omitted:
+            lines.append(self.summary(omitted))
+
+        context = "\n".join(lines)
+        tokens = self.count_tokens(context)
+        return context, {
+            "notes": len(notes),
+            "lines": len(lines) - 1 - bool(omitted),
+            "duplicates": len(notes) - len(rows),
+            "omitted": len(omitted),
+            "raw_tokens": raw_tokens,
+            "tokens": tokens,
+            "saved": raw_tokens - tokens,
+        }
+
+    def aggregates(self, notes: Optional[List[Dict]]) -> Dict[str, float]:
+        """
+        Итоги счетных полей по всем записям, в том числе не вошедшим в контекст.
+        Это переменные формул ответа llm_smart (safe_eval.render): модель пишет
+        "{money_rub_sum}" вместо того, чтобы переписывать числа записей в формулу.
+
+        :param notes: записи [{"metadata": dict, "page_content": str}]
+        :return: {"notes_count": записей, "<поле>_sum", "<поле>_count",
+            и если значений больше одного "<поле>_avg", "<поле>_min", "<поле>_max"}
+        """
+        values: Dict[str, List[float]] = {}
+        for note in notes or []:
+            for field, value in (note.get("metadata") or {}).items():
+                if self.countable(field, value):
+                    values.setdefault(field, []).append(value)
+        totals = {"notes_count": len(notes or [])}
+        for field in sorted(values):
+            numbers = values[field]
+            total = math.fsum(numbers)
+            totals.update({f"{field}_sum": total, f"{field}_count": len(numbers)})
+            if len(numbers) > 1:  # Среднее и крайние значения одного числа - оно само
+                totals.update({f"{field}_avg": total / len(numbers), f"{field}_min": min(numbers),
+                               f"{field}_max": max(numbers)})
+        return totals
+
+    def summary(self, notes: List[Dict]) -> str:
+        """Сводка по записям, не вошедшим в бюджет: число, списки, период, суммы счетных полей."""
+        lists: Dict[str, int] = {}
+        dates, sums = [], {}
+        for note in notes:
+            meta = note.get("metadata") or {}
+            if meta.get("list_name"):
+                lists[meta["list_name"]] = lists.get(meta["list_name"], 0) + 1
+            if meta.get("datetime_create"):
+                dates.append(short_date(meta["datetime_create"]))
+            for field, value in meta.items():
+                if self.countable(field, value):
+                    sums[field] = sums.get(field, 0) + value
+        parts = [f"Не показано записей (не вошли в контекст): {len(notes)}"]
+        if lists:
+            parts.append("списки: " + ", ".join(f"{name} {count}" for name, count in sorted(lists.items())))
+        if dates:
+            parts.append(f"период: {min(dates)} - {max(dates)}")
+        if sums:
+            parts.append("суммы: " + ", ".join(f"{field} {self.value(field, round(total, 2))}"
+                                                for field, total in sorted(sums.items())))
+        return "; ".join(parts)
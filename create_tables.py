@@ -13,10 +13,13 @@ class SQLiteTableCreator:
         self.db_path = db_path
 
     def create_tables_sync(self) -> None:
-        """Создает таблицы `users` и `user_lists` в синхронном режиме."""
+        """Создает таблицы `users`, `user_lists`, `notification_outbox`, `user_notifications`, `llm_usage` и `intent_examples` в синхронном режиме."""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
 
+        # WAL: запись в очередь уведомлений из потоков планировщика не ждет чтения воркера
+        cursor.execute("PRAGMA journal_mode=WAL")
+
         # Таблица пользователей
         cursor.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -39,13 +42,82 @@ class SQLiteTableCreator:
             FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
         );
         """)
+
+        # Очередь исходящих уведомлений (outbox)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT,
+            transport TEXT NOT NULL,
+            recipient TEXT,
+            message TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP
+        );
+        """)
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_due
+        ON notification_outbox (status, next_attempt_at);
+        """)
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_outbox_recipient
+        ON notification_outbox (transport, recipient, status, next_attempt_at);
+        """)
+
+        # Способы доставки уведомлений пользователю
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            transport TEXT NOT NULL,
+            target TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, transport),
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        );
+        """)
+        # Расход токенов и задержки вызовов модели (models/usage_meter.py)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS llm_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at REAL NOT NULL,
+            user_id INTEGER,
+            prompt_name TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            completion_tokens INTEGER NOT NULL DEFAULT 0,
+            cached_tokens INTEGER NOT NULL DEFAULT 0,
+            latency REAL NOT NULL,
+            ok INTEGER NOT NULL DEFAULT 1
+        );
+        """)
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_llm_usage_created
+        ON llm_usage (created_at);
+        """)
+
+        # Размеченные запросы для локального определения намерения (models/intent_classifier.py)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS intent_examples (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at REAL NOT NULL,
+            text TEXT NOT NULL UNIQUE,
+            action TEXT NOT NULL,
+            source TEXT NOT NULL
+        );
+        """)
         conn.commit()
         conn.close()
-        print("✅ Таблицы `users` и `user_lists` созданы (синхронно).")
+        print("✅ Таблицы `users`, `user_lists`, `notification_outbox`, `user_notifications`, `llm_usage` и `intent_examples` созданы (синхронно).")
 
     async def create_tables_async(self) -> None:
-        """Создает таблицы `users` и `user_lists` в асинхронном режиме."""
+        """Создает таблицы `users`, `user_lists`, `notification_outbox`, `user_notifications`, `llm_usage` и `intent_examples` в асинхронном режиме."""
         async with aiosqlite.connect(self.db_path) as conn:
+            await conn.execute("PRAGMA journal_mode=WAL")
             await conn.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -67,8 +139,73 @@ class SQLiteTableCreator:
             );
             """)
 
+            await conn.execute("""
+            CREATE TABLE IF NOT EXISTS notification_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT,
+                transport TEXT NOT NULL,
+                recipient TEXT,
+                message TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                sent_at TIMESTAMP
+            );
+            """)
+            await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_outbox_due
+            ON notification_outbox (status, next_attempt_at);
+            """)
+            await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_outbox_recipient
+            ON notification_outbox (transport, recipient, status, next_attempt_at);
+            """)
+
+            await conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                transport TEXT NOT NULL,
+                target TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (user_id, transport),
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+            );
+            """)
+
+            await conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                user_id INTEGER,
+                prompt_name TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                cached_tokens INTEGER NOT NULL DEFAULT 0,
+                latency REAL NOT NULL,
+                ok INTEGER NOT NULL DEFAULT 1
+            );
+            """)
+            await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_llm_usage_created
+            ON llm_usage (created_at);
+            """)
+
+            await conn.execute("""
+            CREATE TABLE IF NOT EXISTS intent_examples (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                text TEXT NOT NULL UNIQUE,
+                action TEXT NOT NULL,
+                source TEXT NOT NULL
+            );
+            """)
+
             await conn.commit()
-        print("✅ Таблицы `users` и `user_lists` созданы (асинхронно).")
+        print("✅ Таблицы `users`, `user_lists`, `notification_outbox`, `user_notifications`, `llm_usage` и `intent_examples` созданы (асинхронно).")
 
 
 # Пример использования
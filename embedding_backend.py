@@ -0,0 +1,96 @@
+import os
+from typing import Optional
+
+from langchain_huggingface import HuggingFaceEmbeddings
+
+from errors import EmbeddingBackendError
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+# Наборы инструкций для динамической int8-квантизации (onnxruntime): avx2 есть почти на любом x86
+QUANTIZATION_CONFIGS = ("arm64", "avx2", "avx512", "avx512_vnni")
+
+
+def create_embeddings(model_name: str, backend: str = "torch", threads: Optional[int] = None,
+                      onnx_dir: str = "./onnx_models", quantization: str = "avx2") -> HuggingFaceEmbeddings:
+    """
+    Создает модель эмбеддингов с выбранным способом вычисления на CPU.
+
+    Бэкенды:
+        torch     - PyTorch, полная точность (как раньше);
+        onnx      - ONNX Runtime, модель экспортируется из PyTorch при первом запуске;
+        onnx-int8 - ONNX Runtime с динамической int8-квантизацией весов.
+
+    ONNX-модели сохраняются в `onnx_dir` и при следующих запусках загружаются с диска.
+    Эмбеддинги всех бэкендов совместимы (одна модель), расхождение int8 небольшое -
+    см. benchmarks/embedding_backends.py.
+
+    :param model_name: модель HuggingFace
+    :param backend: один из BACKENDS
+    :param threads: потоков на вычисление одного пакета (intra-op), None - по числу ядер
+    :param onnx_dir: каталог для экспортированных ONNX-моделей
+    :param quantization: набор инструкций для int8 (QUANTIZATION_CONFIGS)
+    :raises EmbeddingBackendError: неизвестный бэкенд или не установлен onnxruntime
+    """
+    if backend not in BACKENDS:
+        raise EmbeddingBackendError(f"Неизвестный бэкенд '{backend}', доступны: {', '.join(BACKENDS)}.")
+
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return HuggingFaceEmbeddings(model_name=model_name)
+
+    local_path = export_onnx(model_name, onnx_dir)
+    model_kwargs = {}
+    if backend == "onnx-int8":
+        model_kwargs["file_name"] = export_int8(local_path, quantization)
+    if threads:
+        import onnxruntime
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        session_options.inter_op_num_threads = 1
+        model_kwargs["session_options"] = session_options
+    model_kwargs["provider"] = "CPUExecutionProvider"
+
+    return HuggingFaceEmbeddings(model_name=local_path,
+                                 model_kwargs={"backend": "onnx", "model_kwargs": model_kwargs})
+
+
+def export_onnx(model_name: str, onnx_dir: str) -> str:
+    """
+    Экспортирует модель в ONNX, если это еще не сделано.
+
+    :return: каталог модели с onnx/model.onnx
+    """
+    local_path = os.path.join(onnx_dir, model_name.replace("/", "__"))
+    if os.path.exists(os.path.join(local_path, "onnx", "model.onnx")):
+        return local_path
+
+    try:
+        from sentence_transformers import SentenceTransformer
+        print(f"✅ Экспорт модели эмбеддингов в ONNX: {local_path}")
+        model = SentenceTransformer(model_name, backend="onnx", model_kwargs={"export": True})
+    except ImportError as e:
+        raise EmbeddingBackendError(f"Для ONNX нужен пакет optimum[onnxruntime]: {e}")
+    model.save_pretrained(local_path)
+    return local_path
+
+
+def export_int8(local_path: str, quantization: str) -> str:
+    """
+    Создает int8-версию ONNX-модели (динамическая квантизация весов), если ее нет.
+
+    :return: путь к файлу модели относительно `local_path`
+    """
+    if quantization not in QUANTIZATION_CONFIGS:
+        raise EmbeddingBackendError(f"Неизвестная квантизация '{quantization}', "
+                                    f"доступны: {', '.join(QUANTIZATION_CONFIGS)}.")
+    file_name = os.path.join("onnx", f"model_qint8_{quantization}.onnx")
+    if os.path.exists(os.path.join(local_path, file_name)):
+        return file_name
+
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+    print(f"✅ Квантизация модели эмбеддингов (int8, {quantization})")
+    model = SentenceTransformer(local_path, backend="onnx")
+    export_dynamic_quantized_onnx_model(model, quantization, local_path)
+    return file_name
@@ -1,11 +1,23 @@
+import os
+import uuid
+import threading
 from typing import Dict, List, Optional, Tuple
 
+import chromadb
+import numpy as np
+from chromadb.config import Settings
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
-from sklearn.externals.array_api_compat.torch import where
 
 from logger import logger, read_filter
+from embedding_backend import create_embeddings
+from vector_compression import CompressedEmbeddings, VectorSidecar, create_compressor
+from vector_partitions import PartitionedStore, partition_key
+from text_index import TextIndex, reciprocal_rank_fusion
+
+METADATA_LIST_PATH = "models/prompts/metadata_list.txt"
+DEFAULT_COLLECTION = "langchain"  # Коллекция Chroma по умолчанию (без сжатия)
+KEYWORD_OVERFETCH = 4  # Во сколько раз больше кандидатов BM25 брать, если часть фильтра проверяет только Chroma
 
 
 class EmbeddingDatabase:
@@ -15,25 +27,136 @@ class EmbeddingDatabase:
     Позволяет инициализировать базу данных, добавлять текстовые данные с метаданными и извлекать релевантные записи.
     """
 
-    def __init__(self, persist_directory: str, model_name: str):
+    def __init__(self, persist_directory: str, model_name: str, backend: str = "torch",
+                 threads: Optional[int] = None, compression: str = "none", compression_dims: int = 256,
+                 sidecar_dtype: str = "float16", rerank_factor: int = 4, partition_by_list: bool = False,
+                 max_open_collections: int = 64, memory_limit_mb: int = 0, text_index: bool = True,
+                 rrf_k: int = 60, k_start: int = 4, k_max: int = 32, distance_limit: float = 1.1,
+                 cross_encoder: str = "", cross_encoder_top: int = 20,
+                 cross_encoder_min_score: Optional[float] = None, **backend_kwargs):
         """
         Инициализация базы данных эмбеддингов и модели эмбеддингов.
 
         :param persist_directory: Путь к директории для хранения базы данных Chroma.
         :param model_name: Название модели эмбеддингов HuggingFace.
+        :param backend: Способ вычисления эмбеддингов (см. embedding_backend.create_embeddings).
+        :param threads: Потоков на вычисление эмбеддингов, None - по числу ядер.
+        :param compression: Сжатие векторов в Chroma: none, truncate, pca (см. vector_compression.py).
+        :param compression_dims: Размерность сжатых векторов.
+        :param sidecar_dtype: Формат полных векторов для переранжирования: float16, int8.
+        :param rerank_factor: Во сколько раз больше кандидатов искать по сжатым векторам.
+        :param partition_by_list: Отдельная коллекция на каждый список пользователя (см. vector_partitions.py).
+        :param max_open_collections: Сколько коллекций пользователей держать открытыми.
+        :param memory_limit_mb: Лимит памяти Chroma на загруженные индексы (LRU), 0 - без лимита.
+        :param text_index: Инвертированный индекс слов заметок для поиска по словам и BM25 (см. text_index.py).
+        :param rrf_k: Сглаживание при объединении векторного поиска и BM25 (Reciprocal Rank Fusion).
+        :param k_start: Сколько записей запрашивать в первом проходе семантического поиска.
+        :param k_max: Максимум записей в ответе семантического поиска.
+        :param distance_limit: Максимальное векторное расстояние записи по умолчанию.
+        :param cross_encoder: Модель CrossEncoder для переранжирования кандидатов, "" - без переранжирования.
+        :param cross_encoder_top: Сколько лучших кандидатов переранжировать.
+        :param cross_encoder_min_score: Минимальная оценка CrossEncoder, None - не отсекать.
         """
-        self.embedding_model = HuggingFaceEmbeddings(model_name=model_name)
-        # self.vector_store = Chroma(persist_directory=persist_directory, embedding_function=self.embedding_model)
-
-        documents = self.load_metadata_entries("models/prompts/metadata_list.txt")
-        self.vector_store = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embedding_model,
-            persist_directory=persist_directory  # Директория для сохранения [9, 12]
-        )
+        self.embedding_model = create_embeddings(model_name, backend=backend, threads=threads, **backend_kwargs)
+        self.rerank_factor = rerank_factor
+        self.rrf_k = rrf_k
+        self.k_start = k_start
+        self.k_max = k_max
+        self.distance_limit = distance_limit
+        self.cross_encoder_name = cross_encoder
+        self.cross_encoder_top = cross_encoder_top
+        self.cross_encoder_min_score = cross_encoder_min_score
+        self._cross_encoder = None
+        self._cross_encoder_lock = threading.Lock()
+        self.sidecar: Optional[VectorSidecar] = None
+        self.text_index: Optional[TextIndex] = None
+
+        settings = Settings(anonymized_telemetry=False)
+        if memory_limit_mb:
+            settings = Settings(anonymized_telemetry=False, chroma_segment_cache_policy="LRU",
+                                chroma_memory_limit_bytes=memory_limit_mb * 1024 * 1024)
+        self.client = chromadb.PersistentClient(path=persist_directory, settings=settings)
+
+        # Несжатая общая коллекция: все заметки до разбиения по пользователям
+        source = Chroma(client=self.client, collection_name=DEFAULT_COLLECTION,
+                        embedding_function=self.embedding_model)
+        prefix = DEFAULT_COLLECTION
+        if compression != "none":
+            stored = source.get(include=["documents"])
+            fit_texts = stored["documents"] + [doc.page_content
+                                               for doc in self.load_metadata_entries(METADATA_LIST_PATH)]
+            compressor = create_compressor(
+                compression, compression_dims,
+                os.path.join(persist_directory, f"compression_{compression}_{compression_dims}.npz"),
+                self.embedding_model, fit_texts
+            )
+            self.embedding_model = CompressedEmbeddings(self.embedding_model, compressor)
+            self.sidecar = VectorSidecar(
+                os.path.join(persist_directory, f"vectors_{compression}_{compression_dims}.sqlite"), sidecar_dtype
+            )
+            prefix = f"notes_{compression}_{compression_dims}"
+
+        self.partitions = PartitionedStore(self.client, self.embedding_model, prefix,
+                                           partition_by_list=partition_by_list, max_open=max_open_collections)
+        self.vector_store = self.partitions.shared  # Общая коллекция: список метаданных
+        if compression == "none":
+            self.partitions.migrate_shared()
+        else:
+            self.migrate_from(source)
+
+        self.sync_metadata_entries(METADATA_LIST_PATH)
+
+        if text_index:
+            self.text_index = TextIndex(os.path.join(persist_directory, "text_index.sqlite"))
+            self.build_text_index()
 
         # print(self.vector_store._collection.get(include=["embeddings", "documents", "metadatas"]))  # Показывает всю базу
 
+    def migrate_from(self, source: Chroma) -> None:
+        """
+        Переносит заметки из другой коллекции (например, несжатой) в текущие,
+        если заметок в них еще нет. Эмбеддинги вычисляются заново, id и метаданные сохраняются.
+        Список метаданных не переносится, он записывается в sync_metadata_entries.
+        """
+        if self.partitions.names:
+            return
+        stored = source.get(include=["documents", "metadatas"])
+        notes = [(id_, text, meta) for id_, text, meta in zip(stored["ids"], stored["documents"], stored["metadatas"])
+                 if (meta or {}).get("system") != "metadata_list"]
+        if not notes:
+            return
+        print(f"✅ Перенос {len(notes)} заметок в сжатую коллекцию")
+        ids, texts, metadatas = map(list, zip(*notes))
+        self._add(texts, metadatas, ids=ids)
+
+    def build_text_index(self) -> None:
+        """Индексирует все заметки, если индекс слов пуст (первый запуск с индексом)."""
+        if self.text_index.count():
+            return
+        for name in self.partitions.names:
+            stored = self.partitions.get(name).get(include=["documents", "metadatas"])
+            self.text_index.add(stored["ids"], stored["documents"], stored["metadatas"])
+        if self.text_index.count():
+            print(f"✅ Построен индекс слов: {self.text_index.count()} заметок")
+
+    def _add(self, texts: List[str], metadatas: Optional[List[Dict]] = None,
+             ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Записывает тексты в коллекции пользователей (по метаданным "user" и "list_name")
+        и, при сжатии, полные векторы в sidecar.
+        """
+        metadatas = metadatas or [None] * len(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        for name, indexes in self.partitions.split(metadatas).items():
+            store = self.partitions.get(name)
+            store.add_texts(texts=[texts[i] for i in indexes], ids=[ids[i] for i in indexes],
+                            metadatas=[metadatas[i] for i in indexes] if any(metadatas) else None)
+        if self.sidecar is not None:
+            self.sidecar.put(ids, self.embedding_model.full_vectors(texts))
+        if self.text_index is not None:
+            self.text_index.add(ids, texts, metadatas)  # Индекс слов обновляется вместе с Chroma
+        return ids
+
     def add_text(self, text: List[str], metadatas: List[Dict[str, str]] = None) -> None:
         """
         Добавляет текст в базу данных эмбеддингов с метаданными.
@@ -43,19 +166,30 @@ class EmbeddingDatabase:
         """
         text = [note.lower() for note in text]
         metadatas = metadatas or []  # Если метаданные не переданы, создаем пустой список
-        self.vector_store.add_texts(texts=text, metadatas=metadatas)  # Записываем с эмбеддингами
+        self._add(text, metadatas)  # Записываем с эмбеддингами
 
     def get_notes_semantic(self, query_text: Optional[str] = "",
                            filter_metadata: Optional[Dict[str, str]] = None,
-                           limit: float = 1.1) -> List:
+                           limit: Optional[float] = None, word_for_search: Optional[str] = None,
+                           k: Optional[int] = None) -> List:
         """
         Извлекает заметки, фильтруя их по метаданным и находя похожие тексты по эмбеддингам.
         Возвращает список словарей с текстами заметок и их метаданными.
 
+        Количество записей не фиксировано: поиск повторяется с удвоенным k, пока все найденные
+        записи ближе порога `limit` (см. _adaptive_search), поэтому в большом списке
+        возвращаются все близкие заметки, а в маленьком - только близкие.
+
+        Если в фильтре есть пользователь и включен индекс слов, результаты векторного
+        поиска объединяются с результатами BM25 по словам запроса (Reciprocal Rank Fusion):
+        заметки с точным совпадением слов не теряются, даже если их вектор дальше порога.
+
         :param query_text: Текстовый запрос для поиска похожих записей (если передан).
         :param filter_metadata: Словарь метаданных для фильтрацииФормат:
                 {"ключ": {"$eq": значение}, "числовое_поле": {"$gte": число}}
-        :param limit: максимальное векторное расстояние для включения записи в вывод
+        :param limit: максимальное векторное расстояние для включения записи в вывод, None - из настроек
+        :param word_for_search: оставить только заметки, содержащие слово или фразу
+        :param k: максимальное количество записей в выводе, None - из настроек
 
         :return: Список [{metadata: dict, page_content: str}]
         """
@@ -69,11 +203,35 @@ class EmbeddingDatabase:
         logger.add_json_answer(filter_metadata)
         logger.output(console=False)
 
-        results = self.vector_store.similarity_search_with_score(query=query_text, filter=filter_metadata)
+        limit = self.distance_limit if limit is None else limit
+        k = k or self.k_max
+        query = self._embed_query(query_text)  # Один эмбеддинг запроса на все проходы и коллекции
+        results = self._adaptive_search(query, filter_metadata, limit, k)
+        found = {doc.id: doc for doc, distance in results}
+        ranking = list(found)
+
+        user, list_name = partition_key(filter_metadata)
+        if self.text_index is not None and user is not None:
+            # Пользователь и список фильтруются в индексе, остальные условия (даты, числа) - в Chroma,
+            # поэтому при них кандидатов берется с запасом
+            fetch = k * KEYWORD_OVERFETCH if self._has_other_conditions(filter_metadata) else k
+            keyword_ids = [doc_id for doc_id, _ in self.text_index.search(query_text, user, limit=fetch,
+                                                                          list_name=list_name)]
+            found.update(self._get_by_ids([doc_id for doc_id in keyword_ids if doc_id not in found],
+                                          filter_metadata))
+            keyword_ids = [doc_id for doc_id in keyword_ids if doc_id in found][:k]  # Только прошедшие фильтр
+            ranking = [doc_id for doc_id, _ in reciprocal_rank_fusion([ranking, keyword_ids], k=self.rrf_k)]
+
+        if word_for_search:
+            matching = self._matching_ids(word_for_search, user, found)
+            ranking = [doc_id for doc_id in ranking if doc_id in matching]
+
+        if self.cross_encoder_name and len(ranking) > 1:
+            ranking = self._rerank(query_text, ranking, found)
 
         out = [
-            {"metadata": doc.metadata, "page_content": doc.page_content}
-            for doc, distance in results if distance <= limit
+            {"metadata": found[doc_id].metadata, "page_content": found[doc_id].page_content}
+            for doc_id in ranking[:k]
         ]
 
         # Логирование результата
@@ -92,6 +250,127 @@ class EmbeddingDatabase:
 
         return out
 
+    def _embed_query(self, query_text: str) -> Tuple[List[float], np.ndarray]:
+        """
+        Эмбеддинг запроса: (вектор для поиска в Chroma, полный вектор для переранжирования).
+        Без сжатия это один и тот же вектор.
+        """
+        if self.sidecar is None:
+            vector = self.embedding_model.embed_query(query_text)
+            return vector, np.asarray(vector, dtype=np.float32)
+        full = self.embedding_model.base.embed_query(query_text)
+        return self.embedding_model.compressor.transform([full])[0].tolist(), np.asarray(full, dtype=np.float32)
+
+    def _adaptive_search(self, query: Tuple[List[float], np.ndarray], filter_metadata: Optional[Dict],
+                         limit: float, k_max: int) -> List[Tuple[Document, float]]:
+        """
+        Семантический поиск с углублением: начинает с k_start записей и удваивает k,
+        пока все найденные записи ближе порога. Останавливается, как только
+        встретилась запись дальше порога, записи закончились или достигнут k_max.
+
+        :param query: эмбеддинг запроса (см. _embed_query)
+        :return: [(документ, расстояние)] ближе порога, по возрастанию расстояния
+        """
+        k = min(self.k_start, k_max)
+        while True:
+            results = self._similarity_search(query, filter_metadata, k=k)
+            within = [(doc, distance) for doc, distance in results if distance <= limit]
+            if len(within) < len(results) or len(results) < k or k >= k_max:
+                logger.add_text(f"Семантический поиск: k={k}, ближе {limit}: {len(within)}")
+                return within[:k_max]
+            k = min(k * 2, k_max)
+
+    @staticmethod
+    def _has_other_conditions(filter_metadata: Optional[Dict]) -> bool:
+        """В фильтре есть условия кроме равенства пользователя и списка (их проверяет индекс слов)."""
+        if not filter_metadata:
+            return False
+        clauses = filter_metadata["$and"] if "$and" in filter_metadata else [filter_metadata]
+        return any(field not in ("user", "list_name") or isinstance(condition, dict) and set(condition) != {"$eq"}
+                   for clause in clauses for field, condition in clause.items())
+
+    def _rerank(self, query_text: str, ranking: List[str], documents: Dict[str, Document]) -> List[str]:
+        """
+        Переранжирование лучших кандидатов моделью CrossEncoder (запрос и заметка
+        оцениваются вместе, точнее сравнения векторов). Кандидаты ниже
+        cross_encoder_min_score отбрасываются, остальные записи идут после них.
+        """
+        top = ranking[:self.cross_encoder_top]
+        scores = self.get_cross_encoder().predict([(query_text, documents[doc_id].page_content) for doc_id in top])
+        reranked = sorted(zip(top, scores), key=lambda item: item[1], reverse=True)
+        if self.cross_encoder_min_score is not None:
+            reranked = [item for item in reranked if item[1] >= self.cross_encoder_min_score]
+        return [doc_id for doc_id, _ in reranked] + ranking[self.cross_encoder_top:]
+
+    def get_cross_encoder(self):
+        """Модель переранжирования, загружается при первом обращении."""
+        with self._cross_encoder_lock:
+            if self._cross_encoder is None:
+                from sentence_transformers import CrossEncoder
+                print(f"✅ Загрузка модели переранжирования {self.cross_encoder_name}")
+                self._cross_encoder = CrossEncoder(self.cross_encoder_name)
+            return self._cross_encoder
+
+    def _similarity_search(self, query: Tuple[List[float], np.ndarray], filter_metadata: Optional[Dict] = None,
+                           k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        Поиск k ближайших записей. При сжатии кандидаты ищутся по сжатым векторам
+        (k * rerank_factor), затем переранжируются по полным векторам из sidecar.
+        Расстояние в обоих случаях - квадрат L2 (как у Chroma), порог `limit` не меняется.
+
+        :param query: эмбеддинг запроса (см. _embed_query), не вычисляется заново
+        :return: [(документ, расстояние)] по возрастанию расстояния
+        """
+        vector, full_query = query
+        stores = self.partitions.for_query(filter_metadata)
+        if self.sidecar is None:
+            results = [item for store in stores for item in store.similarity_search_by_vector_with_relevance_scores(
+                embedding=vector, k=k, filter=filter_metadata
+            )]
+            return sorted(results, key=lambda item: item[1])[:k]
+
+        candidates = [item for store in stores for item in store.similarity_search_by_vector_with_relevance_scores(
+            embedding=vector, k=k * self.rerank_factor, filter=filter_metadata
+        )]
+        if not candidates:
+            return []
+
+        ids = [doc.id for doc, _ in candidates]
+        vectors = self.sidecar.get(ids)
+        missing = [doc for doc, _ in candidates if doc.id not in vectors]
+        if missing:
+            # Записи без полного вектора (например, добавленные в обход add_text) - вычисляем и сохраняем
+            full = self.embedding_model.base.embed_documents([doc.page_content for doc in missing])
+            self.sidecar.put([doc.id for doc in missing], full)
+            vectors.update({doc.id: np.asarray(vector, dtype=np.float32) for doc, vector in zip(missing, full)})
+
+        reranked = [(doc, float(np.sum((vectors[doc.id] - full_query) ** 2))) for doc, _ in candidates]
+        reranked.sort(key=lambda item: item[1])
+        return reranked[:k]
+
+    def _get_by_ids(self, ids: List[str], filter_metadata: Optional[Dict] = None) -> Dict[str, Document]:
+        """Записи с указанными id, удовлетворяющие фильтру: {id: документ}."""
+        if not ids:
+            return {}
+        out = {}
+        for store in self.partitions.for_query(filter_metadata):
+            stored = store.get(ids=ids, where=filter_metadata, include=["documents", "metadatas"])
+            for doc_id, text, meta in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+                out[doc_id] = Document(id=doc_id, page_content=text, metadata=meta or {})
+        return out
+
+    def _matching_ids(self, phrase: str, user: Optional[str], documents: Dict[str, Document]) -> set:
+        """
+        id документов, содержащих фразу: по индексу слов или, без него, по подстроке.
+        Индекс сравнивает слова целиком, поэтому если по нему ничего не найдено
+        (часть слова, только служебные слова), ищется подстрока.
+        """
+        if self.text_index is not None and user is not None:
+            matching = self.text_index.match(phrase, user)
+            if matching:
+                return matching
+        return {doc_id for doc_id, doc in documents.items() if phrase.lower() in doc.page_content.lower()}
+
     def get_notes_filter(self, filter_metadata: Optional[Dict[str, str]] = None,
                          word_for_search: dict = None) -> List:
         """
@@ -121,10 +400,20 @@ class EmbeddingDatabase:
         logger.add_json_answer(param)
         logger.output(console=False)
 
-        results = self.vector_store.get(**param)
-
-        documents = results.get("documents", [])
-        metadatas = results.get("metadatas", [])
+        user, _ = partition_key(filter_metadata)
+        phrase = (word_for_search or {}).get("$contains")
+        if phrase and self.text_index is not None and user is not None:
+            # Слово ищется по индексу, Chroma читает только найденные записи. Индекс сравнивает
+            # слова целиком: если ничего не найдено (часть слова, служебные слова) - поиск подстроки в Chroma
+            ids = self.text_index.match(phrase, user)
+            if ids:
+                param = {"where": filter_metadata, "ids": list(ids)}
+
+        documents, metadatas = [], []
+        for store in self.partitions.for_query(filter_metadata):
+            results = store.get(**param)
+            documents += results.get("documents", [])
+            metadatas += results.get("metadatas", [])
 
         # zip-уем попарно, если кол-во элементов совпадает
         out = [
@@ -148,7 +437,31 @@ class EmbeddingDatabase:
 
         return out
 
-    def load_metadata_entries(self, filepath: str) -> List:
+    def sync_metadata_entries(self, filepath: str) -> None:
+        """
+        Записывает список метаданных в базу, только если он изменился.
+        Раньше список добавлялся при каждом запуске: эмбеддинги вычислялись заново,
+        а в базе копились дубликаты. Теперь сравниваются тексты, без вычисления эмбеддингов.
+
+        :param filepath: файл списка метаданных (см. load_metadata_entries)
+        """
+        documents = self.load_metadata_entries(filepath)
+        stored = self.vector_store.get(where={"system": "metadata_list"}, include=["documents", "metadatas"])
+
+        expected = sorted((doc.metadata["ids"], doc.page_content) for doc in documents)
+        current = sorted((meta.get("ids"), text) for text, meta in zip(stored["documents"], stored["metadatas"]))
+        if expected == current:
+            return
+
+        print("✅ Обновление списка метаданных")
+        if stored["ids"]:
+            self.vector_store.delete(ids=stored["ids"])
+            if self.sidecar is not None:
+                self.sidecar.delete(stored["ids"])
+        self._add([doc.page_content for doc in documents], [doc.metadata for doc in documents])
+
+    @staticmethod
+    def load_metadata_entries(filepath: str) -> List:
         """
         Загружает записи метаданных из текстового файла и преобразует их в список объектов Document
         с метаданными. Формирование списка ids/
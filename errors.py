@@ -28,4 +28,37 @@ class ModelError(Exception):
 class ModelAnswerError(ModelError):
     """Неправильный ответ модели."""
     def __init__(self, message: str):
-        super().__init__(f"⚠️ Модель вернула некорректный ответ. {message}")
\ No newline at end of file
+        super().__init__(f"⚠️ Модель вернула некорректный ответ. {message}")
+
+class FormulaError(ModelAnswerError):
+    """Формула в ответе модели не вычислена: недопустимое выражение, ошибка вычисления или лимит."""
+    def __init__(self, message: str):
+        super().__init__(f"Формула не вычислена: {message}")
+
+class ModelOverloadedError(ModelError):
+    """Запрос не получил квоту провайдера модели за отведенное время."""
+    def __init__(self, model: str):
+        super().__init__(f"⚠️ Модель {model} перегружена, повторите запрос позже.")
+
+class EmbeddingBackendError(ModelError):
+    """Модель эмбеддингов не может быть создана с выбранным бэкендом."""
+    def __init__(self, message: str):
+        super().__init__(f"⚠️ Ошибка бэкенда эмбеддингов. {message}")
+
+class NotificationError(Exception):
+    """Базовый класс для ошибок, связанных с доставкой уведомлений."""
+    pass
+
+class DeliveryError(NotificationError):
+    """Уведомление не доставлено."""
+    def __init__(self, message: str, retry_after: float = None, permanent: bool = False, delivered: set = None):
+        """
+        :param message: описание ошибки
+        :param retry_after: через сколько секунд можно повторить (если известно от получателя)
+        :param permanent: повтор не поможет (например, чат не найден)
+        :param delivered: сообщения пакета, доставленные до ошибки (повторно не отправляются)
+        """
+        super().__init__(f"⚠️ Уведомление не доставлено. {message}")
+        self.retry_after = retry_after
+        self.permanent = permanent
+        self.delivered = delivered or set()
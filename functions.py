@@ -52,13 +52,14 @@ def generate_job_id():
     return f"job_{int(time.time() * 1000)}_{uuid.uuid4().hex[:6]}"
 
 
-def register_job(job_id: str, message: str, job_dict: Dict) -> Job:
+def register_job(job_id: str, message: str, job_dict: Dict, user_id: Optional[int] = None) -> Job:
     """
     Регистрирует задание в планировщике APScheduler на основе словаря параметров.
 
     :param job_id: Уникальный идентификатор задания.
     :param message: сообщение
     :param job_dict: Словарь параметров задания, включая ключ 'trigger' и параметры для соответствующего триггера.
+    :param user_id: Пользователь, которому доставить напоминание.
     :return: Объект созданного задания (Job).
     """
     job_dict = job_dict.copy()  # чтобы не модифицировать оригинальный словарь
@@ -67,7 +68,7 @@ def register_job(job_id: str, message: str, job_dict: Dict) -> Job:
         func=reminder_job,
         trigger=trigger_type,
         id=job_id,
-        kwargs={"job_id": job_id, "message": message},
+        kwargs={"job_id": job_id, "message": message, "user_id": user_id},
         **job_dict
     )
     print(f"Создано задание с ID: {job.id}")
@@ -163,7 +164,7 @@ def get_metadata_response_llm(metadata: List[Dict]) -> Dict:
             continue
 
         # Запрос к БД
-        answer = embedding_db.get_notes_semantic(query_text=text, filter_metadata=filters)
+        answer = embedding_db.get_notes_semantic(query_text=text, filter_metadata=filters, k=1)
         if not answer: continue
         metadata_field = answer[0].get("metadata", {}).get("ids")  # Получаем название поля
         if not metadata_field: continue
@@ -172,25 +173,28 @@ def get_metadata_response_llm(metadata: List[Dict]) -> Dict:
     return out
 
 
-def get_filter_response_llm(response: str) -> List[Dict]:
+def get_filter_response_llm(response: Union[str, List[Dict]]) -> List[Dict]:
     """
-    Преобразует текстовый ответ модели в формате JSON в список
-    выражений для поиска по фильтру
+    Преобразует ответ модели в формате JSON (текст или уже разобранный список)
+    в список выражений для поиска по фильтру
 
     :param response:
     :return: List - список словарей с метаданными [{"рубль, валюта": {"$gt": 5}}, ...]
     """
-    try:
-        answer_list = extract_json_to_dict(response)  # Получаем ответ с метаданными от llm
-    except:
-        return []
+    if isinstance(response, list):
+        answer_list = response
+    else:
+        try:
+            answer_list = extract_json_to_dict(response)  # Получаем ответ с метаданными от llm
+        except:
+            return []
     filters = {"system": {"$eq": "metadata_list"}}
     out = []
     for imem in answer_list:
         text, f = next(iter(imem.items()))  # Категория (определенная ИИ) и фильтр
 
         # Запрос к БД
-        answer = embedding_db.get_notes_semantic(query_text=text, filter_metadata=filters)
+        answer = embedding_db.get_notes_semantic(query_text=text, filter_metadata=filters, k=1)
 
         if not answer: continue
         metadata_field = answer[0].get("metadata", {}).get("ids")  # Получаем название поля
@@ -199,5 +203,3 @@ def get_filter_response_llm(response: str) -> List[Dict]:
 
     return out
 
-
-print(iso_timestamp_converter(1754859599))
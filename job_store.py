@@ -0,0 +1,113 @@
+import pickle
+import threading
+from contextlib import contextmanager
+from typing import List
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from apscheduler.job import Job
+from apscheduler.jobstores.base import ConflictingIdError
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.util import datetime_to_utc_timestamp
+
+
+def _set_sqlite_pragma(dbapi_connection, connection_record) -> None:
+    """
+    Настройки SQLite для большого количества заданий:
+    WAL - чтение следующего задания не ждет записи,
+    synchronous=NORMAL - коммит без fsync на каждую транзакцию (в WAL это безопасно).
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+
+class BulkSQLAlchemyJobStore(SQLAlchemyJobStore):
+    """
+    Хранилище заданий APScheduler для большого количества напоминаний.
+
+    Отличия от SQLAlchemyJobStore:
+    - для SQLite включаются WAL и synchronous=NORMAL;
+    - внутри `batch()` задания, добавленные через `scheduler.add_job()`,
+      не записываются по одному, а копятся и записываются одной транзакцией
+      (запросами по `batch_size` заданий) при выходе из блока: все или ни одного.
+
+    Колонка next_run_time индексируется базовым классом, поэтому поиск
+    следующего задания не замедляется с ростом таблицы.
+
+    Пример:
+        with job_store.batch():
+            for ...:
+                scheduler.add_job(...)
+    """
+
+    def __init__(self, *args, batch_size: int = 500, **kwargs):
+        """
+        :param batch_size: заданий в одной транзакции при пакетной записи
+        Остальные параметры - как у SQLAlchemyJobStore.
+        """
+        super().__init__(*args, **kwargs)
+        self.batch_size = batch_size
+        self._batch = threading.local()  # Пакет копится только в потоке, открывшем batch()
+
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", _set_sqlite_pragma)
+
+    @contextmanager
+    def batch(self):
+        """
+        Пакетная запись заданий, добавленных в этом потоке внутри блока.
+        Вложенные вызовы пишут все задания при выходе из внешнего блока.
+        Если блок завершился исключением или id повторяется, не записывается ни одно задание.
+
+        :raises ConflictingIdError: задание с таким id уже есть
+        """
+        if getattr(self._batch, "jobs", None) is not None:
+            yield  # Уже внутри пакета
+            return
+
+        self._batch.jobs = []
+        self._batch.ids = set()
+        try:
+            yield
+            jobs = self._batch.jobs
+        finally:
+            self._batch.jobs = None
+            self._batch.ids = None
+        self.add_jobs(jobs)
+
+        # Задания записаны после пробуждений планировщика в add_job, будим еще раз
+        scheduler = getattr(self, "_scheduler", None)
+        if scheduler is not None and scheduler.running:
+            scheduler.wakeup()
+
+    def add_job(self, job: Job) -> None:
+        jobs = getattr(self._batch, "jobs", None)
+        if jobs is None:
+            super().add_job(job)
+            return
+        if job.id in self._batch.ids:
+            raise ConflictingIdError(job.id)
+        self._batch.ids.add(job.id)
+        jobs.append(job)
+
+    def add_jobs(self, jobs: List[Job]) -> None:
+        """
+        Записывает задания одной транзакцией, запросами INSERT по `batch_size` заданий.
+
+        :raises ConflictingIdError: задание с таким id уже есть (не записывается ни одно задание)
+        """
+        with self.engine.begin() as connection:
+            for i in range(0, len(jobs), self.batch_size):
+                chunk = jobs[i:i + self.batch_size]
+                rows = [{
+                    "id": job.id,
+                    "next_run_time": datetime_to_utc_timestamp(job.next_run_time),
+                    "job_state": pickle.dumps(job.__getstate__(), self.pickle_protocol),
+                } for job in chunk]
+                try:
+                    connection.execute(self.jobs_t.insert(), rows)
+                except IntegrityError:
+                    raise ConflictingIdError(", ".join(job.id for job in chunk))
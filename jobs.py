@@ -1,6 +1,9 @@
 from datetime import datetime
-from tg_message import send_message
+from config import outbox, NOTIFY_RECIPIENTS, REMINDER_COALESCE_WINDOW
 
-def reminder_job(job_id=None, message=None):
+def reminder_job(job_id=None, message=None, user_id=None):
     print(f"[{datetime.now()}] Задание с ID: {job_id}\n{message}")
-    send_message(message)  # Выводим сообщение
+    # Только ставим в очередь, доставкой занимается воркер (notifications/worker.py).
+    # Напоминания пользователя, сработавшие в пределах окна, уйдут одной сводкой
+    recipients = outbox.recipients_for_user(user_id, default=NOTIFY_RECIPIENTS)
+    outbox.enqueue(message, recipients, job_id=job_id, coalesce_window=REMINDER_COALESCE_WINDOW)
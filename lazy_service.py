@@ -0,0 +1,59 @@
+import time
+import threading
+from typing import Any, Callable, Optional
+
+
+class LazyService:
+    """
+    Ленивая ссылка на сервис: объект создается фабрикой при первом обращении.
+
+    Позволяет импортировать config без загрузки модели эмбеддингов, создания таблиц,
+    планировщика и т.д. Атрибуты и методы сервиса доступны через ссылку напрямую:
+        embedding_db.get_notes_semantic(...)  # Первый вызов создаст EmbeddingDatabase
+
+    Создание потокобезопасно: фабрика вызывается один раз, даже если
+    к сервису одновременно обращаются несколько потоков.
+    Там, где нужен сам объект (isinstance, передача в чужую библиотеку), используется `get()`.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        """
+        :param name: имя сервиса (для сообщений)
+        :param factory: функция без аргументов, создающая сервис
+        """
+        self._name = name
+        self._factory = factory
+        self._instance: Optional[Any] = None
+        self._lock = threading.Lock()
+        self.init_time: Optional[float] = None  # Сек., затраченные на создание
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def initialized(self) -> bool:
+        """Сервис уже создан."""
+        return self._instance is not None
+
+    def get(self) -> Any:
+        """Возвращает сервис, при первом вызове создает его."""
+        instance = self._instance
+        if instance is not None:
+            return instance
+        with self._lock:
+            if self._instance is None:
+                started = time.perf_counter()
+                self._instance = self._factory()
+                self.init_time = time.perf_counter() - started
+            return self._instance
+
+    def __getattr__(self, item: str) -> Any:
+        # Вызывается только для атрибутов, которых нет у самой ссылки
+        if item.startswith("__"):
+            raise AttributeError(item)
+        return getattr(self.get(), item)
+
+    def __repr__(self) -> str:
+        state = "создан" if self.initialized else "не создан"
+        return f"<LazyService {self._name}: {state}>"
@@ -1,18 +1,20 @@
 from time import time
 import json
+import threading
 from datetime import datetime
 
 
 LOGGER_CONFIG = {}  # "console":False, "file":False
 
-class Logger:
+class Logger(threading.local):
     def __init__(self,
                  console: bool = True,
                  file: bool = True,
                  filename: str = "log.log"):
         """
         Регистрация событий и их входных/выходных данных,
-        а так же времени работы
+        а так же времени работы.
+        Буфер и таймеры у каждого потока свои.
 
         :param console: Вывод в консоль
         :param file: Вывод в файл
@@ -0,0 +1,140 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Optional, TypeVar
+
+import openai
+
+T = TypeVar("T")
+
+# Коды ответа провайдера, после которых запрос имеет смысл повторить
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Временная ошибка: таймаут, обрыв соединения, лимит запросов, ошибка сервера."""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Пауза из заголовка Retry-After ответа провайдера, сек."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class CallPolicy:
+    """
+    Таймауты, повторы и дублирующие запросы для вызовов модели.
+
+    - Каждая попытка ограничена таймаутом, весь вызов - общим сроком (deadline).
+    - Временные ошибки (is_retryable) повторяются с паузой: случайная в пределах
+      base * 2^попытка (full jitter) или из заголовка Retry-After.
+    - Дублирующий запрос (hedge): если ответа нет дольше p95 задержки,
+      отправляется второй такой же запрос, используется первый ответ.
+      Удваивает стоимость медленных запросов, поэтому включается настройкой.
+
+    Счетчики вызовов, повторов, дублей и отказов - в stats().
+    """
+
+    def __init__(self, timeout: float = 20.0, deadline: float = 45.0, retries: int = 2,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 hedge: bool = False, hedge_min_delay: float = 1.0, max_workers: int = 8):
+        """
+        :param timeout: сек. на одну попытку
+        :param deadline: сек. на весь вызов с повторами
+        :param retries: повторов после первой попытки
+        :param backoff_base: пауза перед первым повтором (верхняя граница), сек.
+        :param backoff_max: максимальная пауза между повторами, сек.
+        :param hedge: отправлять дублирующий запрос
+        :param hedge_min_delay: не отправлять дубль раньше, сек.
+        :param max_workers: потоков для дублирующих запросов
+        """
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge") if hedge else None
+        self._lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ("calls", "attempts", "retries", "hedges", "hedge_wins", "timeouts", "failures"), 0)
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def backoff(self, attempt: int) -> float:
+        """Пауза перед повтором номер attempt (с 0), сек."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, request: Callable[[float], T], hedge_delay: Optional[float] = None) -> T:
+        """
+        Выполняет запрос по политике.
+
+        :param request: запрос, принимает таймаут попытки в сек.
+        :param hedge_delay: через сколько сек. без ответа отправлять дубль (p95 задержки), None - без дубля
+        :return: результат запроса
+        :raises: последнюю ошибку, если попытки кончились или ошибка не временная
+        """
+        self._count("calls")
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise TimeoutError(f"Срок вызова {self.deadline} с истек")
+                return self._attempt(request, min(self.timeout, remaining), hedge_delay)
+            except Exception as e:
+                if isinstance(e, (openai.APITimeoutError, TimeoutError)):
+                    self._count("timeouts")
+                pause = retry_after(e) or self.backoff(attempt)
+                if attempt >= self.retries or not is_retryable(e) or time.monotonic() + pause >= deadline:
+                    self._count("failures")
+                    raise
+            attempt += 1
+            self._count("retries")
+            time.sleep(pause)
+
+    def _attempt(self, request: Callable[[float], T], timeout: float, hedge_delay: Optional[float]) -> T:
+        """Одна попытка, при необходимости с дублирующим запросом."""
+        self._count("attempts")
+        if not self.hedge or hedge_delay is None:
+            return request(timeout)
+        delay = max(hedge_delay, self.hedge_min_delay)
+        if delay >= timeout:
+            return request(timeout)
+
+        started = time.monotonic()
+        first = self._pool.submit(request, timeout)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        self._count("hedges")
+        second = self._pool.submit(request, timeout - (time.monotonic() - started))
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
@@ -0,0 +1,156 @@
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import tiktoken
+
+EXAMPLES_DIRECTORY = "models/prompts/examples"
+# Место примеров в промпте: <-examples-> - файл примеров промпта, <-examples:имя-> - файл examples/имя.txt
+MARKER = re.compile(r"<-examples(?::([\w-]+))?->")
+QUOTED = re.compile(r"\"([^\"]+)\"")
+
+# Прочитанные файлы примеров: {путь: (время изменения, [(ключи, текст)])}
+_examples_cache: Dict[str, Tuple[float, list]] = {}
+_examples_lock = threading.Lock()
+
+
+def examples_path(prompt_name: str, name: Optional[str] = None, directory: str = EXAMPLES_DIRECTORY) -> str:
+    return os.path.join(directory, f"{name or prompt_name}.txt")
+
+
+def read_examples(path: str) -> List[Tuple[List[str], str]]:
+    """
+    Примеры из файла. Примеры разделены пустыми строками, строки с "#" - комментарии.
+    Первая строка примера - запрос: с запросом пользователя сравниваются фразы
+    в кавычках первой строки, а если их нет - вся строка. Файл читается заново, только если изменился.
+
+    :return: [(фразы для сравнения, текст примера)]
+    """
+    mtime = os.path.getmtime(path)
+    cached = _examples_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.rstrip() for line in f if not line.startswith("#")]
+    examples = []
+    for block in "\n".join(lines).split("\n\n"):
+        block = block.strip("\n")
+        if not block.strip():
+            continue
+        head = block.split("\n", 1)[0]
+        examples.append((QUOTED.findall(head) or [head.strip()], block))
+    with _examples_lock:
+        _examples_cache[path] = (mtime, examples)
+    return examples
+
+
+def fill_examples(content: str, prompt_name: str, directory: str = EXAMPLES_DIRECTORY) -> str:
+    """Подставляет в промпт все примеры (запрос неизвестен или подбор отключен)."""
+    def replace(match: re.Match) -> str:
+        path = examples_path(prompt_name, match.group(1), directory)
+        if not os.path.exists(path):
+            print(f"⚠️ Файл примеров для промпта не найден: {path}")
+            return ""
+        return "\n\n".join(text for _, text in read_examples(path))
+
+    return MARKER.sub(replace, content)
+
+
+class FewShotSelector:
+    """
+    Подбор примеров промпта под запрос (dynamic few-shot).
+
+    Вместо всех примеров файла models/prompts/examples/<промпт>.txt в промпт
+    на место <-examples-> вставляются k самых похожих на запрос пользователя
+    (косинус эмбеддингов запроса и фраз примера) в пределах бюджета токенов.
+    Эмбеддинги примеров вычисляются один раз и пересчитываются, если файл изменился.
+    Отобранные примеры идут в порядке файла, чтобы одинаковые запросы давали одинаковый промпт.
+    """
+
+    def __init__(self, embeddings, directory: str = EXAMPLES_DIRECTORY, k: int = 4,
+                 budget: int = 400, k_by_prompt: Optional[Dict[str, int]] = None, encoding: str = "o200k_base"):
+        """
+        :param embeddings: модель эмбеддингов (embed_query / embed_documents, как embedding_db.embedding_model)
+        :param directory: папка файлов примеров
+        :param k: примеров в промпте
+        :param budget: максимум токенов примеров в промпте
+        :param k_by_prompt: {имя файла примеров: k} - отдельное число примеров
+        :param encoding: кодировка tiktoken для подсчета токенов
+        """
+        self.embeddings = embeddings
+        self.directory = directory
+        self.k = k
+        self.budget = budget
+        self.k_by_prompt = k_by_prompt or {}
+        self.encoding = tiktoken.get_encoding(encoding)
+        self._lock = threading.Lock()
+        # {путь: (время изменения, [(текст, токенов)], эмбеддинги фраз, номер примера каждой фразы)}
+        self._index: Dict[str, tuple] = {}
+        if os.path.isdir(directory):
+            for file in sorted(os.listdir(directory)):
+                if file.endswith(".txt"):
+                    self._load(os.path.join(directory, file))
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def _load(self, path: str) -> tuple:
+        """Индекс файла примеров, пересчитывается, если файл изменился."""
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            index = self._index.get(path)
+        if index is not None and index[0] == mtime:
+            return index
+
+        examples = read_examples(path)
+        keys = [(number, key) for number, (phrases, _) in enumerate(examples) for key in phrases]
+        vectors = np.asarray(self.embeddings.embed_documents([key.lower() for _, key in keys]), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        index = (mtime, [(text, self.count_tokens(text)) for _, text in examples], vectors,
+                 np.array([number for number, _ in keys]))
+        with self._lock:
+            self._index[path] = index
+        return index
+
+    def select(self, path: str, query: str, k: Optional[int] = None) -> List[str]:
+        """
+        Примеры, похожие на запрос.
+
+        :param path: файл примеров
+        :param query: запрос пользователя
+        :param k: примеров, None - по настройке промпта
+        :return: тексты примеров в порядке файла
+        """
+        _, examples, vectors, owners = self._load(path)
+        if k is None:
+            k = self.k_by_prompt.get(os.path.splitext(os.path.basename(path))[0], self.k)
+        query_vector = np.asarray(self.embeddings.embed_query(query.lower()), dtype=np.float32)
+        similarity = vectors @ (query_vector / max(float(np.linalg.norm(query_vector)), 1e-12))
+
+        # Сходство примера - лучшее из сходств его фраз
+        best = np.full(len(examples), -np.inf, dtype=np.float32)
+        np.maximum.at(best, owners, similarity)
+        chosen, used = [], 0
+        for number in np.argsort(-best):
+            if len(chosen) >= k:
+                break
+            tokens = examples[number][1]
+            if used + tokens > self.budget and chosen:
+                continue  # Не вошел в бюджет, может войти следующий, покороче
+            chosen.append(int(number))
+            used += tokens
+        return [examples[number][0] for number in sorted(chosen)]
+
+    def fill(self, content: str, prompt_name: str, query: str) -> str:
+        """Подставляет в промпт примеры, похожие на запрос."""
+        def replace(match: re.Match) -> str:
+            path = examples_path(prompt_name, match.group(1), self.directory)
+            if not os.path.exists(path):
+                print(f"⚠️ Файл примеров для промпта не найден: {path}")
+                return ""
+            return "\n\n".join(self.select(path, query))
+
+        return MARKER.sub(replace, content)
@@ -0,0 +1,239 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import snowballstemmer
+
+from sql_db import SQLiteClient
+
+# Намерения промпта query_parser, которые определяет классификатор
+INTENTS = ("create_list", "create_note", "create_reminder", "clear_list", "delete_list",
+           "update_note", "delete_note", "search")
+
+
+_stemmer = snowballstemmer.stemmer("russian")
+_stemmer_lock = threading.Lock()
+
+
+def match_list_name(text: str, list_names: List[str]) -> str:
+    """
+    Список пользователя, названный в запросе: все слова названия есть в запросе
+    с точностью до окончаний ("в расходах" - "расход"). Из подходящих - самое длинное название.
+
+    :return: название списка или "", если не назван
+    """
+    def stems(value: str) -> List[str]:
+        with _stemmer_lock:
+            return [_stemmer.stemWord(word) for word in re.findall(r"\w+", value.lower().replace("ё", "е"))]
+
+    words = set(stems(text))
+    found = [name for name in list_names if stems(name) and set(stems(name)) <= words]
+    return max(found, key=len, default="")
+
+
+def platt_fit(scores: np.ndarray, correct: np.ndarray, iterations: int = 50) -> Tuple[float, float]:
+    """
+    Калибровка Платта: p = 1 / (1 + exp(-(a * score + b))) по сырым оценкам
+    и признаку верного ответа (метод Ньютона, сглаженные метки).
+
+    :return: (a, b)
+    """
+    positives = correct.sum()
+    negatives = len(correct) - positives
+    # Сглаженные метки, как у Платта: калибровка не уходит в 0 и 1 на малой выборке
+    target = np.where(correct, (positives + 1) / (positives + 2), 1 / (negatives + 2))
+    a, b = 1.0, 0.0
+    for _ in range(iterations):
+        p = 1 / (1 + np.exp(-(a * scores + b)))
+        weight = p * (1 - p) + 1e-9
+        gradient = np.array([((p - target) * scores).sum(), (p - target).sum()])
+        hessian = np.array([[(weight * scores * scores).sum(), (weight * scores).sum()],
+                            [(weight * scores).sum(), weight.sum()]]) + np.eye(2) * 1e-6
+        step = np.linalg.solve(hessian, gradient)
+        a, b = a - step[0], b - step[1]
+        if np.abs(step).max() < 1e-6:
+            break
+    return float(a), float(b)
+
+
+class IntentClassifier:
+    """
+    Локальное определение намерения по эмбеддингам запросов (kNN) вместо промпта query_parser.
+
+    Размеченные запросы хранятся в таблице `intent_examples`: примеры из сценариев
+    tests/*.md (python -m benchmarks.intent_eval --seed) и ответы модели на реальные
+    запросы (add). Запрос сравнивается по косинусу с примерами, k ближайших голосуют
+    с весами softmax(сходство / temperature). Доля голосов победившего намерения
+    калибруется (Платт) по проверке каждого примера на остальных (leave-one-out),
+    поэтому уверенность - оценка вероятности верного ответа, а порог задается в ней.
+    """
+
+    def __init__(self, db_client: SQLiteClient, embeddings, k: int = 7, temperature: float = 0.05,
+                 threshold: float = 0.9, min_examples: int = 30, recalibrate_every: int = 50,
+                 max_examples: int = 5000):
+        """
+        :param db_client: клиент SQLite, в базе которого создана таблица `intent_examples`
+        :param embeddings: модель эмбеддингов (embed_query / embed_documents, как embedding_db.embedding_model)
+        :param k: соседей в голосовании
+        :param temperature: чем меньше, тем сильнее голос ближайших
+        :param threshold: минимальная калиброванная уверенность ответа без модели
+        :param min_examples: примеров, до которых классификатор не отвечает
+        :param recalibrate_every: новых примеров до повторной калибровки
+        :param max_examples: последних примеров в памяти
+        """
+        self.db_client = db_client
+        self.embeddings = embeddings
+        self.k = k
+        self.temperature = temperature
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.recalibrate_every = recalibrate_every
+        self.max_examples = max_examples
+        self._lock = threading.Lock()
+        self._texts: List[str] = []
+        self._labels: List[str] = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._calibration: Optional[Tuple[float, float]] = None
+        self._added = 0  # Новых примеров после калибровки
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()  # Эмбеддинги последних запросов
+        self._stats = {"predicted": 0, "confident": 0, "added": 0}
+        self.load()
+
+    # ------------------------------------------------------------------ примеры
+
+    def load(self) -> None:
+        """Читает примеры из таблицы, вычисляет их эмбеддинги и калибрует уверенность."""
+        rows = self.db_client.execute_sync(
+            "SELECT text, action FROM intent_examples ORDER BY id DESC LIMIT ?", (self.max_examples,))
+        rows.reverse()
+        texts = [row["text"] for row in rows]
+        vectors = self._normalize(np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)) \
+            if texts else np.zeros((0, 0), dtype=np.float32)
+        with self._lock:
+            self._texts = texts
+            self._labels = [row["action"] for row in rows]
+            self._vectors = vectors
+            self._calibrate()
+
+    def add(self, text: str, action: str, source: str = "llm") -> None:
+        """
+        Добавляет размеченный запрос (или меняет разметку такого же текста).
+
+        :param text: запрос пользователя
+        :param action: намерение (INTENTS)
+        :param source: откуда разметка: "llm" - ответ модели, "tests" - сценарии тестирования
+        """
+        text = self._clean(text)
+        if not text or action not in INTENTS:
+            return
+        self.db_client.execute_sync(
+            """INSERT INTO intent_examples (created_at, text, action, source) VALUES (?, ?, ?, ?)
+               ON CONFLICT(text) DO UPDATE SET action = excluded.action, source = excluded.source,
+                                               created_at = excluded.created_at""",
+            (time.time(), text, action, source))
+        vector = self._embed(text)
+        with self._lock:
+            self._stats["added"] += 1
+            if text in self._texts:
+                self._labels[self._texts.index(text)] = action
+                return
+            self._texts.append(text)
+            self._labels.append(action)
+            self._vectors = vector[None, :] if not len(self._vectors) else np.vstack([self._vectors, vector])
+            if len(self._texts) > self.max_examples:
+                self._texts, self._labels = self._texts[1:], self._labels[1:]
+                self._vectors = self._vectors[1:]
+            self._added += 1
+            if self._added >= self.recalibrate_every or self._calibration is None:
+                self._calibrate()
+
+    # ------------------------------------------------------------------ классификация
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        """
+        :param text: запрос пользователя
+        :return: (намерение, калиброванная уверенность 0-1); (None, 0.0) - примеров мало
+        """
+        vector = self._embed(self._clean(text))
+        with self._lock:
+            self._stats["predicted"] += 1
+            if self._calibration is None:
+                return None, 0.0
+            action, score = self._vote(self._vectors @ vector)
+            a, b = self._calibration
+        return action, float(1 / (1 + np.exp(-(a * score + b))))
+
+    def classify(self, text: str) -> Optional[str]:
+        """Намерение, если уверенность не ниже порога, иначе None - нужна модель."""
+        action, confidence = self.predict(text)
+        if action is None or confidence < self.threshold:
+            return None
+        with self._lock:
+            self._stats["confident"] += 1
+        return action
+
+    def stats(self) -> Dict[str, object]:
+        """Примеры по намерениям, калибровка, запросы и доля ответов без модели."""
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for label in self._labels:
+                counts[label] = counts.get(label, 0) + 1
+            return dict(self._stats, examples=counts, threshold=self.threshold,
+                        calibration=None if self._calibration is None else [round(x, 3) for x in self._calibration],
+                        local_share=round(self._stats["confident"] / self._stats["predicted"], 3)
+                        if self._stats["predicted"] else 0.0)
+
+    # ------------------------------------------------------------------ внутреннее
+
+    @staticmethod
+    def _clean(text: str) -> str:
+        return " ".join(text.lower().replace("ё", "е").split())
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+    def _embed(self, text: str) -> np.ndarray:
+        """Эмбеддинг запроса: predict и следующий за ним add считают его один раз."""
+        with self._lock:
+            if text in self._cache:
+                self._cache.move_to_end(text)
+                return self._cache[text]
+        vector = self._normalize(np.asarray(self.embeddings.embed_query(text), dtype=np.float32))
+        with self._lock:
+            self._cache[text] = vector
+            if len(self._cache) > 256:
+                self._cache.popitem(last=False)
+        return vector
+
+    def _vote(self, similarity: np.ndarray, exclude: Optional[int] = None) -> Tuple[str, float]:
+        """Голосование k ближайших: (намерение, доля его голосов)."""
+        if exclude is not None:
+            similarity = similarity.copy()
+            similarity[exclude] = -np.inf
+        k = min(self.k, len(similarity) - (exclude is not None))
+        nearest = np.argpartition(-similarity, k - 1)[:k]
+        weights = np.exp((similarity[nearest] - similarity[nearest].max()) / self.temperature)
+        votes: Dict[str, float] = {}
+        for index, weight in zip(nearest, weights):
+            votes[self._labels[index]] = votes.get(self._labels[index], 0.0) + float(weight)
+        action = max(votes, key=votes.get)
+        return action, votes[action] / sum(votes.values())
+
+    def _calibrate(self) -> None:
+        """Калибровка по leave-one-out: каждый пример классифицируется по остальным."""
+        self._added = 0
+        if len(self._texts) < max(self.min_examples, self.k + 1) or len(set(self._labels)) < 2:
+            self._calibration = None
+            return
+        scores, correct = [], []
+        for start in range(0, len(self._texts), 512):  # Сходства частями, без матрицы n x n в памяти
+            similarity = self._vectors[start:start + 512] @ self._vectors.T
+            for offset, row in enumerate(similarity):
+                action, score = self._vote(row, exclude=start + offset)
+                scores.append(score)
+                correct.append(action == self._labels[start + offset])
+        self._calibration = platt_fit(np.asarray(scores), np.asarray(correct))
@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Union
+from typing import Any, Callable, Dict, List, Union
 
 from models.provider_client import WorkerThread
 from functions import extract_json_to_dict
@@ -27,8 +27,11 @@ class LLMTaskRunner:
         prompt_name: str = "",
         model: str = "",
         addition: str = "",
+        default_model: str = None,
+        route: str = "",
         timer_label: str = "LLM Task Execution",
         logger_config: Dict = LOGGER_CONFIG,
+        parse: Callable[[str], Any] = extract_json_to_dict,
     ) -> None:
         """
         Инициализирует исполнителя LLM-задачи.
@@ -36,17 +39,24 @@ class LLMTaskRunner:
         Args:
             query: Входной текстовый запрос.
             prompt_name: Имя промпта, определяющего задачу (например, 'extract_dates', 'classify_intent').
-            model: Модель для вызова (например, 'gpt-4.1-mini').
+            model: Модель для вызова (например, 'gpt-4.1-mini'). Пусто - выбор по статистике
+                (config.model_router), при неразобранном ответе повтор на более сильной модели.
             addition: Дополнение к запросу
+            default_model: Модель при выборе по статистике, пока ее мало.
+            route: Маршрут статистики выбора модели, по умолчанию имя промпта.
             timer_label: Название для таймера в логах.
             logger_config: Конфигурация логгера. Если None — используется LOGGER_CONFIG.
+            parse: Разбор ответа, None или исключение - ответ не разобран (повтор на более сильной модели).
         """
         self.query = query
         self.addition = addition
         self.prompt_name = prompt_name
         self.model = model
+        self.default_model = default_model
+        self.route = route
         self.timer_label = timer_label
         self.logger_config = logger_config
+        self.parse = parse
 
         self.logger_thread = None
         self.thread = None
@@ -76,12 +86,15 @@ class LLMTaskRunner:
             query=self.query,
             model=self.model,
             addition=self.addition,
+            default_model=self.default_model,
+            route=self.route,
+            parse=self.parse,
         )
 
         # Логирование начала
         self.logger_thread.add_separator(type_sep=2)
         self.logger_thread.timer_start(self.timer_label)
-        self.logger_thread.add_text(f"Модель: {self.model}")
+        self.logger_thread.add_text(f"Модель: {self.model or 'по статистике'}")
         self.logger_thread.add_text(f"Промпт: {self.prompt_name}")
         self.logger_thread.add_text(f"Запрос: {self.query}")
         self.logger_thread.output()
@@ -118,14 +131,17 @@ class LLMTaskRunner:
             return []
 
         self.thread.join()
+        if self.thread.error is not None:
+            raise self.thread.error  # Модель перегружена, ответа не будет
 
-        # Обработка результата — может вернуть list, dict
-        result = extract_json_to_dict(self.thread.result)
+        # Результат уже разобран в потоке — list, dict или None
+        result = self.thread.result
+        self.model = self.thread.model  # Выбранная модель
 
         # Логируем ответ модели
         self.logger_thread.add_separator(type_sep=2)
         self.logger_thread.timer_stop(self.timer_label)  # Останавливаем таймер
-        self.logger_thread.add_text("Ответ модели:")
+        self.logger_thread.add_text(f"Ответ модели {self.model}:")
         if not result:
             self.logger_thread.add_text("Нет ответа")
         self.logger_thread.output()
@@ -141,6 +157,9 @@ class LLMTaskRunner:
         elif isinstance(result, dict):
             self.logger_thread.add_json_answer(result)
             self.logger_thread.output(console=True, file=True)
+        elif isinstance(result, str):
+            self.logger_thread.add_text(result)
+            self.logger_thread.output(console=True, file=True)
             # self.logger_thread.add_json_answer(read_filter(result))
             # self.logger_thread.output(console=True, file=False)
 
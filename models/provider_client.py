@@ -1,13 +1,24 @@
 import os
 import re
+import time
 import openai
 import asyncio
 import threading
-from typing import Optional
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
 from dotenv import load_dotenv
 from langsmith import traceable
 from langsmith.wrappers import wrap_openai
 
+from user import user
+from config import (model_router, call_policy, single_flight, rate_governor, usage_meter, few_shot,
+                    LLM_TIMEOUT, LLM_SINGLE_FLIGHT, LLM_PRIORITIES, LLM_COMPLETION_ESTIMATE, LLM_BACKOFF_MAX,
+                    PROMPT_LAYOUT, PROMPT_TIME_PRECISION, FEW_SHOT)
+from errors import ModelOverloadedError
+from models.call_policy import retry_after
+from models.few_shot import MARKER as EXAMPLES_MARKER, fill_examples
+from models.single_flight import request_key
+from models.rate_governor import estimate_tokens, PRIORITY_NORMAL
 from services import get_current_time_and_weekday
 
 # Выбор провайдера модели
@@ -20,6 +31,72 @@ PROVIDER_URL = "https://api.cometapi.com/v1"
 key_name = "COMETAPI_KEY"
 MODEL_PROVIDER_KEY = os.getenv(key_name)
 DEFAULT_TEMPERATURE = 0
+PROMPTS_DIRECTORY = "models/prompts"
+
+# Прочитанные промпты: {имя: (время изменения файлов, system, user, файлы)}
+_prompt_cache: Dict[str, tuple] = {}
+_prompt_lock = threading.Lock()
+
+
+def _read_prompt_files(query_prompt: str) -> Tuple[str, str, list]:
+    """Читает файл промпта, разделяет system и user части, подставляет вставки <-имя->."""
+    # Имя файла с промптом
+    prompt_name = os.path.join(PROMPTS_DIRECTORY, query_prompt + ".txt")
+    files = [prompt_name]
+
+    with open(prompt_name, "r", encoding="utf-8") as f:
+        content = f.read().split("---")  # Разделяем system и user по "---"
+
+    # Извлекаем системную часть промпта
+    system_prompt = content[0].replace("SYSTEM:\n", "").strip()
+    content = content[1].replace("USER:\n", "").strip()  # И User часть
+
+    # Шаблон: всё между <- и ->
+    pattern = r"<-([^<>]+)->"
+    for match in re.findall(pattern, content):
+        if EXAMPLES_MARKER.fullmatch(f"<-{match}->"):
+            continue  # Примеры подставляет AIClient.load_prompt
+        replacement_file = os.path.join(PROMPTS_DIRECTORY, f"{match}.txt")
+        if os.path.exists(replacement_file):
+            files.append(replacement_file)
+            with open(replacement_file, 'r', encoding='utf-8') as rf:
+                replacement_text = rf.read().strip()
+                content = content.replace(f"<-{match}->", f"\n{replacement_text}\n")
+        else:
+            print(f"⚠️ Файл вставки в промпт не найден: {replacement_file}")
+    return system_prompt, content, files
+
+
+def read_prompt(query_prompt: str) -> Tuple[str, str]:
+    """
+    System и User части промпта. Файлы читаются заново, только если изменились.
+
+    :param query_prompt: имя файла промпта без расширения
+    :return: (system, user)
+    """
+    cached = _prompt_cache.get(query_prompt)
+    if cached is not None:
+        mtimes, system_prompt, content, files = cached
+        try:
+            if tuple(os.path.getmtime(file) for file in files) == mtimes:
+                return system_prompt, content
+        except OSError:
+            pass
+    system_prompt, content, files = _read_prompt_files(query_prompt)
+    with _prompt_lock:
+        _prompt_cache[query_prompt] = (tuple(os.path.getmtime(file) for file in files), system_prompt, content, files)
+    return system_prompt, content
+
+
+def coarse_time(iso_time: str, precision: str = "minute") -> str:
+    """
+    Время ISO 8601 с нужной точностью: "minute" - до минут, "day" - только дата.
+    Секунды и доли секунды промптам не нужны, а делают каждый запрос уникальным.
+    """
+    moment = datetime.fromisoformat(iso_time)
+    if precision == "day":
+        return moment.date().isoformat()
+    return moment.isoformat(timespec="minutes")
 
 class AIClient:
     """
@@ -44,15 +121,23 @@ class AIClient:
         """
         self.model = model
         self.system_prompt = ""
+        self.instructions = ""  # User часть промпта без даты
+        self.now = ""  # Строка текущей даты для промпта
         self.user_base_prompt = ""
         self.prompt_name = ""
+        self.route_name = ""  # Маршрут для статистики выбора модели (models/router.py)
+        self.priority: Optional[int] = None  # Класс приоритета в очереди к провайдеру, None - по промпту
+        self.user_id: Optional[int] = None  # Пользователь в учете расхода, None - текущий пользователь потока
         # self.client = openai.OpenAI(api_key=api_key)
         # self.client = wrap_openai(openai.OpenAI(api_key=api_key))
 
         # Создаём клиент с указанием CometAPI
+        # Повторы и таймауты задает config.call_policy, собственные повторы клиента отключены
         raw_client = openai.OpenAI(
             api_key=MODEL_PROVIDER_KEY,
-            base_url=PROVIDER_URL
+            base_url=PROVIDER_URL,
+            timeout=LLM_TIMEOUT,
+            max_retries=0
         )
 
         # Оборачиваем его для трассировки через LangSmith
@@ -67,50 +152,83 @@ class AIClient:
         """
         self.model = model_name
 
-    def load_prompt(self, query_prompt: str) -> None:
+    def route(self, route: str = "", default: str = None, floor: str = None) -> str:
+        """
+        Выбирает модель по статистике вызовов (config.model_router).
+
+        Args:
+            route (str): Маршрут, по умолчанию имя загруженного промпта.
+                Уточнение через ":" ведет отдельную статистику (например "query_parser:dates").
+            default (str): Модель, пока по маршруту мало статистики.
+            floor (str): Самая слабая допустимая модель.
+        Returns:
+            str: выбранная модель
+        """
+        self.route_name = route or self.prompt_name
+        self.model = model_router.choose(self.route_name, default=default, floor=floor)
+        return self.model
+
+    def load_prompt(self, query_prompt: str, query: Optional[str] = None) -> None:
         """
         Загрузка промптов.
 
         Args:
             query_prompt (str): имя файла который содержит промпты для запроса.
+            query (str): запрос пользователя, по нему подбираются примеры промпта (<-examples->),
+                None - в промпт вставляются все примеры.
         """
         # Получение сегодняшней даты и времени
         iso_time, weekday_name = get_current_time_and_weekday()
-        # Имя файла с промптом
-        prompt_name = "models/prompts/" + query_prompt + ".txt"
-
-        """Читает файл и разделяет system и user промпты."""
-        with open(prompt_name, "r", encoding="utf-8") as f:
-            content = f.read().split("---")  # Разделяем system и user по "---"
 
-            # Извлекаем и сохраняем системную часть промпта
-            self.system_prompt = content[0].replace("SYSTEM:\n", "").strip()
-            content = content[1].replace("USER:\n", "").strip()  # И User часть
+        # Системная часть и User часть со вставками, файлы читаются один раз
+        self.system_prompt, self.instructions = read_prompt(query_prompt)
 
-            # Шаблон: всё между <- и ->
-            pattern = r"<-([^<>]+)->"
-            matches = re.findall(pattern, content)
+        # Примеры: только похожие на запрос (config.few_shot) или все
+        if EXAMPLES_MARKER.search(self.instructions):
+            if FEW_SHOT and query:
+                self.instructions = few_shot.fill(self.instructions, query_prompt, query)
+            else:
+                self.instructions = fill_examples(self.instructions, query_prompt)
 
-            base_dir = os.path.dirname(prompt_name)
+        # Дата и время для User части промпта
+        self.now = f"Сейчас: {iso_time} {weekday_name}"
+        if PROMPT_LAYOUT == "cache":
+            precision = PROMPT_TIME_PRECISION.get(query_prompt, "minute")
+            self.now = f"Сейчас: {coarse_time(iso_time, precision)} {weekday_name}"
 
-            for match in matches:
-                replacement_file = os.path.join(base_dir, f"{match}.txt")
-                if os.path.exists(replacement_file):
-                    with open(replacement_file, 'r', encoding='utf-8') as rf:
-                        replacement_text = rf.read().strip()
-                        replacement_block = f"\n{replacement_text}\n"
-                        content = content.replace(f"<-{match}->", replacement_block)
-                else:
-                    print(f"⚠️ Файл вставки в промпт не найден: {replacement_file}")
+        # Добавляем дату и время в User часть промпта
+        self.user_base_prompt = f"{self.now}\n\n{self.instructions}"
 
-            # Добавляем дату и время в User часть промпта
-            self.user_base_prompt = f"Сейчас: {iso_time} {weekday_name}\n\n"
+        # Запоминаем какой промпт используем
+        self.prompt_name = query_prompt
+        self.route_name = query_prompt
 
-            # Добавляем USER часть промпта со вставками
-            self.user_base_prompt += content
-
-            # Запоминаем какой промпт используем
-            self.prompt_name = query_prompt
+    def build_messages(self, user_message: str, addition: str = "") -> list:
+        """
+        Сообщения запроса к модели.
+
+        В режиме "cache" (config.PROMPT_LAYOUT) сначала идет неизменная часть:
+        системный промпт и инструкции User части, затем меняющаяся от запроса
+        к запросу: дата, дополнения (списки пользователя) и сообщение.
+        Последняя строка инструкций, если это заголовок сообщения ("Запрос:"), переносится к сообщению.
+        Провайдер кэширует совпадающее начало запросов (от 1024 токенов),
+        поэтому инструкции промпта не обрабатываются заново.
+        В режиме "legacy" - прежний порядок: дополнения, дата, инструкции, сообщение.
+        """
+        if PROMPT_LAYOUT == "cache":
+            context = f"{self.now}\n\n{addition}" if addition else self.now
+            # Заголовок сообщения ("Запрос:") остается непосредственно перед ним
+            head, _, label = self.instructions.rpartition("\n")
+            if head and label.rstrip().endswith(":"):
+                content = f"{head.rstrip()}\n\n{context}\n\n{label}\n{user_message}"
+            else:
+                content = f"{self.instructions}\n\n{context}\n{user_message}"
+        else:
+            content = f"{addition}\n\n{self.user_base_prompt}\n{user_message}"
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": content}
+        ]
 
     def report(self) -> str:
         """
@@ -121,30 +239,109 @@ class AIClient:
 
     @traceable
     def chat_sync(self, user_message: str, addition: str = "",
-                  temperature = DEFAULT_TEMPERATURE) -> Optional[str]:
+                  temperature = DEFAULT_TEMPERATURE, response_format: Optional[dict] = None) -> Optional[str]:
         """
-        Синхронный вызов OpenAI API.
+        Синхронный вызов OpenAI API с таймаутом, повторами при временных ошибках
+        и, если включен, дублирующим запросом (config.call_policy).
+        Одинаковые одновременные запросы выполняются один раз (config.single_flight).
+        Перед отправкой запрос ждет квоты провайдера (config.rate_governor).
+        Расход токенов и задержка записываются в config.usage_meter.
 
         Args:
             user_message (str): Текст пользовательского сообщения.
             addition (str): Динамические дополнения записываются вначале
+            response_format (dict): Формат ответа, например JSON схема (models/structured_output.py)
         Returns:
             Optional[str]: Ответ от OpenAI, либо None в случае ошибки.
+        Raises:
+            ModelOverloadedError: Квота провайдера не получена за время вызова.
         """
+        model = self.model
+        messages = self.build_messages(user_message, addition)
+
+        estimated = sum(estimate_tokens(message["content"]) for message in messages) + LLM_COMPLETION_ESTIMATE
+        priority = self.priority if self.priority is not None else LLM_PRIORITIES.get(self.prompt_name,
+                                                                                       PRIORITY_NORMAL)
+
+        options = {"response_format": response_format} if response_format else {}
+
+        def request(timeout: float):
+            waited = rate_governor.acquire(model, estimated, priority, timeout=timeout)
+            try:
+                response = self.client.chat.completions.create(
+                    model=model, messages=messages, temperature=temperature, timeout=max(1.0, timeout - waited),
+                    **options)
+            except openai.RateLimitError as e:
+                rate_governor.penalize(model, retry_after(e) or LLM_BACKOFF_MAX)
+                raise
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                rate_governor.settle(model, estimated, usage.total_tokens)
+            return response
+
+        def call():
+            return call_policy.call(request, hedge_delay=model_router.latency_p95(self.route_name, model))
+
+        started = time.perf_counter()
+        shared = False  # Ответ получен от такого же запроса другого потока, в статистику не пишется
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": f"{addition}\n\n{self.user_base_prompt}\n{user_message}"}
-                ],
-                temperature=temperature
-            )
-            return response.choices[0].message.content
+            if LLM_SINGLE_FLIGHT:
+                response, shared = single_flight.do(request_key(model, temperature, response_format, *messages), call)
+            else:
+                response = call()
+        except ModelOverloadedError:
+            self._record(model, time.perf_counter() - started, ok=False)
+            raise
         except Exception as e:
+            self._record(model, time.perf_counter() - started, ok=False)
             print(f"Ошибка запроса к OpenAI: {e}")
             return None
 
+        if not shared:
+            self._record(model, time.perf_counter() - started, usage=getattr(response, "usage", None))
+        return response.choices[0].message.content
+
+    def _record(self, model: str, latency: float, ok: bool = True, usage=None) -> None:
+        """Записывает вызов в статистику выбора модели и учет расхода."""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+        model_router.record(self.route_name, model, latency, ok=ok,
+                            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        usage_meter.record(self.user_id if self.user_id is not None else user.id, self.prompt_name, model, latency,
+                           prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           cached_tokens=cached_tokens, ok=ok)
+
+    def chat_parsed(self, user_message: str, parse: Callable[[str], Any], addition: str = "") -> Any:
+        """
+        Запрос к модели с разбором ответа. Если ответ не разобран,
+        запрос повторяется на следующей по силе модели (config.model_router).
+
+        Args:
+            user_message (str): Текст пользовательского сообщения.
+            parse (Callable): Разбор ответа, None или исключение - ответ не разобран.
+            addition (str): Динамические дополнения записываются вначале
+        Returns:
+            Any: Разобранный ответ, либо None.
+        """
+        while True:
+            answer = self.chat_sync(user_message, addition=addition)
+            if answer is None:
+                return None  # Ошибка запроса, повторы на уровне запроса
+            try:
+                result = parse(answer)
+            except Exception:
+                result = None
+            if result is not None:
+                return result
+
+            model_router.record_parse_failure(self.route_name, self.model)
+            stronger = model_router.stronger(self.model)
+            if stronger is None:
+                return None
+            print(f"⚠️ Ответ {self.model} не разобран ({self.route_name}), повтор на {stronger}")
+            self.model = stronger
+
     async def chat(self, user_message: str) -> Optional[str]:
         """
         Асинхронный вызов OpenAI API (выполняется в отдельном потоке).
@@ -158,6 +355,16 @@ class AIClient:
         return await asyncio.to_thread(self.chat_sync, user_message)
 
 
+class LocalAIClient(threading.local, AIClient):
+    """
+    Клиент с отдельными моделью и промптом для каждого потока.
+
+    Используется как общий клиент сервиса (config.provider_client),
+    чтобы параллельно обрабатываемые запросы не перезаписывали
+    промпт и модель друг друга.
+    """
+
+
 class WorkerThread(threading.Thread):
     """
     Поток для обработки запроса к модели.
@@ -165,22 +372,30 @@ class WorkerThread(threading.Thread):
     Args:
         create_note (str): Название промпта для загрузки.
         query (str): Запрос для модели.
-        model (str): Название модели.
-
+        model (str): Название модели, пусто - выбор по статистике.
+        default_model (str): Модель при выборе по статистике, пока ее мало.
+        route (str): Маршрут статистики, по умолчанию имя промпта.
+        parse (Callable): Разбор ответа, result - разобранный ответ.
 
     Attributes:
-        result (Optional[str]): Результат запроса после выполнения потока.
+        result (Optional[Any]): Результат запроса после выполнения потока.
     """
 
-    def __init__(self, prompt_name: str, query: str, model: str = "gpt-4.1-mini", addition: str = ""):
+    def __init__(self, prompt_name: str, query: str, model: str = "", addition: str = "",
+                 default_model: str = None, parse: Callable[[str], Any] = None, route: str = ""):
         super().__init__()
         # print("✅ Инициализация клиента провайдера модели")
         self.openai_client: AIClient = AIClient()  # Создаем объект
+        self.openai_client.user_id = user.id  # Пользователь потока, создавшего задачу
         self.prompt_name: str = prompt_name
         self.query: str = query
-        self.model = model
+        self.model = model  # Пусто - выбор модели по статистике (AIClient.route)
+        self.default_model = default_model
+        self.route_name = route
         self.addition = addition
-        self.result: Optional[str] = None  # Здесь будет результат после выполнения
+        self.parse = parse  # Разбор ответа с повтором на более сильной модели (AIClient.chat_parsed)
+        self.result: Optional[Any] = None  # Здесь будет результат после выполнения
+        self.error: Optional[Exception] = None  # Модель перегружена (ModelOverloadedError)
 
     def run(self) -> None:
         """Запускает обработку запроса в модели и записывает результат.
@@ -188,6 +403,19 @@ class WorkerThread(threading.Thread):
         Args:
         addition (str): Дополнение к запросу
         """
-        self.openai_client.load_prompt(self.prompt_name)  # Загружаем промпт
-        self.openai_client.set_model(self.model)
-        self.result = self.openai_client.chat_sync(" " + self.query, self.addition)  # Получаем ответ
+        try:
+            self._run()
+        except ModelOverloadedError as e:
+            self.error = e
+
+    def _run(self) -> None:
+        self.openai_client.load_prompt(self.prompt_name, self.query)  # Загружаем промпт
+        if self.model:
+            self.openai_client.set_model(self.model)
+        else:
+            self.model = self.openai_client.route(self.route_name, default=self.default_model)
+        if self.parse:
+            self.result = self.openai_client.chat_parsed(" " + self.query, self.parse, self.addition)
+            self.model = self.openai_client.model  # Модель могла смениться на более сильную
+        else:
+            self.result = self.openai_client.chat_sync(" " + self.query, self.addition)  # Получаем ответ
@@ -0,0 +1,153 @@
+import time
+import heapq
+import itertools
+import threading
+from typing import Dict, Optional, Tuple
+
+from errors import ModelOverloadedError
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка токенов текста до запроса (русский текст - около 3 символов на токен)."""
+    return len(text) // 3 + 1
+
+
+# Классы приоритета: меньше - раньше
+PRIORITY_INTERACTIVE = 0  # Разбор намерения пользователя, от него зависит весь ответ
+PRIORITY_NORMAL = 1  # Остальные запросы команд
+PRIORITY_BACKGROUND = 2  # Фоновая работа, может подождать
+
+
+class TokenBucket:
+    """
+    Ведро с поминутной квотой: пополняется равномерно, до полной квоты.
+    Уровень может уйти в минус, если запрос больше квоты или реальный расход
+    оказался больше оценки, - долг гасится пополнением.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Сек. до момента, когда в ведре будет amount (но не больше полной квоты)."""
+        self.refill(now)
+        need = min(amount, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+
+class RateGovernor:
+    """
+    Общий для процесса ограничитель запросов к провайдеру модели.
+
+    Для каждой модели два ведра: запросы в минуту (RPM) и токены в минуту (TPM).
+    Перед отправкой запрос ждет квоты в очереди модели: сначала по классу
+    приоритета (разбор намерения раньше остальной работы), внутри класса - по
+    порядку поступления. Запрос, не получивший квоты за отведенное время,
+    отклоняется с ModelOverloadedError.
+
+    Токены запроса заранее неизвестны: списывается оценка, после ответа
+    разница с реальным расходом возвращается или доплачивается (settle).
+    Ответ 429 от провайдера останавливает выдачу квоты модели на Retry-After (penalize).
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], default: Tuple[float, float] = (500, 30000)):
+        """
+        :param limits: {модель: (запросов в минуту, токенов в минуту)}
+        :param default: лимиты моделей, которых нет в limits
+        """
+        self.limits = limits
+        self.default = default
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._buckets: Dict[str, Tuple[TokenBucket, TokenBucket]] = {}
+        self._queues: Dict[str, list] = {}
+        self._blocked_until: Dict[str, float] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _model(self, model: str) -> Tuple[TokenBucket, TokenBucket]:
+        if model not in self._buckets:
+            rpm, tpm = self.limits.get(model, self.default)
+            self._buckets[model] = (TokenBucket(rpm), TokenBucket(tpm))
+            self._queues[model] = []
+            self._stats[model] = dict.fromkeys(("granted", "rejected", "throttled", "wait_seconds"), 0)
+        return self._buckets[model]
+
+    def acquire(self, model: str, tokens: int, priority: int = PRIORITY_NORMAL,
+                timeout: Optional[float] = None) -> float:
+        """
+        Ждет квоты на запрос и списывает ее.
+
+        :param model: модель
+        :param tokens: оценка токенов запроса и ответа
+        :param priority: класс приоритета (PRIORITY_*)
+        :param timeout: сек. ожидания, None - без ограничения
+        :return: сек. ожидания
+        :raises ModelOverloadedError: квота не получена за timeout
+        """
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        waiter = (priority, next(self._seq))
+        with self._cond:
+            requests, token_bucket = self._model(model)
+            queue = self._queues[model]
+            heapq.heappush(queue, waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None  # Не первый в очереди - ждать уведомления
+                    if queue[0] == waiter:
+                        wait = max(requests.wait_time(1, now), token_bucket.wait_time(tokens, now),
+                                   self._blocked_until.get(model, 0.0) - now)
+                        if wait <= 0:
+                            requests.level -= 1
+                            token_bucket.level -= tokens
+                            waited = now - started
+                            self._stats[model]["granted"] += 1
+                            self._stats[model]["wait_seconds"] += waited
+                            return waited
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self._stats[model]["rejected"] += 1
+                            raise ModelOverloadedError(model)
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                if waiter in queue:
+                    queue.remove(waiter)
+                    heapq.heapify(queue)
+                self._cond.notify_all()
+
+    def settle(self, model: str, estimated: int, actual: int) -> None:
+        """Уточняет списанные токены по реальному расходу из ответа."""
+        with self._cond:
+            token_bucket = self._model(model)[1]
+            token_bucket.level = min(token_bucket.capacity, token_bucket.level + estimated - actual)
+            self._cond.notify_all()
+
+    def penalize(self, model: str, seconds: float) -> None:
+        """Провайдер ответил 429: квота модели не выдается seconds сек."""
+        with self._cond:
+            self._model(model)
+            self._blocked_until[model] = max(self._blocked_until.get(model, 0.0), time.monotonic() + seconds)
+            self._stats[model]["throttled"] += 1
+
+    def stats(self) -> Dict[str, dict]:
+        """{модель: выдано, отклонено, 429 от провайдера, сек. ожидания, в очереди, остаток квот}"""
+        with self._cond:
+            now = time.monotonic()
+            out = {}
+            for model, (requests, token_bucket) in self._buckets.items():
+                requests.refill(now)
+                token_bucket.refill(now)
+                out[model] = dict(self._stats[model], wait_seconds=round(self._stats[model]["wait_seconds"], 3),
+                                  waiting=len(self._queues[model]),
+                                  requests_left=int(requests.level), tokens_left=int(token_bucket.level))
+            return out
@@ -0,0 +1,154 @@
+import random
+import threading
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+
+class RouteStats:
+    """
+    Статистика вызовов одной модели на одном маршруте (промпте).
+    Задержки хранятся в скользящем окне последних вызовов.
+    """
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.errors = 0  # Ошибки запроса к провайдеру
+        self.parse_failures = 0  # Ответ получен, но не разобран
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = deque(maxlen=window)
+
+    @property
+    def failure_rate(self) -> float:
+        return (self.errors + self.parse_failures) / self.calls if self.calls else 0.0
+
+    @property
+    def p95(self) -> float:
+        """95-й перцентиль задержки, сек."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def cost(self, price: Tuple[float, float]) -> float:
+        """Стоимость всех вызовов, $ (цена за 1М входных и выходных токенов)."""
+        return (self.prompt_tokens * price[0] + self.completion_tokens * price[1]) / 1_000_000
+
+
+class ModelRouter:
+    """
+    Выбор модели для запроса по статистике вызовов.
+
+    Модели упорядочены от дешевой к сильной. Для маршрута (имени промпта,
+    возможно с уточнением, например "query_parser:dates") выбирается
+    самая дешевая модель, которая по накопленной статистике укладывается в SLO:
+    95-й перцентиль задержки и доля отказов (ошибки провайдера и неразобранные ответы).
+
+    Пока данных мало, используется модель по умолчанию маршрута (прежний ручной выбор),
+    а более дешевые модели изредка пробуются, чтобы набрать по ним статистику.
+    Если ответ модели не разобран, вызывающий код повторяет запрос
+    на следующей по силе модели (stronger).
+    """
+
+    def __init__(self, models: Dict[str, Tuple[float, float]], slo_latency: float = 8.0,
+                 slo_failure_rate: float = 0.05, min_samples: int = 20, window: int = 200,
+                 explore: float = 0.05):
+        """
+        :param models: {модель: (цена за 1М входных токенов, за 1М выходных)} от дешевой к сильной
+        :param slo_latency: допустимый 95-й перцентиль задержки, сек.
+        :param slo_failure_rate: допустимая доля отказов
+        :param min_samples: вызовов, после которых статистике модели можно доверять
+        :param window: вызовов в окне задержек
+        :param explore: вероятность попробовать более дешевую модель без статистики
+        """
+        self.models = models
+        self.order = list(models)
+        self.slo_latency = slo_latency
+        self.slo_failure_rate = slo_failure_rate
+        self.min_samples = min_samples
+        self.window = window
+        self.explore = explore
+        self._lock = threading.Lock()
+        self._routes: Dict[Tuple[str, str], RouteStats] = {}
+
+    def _stats(self, route: str, model: str) -> RouteStats:
+        stats = self._routes.get((route, model))
+        if stats is None:
+            stats = self._routes[(route, model)] = RouteStats(self.window)
+        return stats
+
+    def meets_slo(self, stats: RouteStats) -> bool:
+        return stats.p95 <= self.slo_latency and stats.failure_rate <= self.slo_failure_rate
+
+    def choose(self, route: str, default: Optional[str] = None, floor: Optional[str] = None) -> str:
+        """
+        Модель для маршрута.
+
+        :param route: маршрут (имя промпта)
+        :param default: модель, пока по маршруту нет статистики
+        :param floor: самая слабая допустимая модель
+        :return: название модели
+        """
+        start = self.order.index(floor) if floor in self.models else 0
+        prior = max(start, self.order.index(default) if default in self.models else start)
+        with self._lock:
+            for i in range(start, len(self.order)):
+                stats = self._routes.get((route, self.order[i]))
+                if stats is not None and stats.calls >= self.min_samples:
+                    if self.meets_slo(stats):
+                        return self.order[i]
+                    continue
+                # Мало данных: модель по умолчанию или изредка более дешевая
+                if i >= prior or random.random() < self.explore:
+                    return self.order[i]
+        return self.order[-1]
+
+    def latency_p95(self, route: str, model: str) -> Optional[float]:
+        """p95 задержки модели на маршруте, None - мало статистики."""
+        with self._lock:
+            stats = self._routes.get((route, model))
+            if stats is None or len(stats.latencies) < self.min_samples:
+                return None
+            return stats.p95
+
+    def stronger(self, model: str) -> Optional[str]:
+        """Следующая по силе модель, None - сильнее нет."""
+        if model not in self.models:
+            return None
+        i = self.order.index(model)
+        return self.order[i + 1] if i + 1 < len(self.order) else None
+
+    def record(self, route: str, model: str, latency: float, ok: bool = True,
+               prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+        """Записывает вызов модели."""
+        with self._lock:
+            stats = self._stats(route, model)
+            stats.calls += 1
+            stats.errors += not ok
+            stats.latencies.append(latency)
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+
+    def record_parse_failure(self, route: str, model: str) -> None:
+        """Ответ модели не разобран (уже записанный вызов считается отказом)."""
+        with self._lock:
+            self._stats(route, model).parse_failures += 1
+
+    def stats(self) -> Dict[str, Dict[str, dict]]:
+        """{маршрут: {модель: статистика}}"""
+        out: Dict[str, Dict[str, dict]] = {}
+        with self._lock:
+            for (route, model), stats in sorted(self._routes.items()):
+                price = self.models.get(model, (0.0, 0.0))
+                out.setdefault(route, {})[model] = {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "parse_failures": stats.parse_failures,
+                    "failure_rate": round(stats.failure_rate, 4),
+                    "p95_latency": round(stats.p95, 3),
+                    "prompt_tokens": stats.prompt_tokens,
+                    "completion_tokens": stats.completion_tokens,
+                    "cost_usd": round(stats.cost(price), 6),
+                    "meets_slo": stats.calls >= self.min_samples and self.meets_slo(stats),
+                }
+        return out
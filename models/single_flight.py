@@ -0,0 +1,78 @@
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+
+def request_key(*parts: Any) -> str:
+    """Ключ запроса: хэш модели, параметров и полного текста сообщений."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class _Call:
+    """Выполняющийся запрос, его ждут повторившие его потоки."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных запросов (single flight).
+
+    Пока запрос с ключом выполняется, такие же запросы из других потоков
+    не отправляются, а ждут и получают его результат (или его ошибку).
+    Завершенные запросы не кэшируются: следующий запрос с тем же ключом
+    выполняется заново, поэтому поведение не меняется, снижается только
+    нагрузка на провайдера при всплесках одинаковых запросов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._stats = {"leaders": 0, "followers": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Выполняет fn или ждет результата такого же выполняющегося запроса.
+
+        :param key: ключ запроса (request_key)
+        :param fn: запрос
+        :return: (результат, True - результат получен от чужого запроса)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._stats["leaders"] += 1
+                leader = True
+            else:
+                self._stats["followers"] += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        """Выполненные запросы (leaders), объединенные с ними (followers) и выполняющиеся сейчас."""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
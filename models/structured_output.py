@@ -0,0 +1,102 @@
+import json
+from typing import Optional
+
+import jsonschema
+
+# Команды промпта query_parser, true/false - подтверждение или отказ
+ACTIONS = ["create_list", "create_note", "create_reminder", "clear_list", "delete_list",
+           "update_note", "delete_note", "search"]
+OPERATORS = ["$eq", "$gt", "$gte", "$lt", "$lte"]
+FLAG = {"type": "integer", "enum": [0, 1]}
+
+# Разбор поискового запроса (промпт search и числа промпта search_filter).
+# Строгий режим не допускает произвольных ключей, поэтому фильтры - массивы объектов
+SEARCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "filters": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "field": {"type": "string", "enum": ["datetime_create", "datetime_reminder"]},
+                    "operator": {"type": "string", "enum": OPERATORS},
+                    "value": {"type": "string"},
+                },
+                "required": ["field", "operator", "value"],
+                "additionalProperties": False,
+            },
+        },
+        "numbers": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "unit": {"type": "string"},
+                    "operator": {"type": "string", "enum": OPERATORS},
+                    "value": {"type": "number"},
+                },
+                "required": ["unit", "operator", "value"],
+                "additionalProperties": False,
+            },
+        },
+        "essence": {"type": "string"},
+        "where_document": {"type": "string"},
+        "complex": {"type": "number"},
+        "need_filter": FLAG,
+        "query_is_about_lists": FLAG,
+        "need_count": FLAG,
+        "semantic": FLAG,
+        "need_analysis": FLAG,
+        "need_calculation": FLAG,
+    },
+    "required": ["filters", "numbers", "essence", "where_document", "complex", "need_filter",
+                 "query_is_about_lists", "need_count", "semantic", "need_analysis", "need_calculation"],
+    "additionalProperties": False,
+}
+
+# Ответ промпта search_combined: намерение (query_parser) и, для поиска, разбор запроса
+COMBINED_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "action": {"anyOf": [{"type": "string", "enum": ACTIONS}, {"type": "boolean"}]},
+        "query": {"type": "string"},
+        "list_name": {"type": "string"},
+        "search": {"anyOf": [SEARCH_SCHEMA, {"type": "null"}]},
+    },
+    "required": ["action", "query", "list_name", "search"],
+    "additionalProperties": False,
+}
+
+# Параметр response_format запроса к модели (AIClient.chat_sync)
+COMBINED_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "search_combined", "strict": True, "schema": COMBINED_SCHEMA},
+}
+
+_validator = jsonschema.Draft202012Validator(COMBINED_SCHEMA)
+
+
+def parse_combined(answer: str) -> Optional[dict]:
+    """
+    Проверяет ответ промпта search_combined по схеме и приводит разбор поиска
+    к форматам ответов промптов search и search_filter.
+
+    :param answer: ответ модели (JSON)
+    :return: {"action", "query", "list_name", "search": {..., "filters": [{поле: {оператор: дата}}],
+        "numbers": [{единица: {оператор: число}}]} или None}; None - ответ не прошел проверку
+    """
+    try:
+        data = json.loads(answer)
+    except (TypeError, ValueError):
+        return None
+    if next(_validator.iter_errors(data), None) is not None:
+        return None
+
+    search = data["search"]
+    if search is None:
+        return None if data["action"] == "search" else data
+    search = dict(search,
+                  filters=[{item["field"]: {item["operator"]: item["value"]}} for item in search["filters"]],
+                  numbers=[{item["unit"]: {item["operator"]: item["value"]}} for item in search["numbers"]])
+    return dict(data, search=search)
@@ -0,0 +1,118 @@
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sql_db import SQLiteClient
+
+
+def cached_share(cached_tokens: int, prompt_tokens: int) -> float:
+    """Доля токенов запроса, взятых из кэша провайдера."""
+    return round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0.0
+
+
+def percentile(values: List[float], share: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+class UsageMeter:
+    """
+    Учет расхода токенов и задержек вызовов модели.
+
+    Каждый вызов (AIClient.chat_sync) записывается в таблицу `llm_usage`:
+    пользователь, промпт, модель, токены запроса, ответа и взятые из кэша
+    провайдера, задержка и успех. В памяти процесса ведутся суммы с момента
+    запуска (totals), отчет за период строится по таблице (report).
+    """
+
+    def __init__(self, db_client: SQLiteClient, prices: Dict[str, Tuple[float, float]]):
+        """
+        :param db_client: клиент SQLite, в базе которого создана таблица `llm_usage`
+        :param prices: {модель: (цена $ за 1М входных токенов, за 1М выходных)}
+        """
+        self.db_client = db_client
+        self.prices = prices
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+    def record(self, user_id: Optional[int], prompt_name: str, model: str, latency: float,
+               prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0,
+               ok: bool = True) -> None:
+        """Записывает вызов модели."""
+        with self._lock:
+            totals = self._totals.setdefault((prompt_name, model), dict.fromkeys(
+                ("calls", "errors", "prompt_tokens", "completion_tokens", "cached_tokens", "latency"), 0))
+            totals["calls"] += 1
+            totals["errors"] += not ok
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cached_tokens"] += cached_tokens
+            totals["latency"] += latency
+        try:
+            self.db_client.execute_sync(
+                """INSERT INTO llm_usage (created_at, user_id, prompt_name, model, prompt_tokens,
+                                          completion_tokens, cached_tokens, latency, ok)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (time.time(), user_id, prompt_name, model, prompt_tokens, completion_tokens,
+                 cached_tokens, latency, int(ok)))
+        except Exception as e:
+            print(f"⚠️ Расход модели не записан: {e}")
+
+    def totals(self) -> Dict[str, Dict[str, dict]]:
+        """Суммы с момента запуска: {промпт: {модель: вызовы, токены, средняя задержка, стоимость}}"""
+        out: Dict[str, Dict[str, dict]] = {}
+        with self._lock:
+            for (prompt_name, model), totals in sorted(self._totals.items()):
+                out.setdefault(prompt_name, {})[model] = dict(
+                    totals,
+                    latency=round(totals["latency"] / totals["calls"], 3),
+                    cached_share=cached_share(totals["cached_tokens"], totals["prompt_tokens"]),
+                    cost_usd=round(self.cost(model, totals["prompt_tokens"], totals["completion_tokens"]), 6))
+        return out
+
+    def report(self, since: Optional[float] = None, user_id: Optional[int] = None,
+               group_by: str = "prompt_name", top: int = 10) -> List[dict]:
+        """
+        Отчет по таблице `llm_usage`: группы с наибольшим расходом токенов.
+
+        :param since: с какого времени (unix), None - за все время
+        :param user_id: только вызовы пользователя
+        :param group_by: группировка: "prompt_name", "model" или "user_id"
+        :param top: групп в отчете
+        :return: [{группа, вызовы, ошибки, токены, из кэша и их доля, p95 задержки, стоимость}] по убыванию токенов
+        """
+        if group_by not in ("prompt_name", "model", "user_id"):
+            raise ValueError(f"Нет такой группировки: {group_by}")
+        sql = "SELECT * FROM llm_usage WHERE created_at >= ?"
+        params = [since or 0]
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            params.append(user_id)
+        groups: Dict[str, dict] = {}
+        for row in self.db_client.execute_sync(sql, tuple(params)):
+            group = groups.setdefault(str(row[group_by]), {
+                group_by: row[group_by], "calls": 0, "errors": 0, "prompt_tokens": 0,
+                "completion_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0, "latencies": []})
+            group["calls"] += 1
+            group["errors"] += not row["ok"]
+            group["prompt_tokens"] += row["prompt_tokens"]
+            group["completion_tokens"] += row["completion_tokens"]
+            group["cached_tokens"] += row["cached_tokens"]
+            group["cost_usd"] += self.cost(row["model"], row["prompt_tokens"], row["completion_tokens"])
+            group["latencies"].append(row["latency"])
+
+        out = []
+        for group in groups.values():
+            latencies = group.pop("latencies")
+            group["tokens"] = group["prompt_tokens"] + group["completion_tokens"]
+            group["p95_latency"] = round(percentile(latencies, 0.95), 3)
+            group["cost_usd"] = round(group["cost_usd"], 6)
+            group["cached_share"] = cached_share(group["cached_tokens"], group["prompt_tokens"])
+            out.append(group)
+        return sorted(out, key=lambda group: group["tokens"], reverse=True)[:top]
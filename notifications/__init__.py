@@ -0,0 +1,7 @@
+from .outbox import NotificationOutbox
+from .worker import DeliveryWorker
+from .transports import (Transport, TelegramTransport, DesktopTransport,
+                         WebhookTransport, LocalSinkTransport)
+
+__all__ = ["NotificationOutbox", "DeliveryWorker", "Transport", "TelegramTransport",
+           "DesktopTransport", "WebhookTransport", "LocalSinkTransport"]
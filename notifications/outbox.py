@@ -0,0 +1,186 @@
+import time
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from sql_db import SQLiteClient
+
+
+class NotificationOutbox:
+    """
+    Очередь исходящих уведомлений в таблице `notification_outbox`.
+
+    Задания планировщика только записывают сообщение в очередь (синхронно, быстро),
+    доставкой занимается отдельный воркер (notifications/worker.py).
+    Очередь хранится в SQLite и переживает перезапуск сервиса.
+
+    Статусы записи:
+        pending — ждет доставки (с момента next_attempt_at),
+        sending — взята воркером,
+        sent — доставлена,
+        failed — доставить не удалось, попытки исчерпаны.
+    """
+
+    def __init__(self, db_client: SQLiteClient):
+        """
+        :param db_client: клиент SQLite, в базе которого создана таблица `notification_outbox`
+        """
+        self.db_client = db_client
+        self._listeners: List[Callable[[], None]] = []  # Вызываются после записи в очередь
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """
+        Регистрирует функцию, которая вызывается после записи в очередь
+        (например, чтобы разбудить воркер доставки).
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def recipients_for_user(self, user_id: Optional[int],
+                            default: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        Способы доставки уведомлений пользователю из таблицы `user_notifications`.
+
+        :param user_id: идентификатор пользователя (None - пользователь неизвестен)
+        :param default: получатели, если у пользователя ничего не настроено
+        :return: [(транспорт, получатель), ...]
+        """
+        if user_id is None:
+            return default
+        rows = self.db_client.execute_sync(
+            "SELECT transport, target FROM user_notifications WHERE user_id = ? ORDER BY id", (user_id,))
+        return [(row["transport"], row["target"] or "") for row in rows] or default
+
+    def enqueue(self, message: str, recipients: List[Tuple[str, str]],
+                job_id: Optional[str] = None, delay: float = 0.0,
+                coalesce_window: float = 0.0) -> None:
+        """
+        Записывает сообщение в очередь для каждого получателя (синхронно).
+
+        При `coalesce_window > 0` сообщения одному получателю собираются в сводку:
+        первое сообщение откладывается на `coalesce_window` секунд, следующие
+        получают то же время доставки, и воркер отправляет их одним пакетом.
+        Поиск открытой сводки и запись идут в одной транзакции с блокировкой записи,
+        поэтому задания, сработавшие одновременно, не открывают две сводки.
+
+        :param message: текст уведомления
+        :param recipients: [(транспорт, получатель), ...], например [("telegram", "249503190")]
+        :param job_id: идентификатор задания планировщика (для поиска в логе)
+        :param delay: через сколько секунд можно доставлять
+        :param coalesce_window: окно сбора сводки (сек), 0 - отправлять сразу
+        """
+        with self.db_client.transaction_sync() as cursor:
+            now = time.time()  # После получения блокировки: сводки других заданий уже записаны
+            for transport, recipient in recipients:
+                next_attempt_at = now + delay
+                if coalesce_window > 0:
+                    # Присоединяемся к уже открытой сводке получателя
+                    due = cursor.execute(
+                        "SELECT MAX(next_attempt_at) FROM notification_outbox "
+                        "WHERE transport = ? AND recipient = ? AND status = 'pending' AND attempts = 0 "
+                        "AND next_attempt_at > ?",
+                        (transport, recipient, now)).fetchone()[0]
+                    next_attempt_at = due if due and due <= now + coalesce_window else now + coalesce_window
+                cursor.execute(
+                    "INSERT INTO notification_outbox (job_id, transport, recipient, message, next_attempt_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (job_id, transport, recipient, message, next_attempt_at)
+                )
+
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            callback()
+
+    async def connect(self) -> aiosqlite.Connection:
+        """Асинхронное соединение с базой очереди (для воркера доставки)."""
+        conn = await aiosqlite.connect(self.db_client.db_path, timeout=30)
+        conn.row_factory = aiosqlite.Row
+        return conn
+
+    @staticmethod
+    async def reset_stale(conn: aiosqlite.Connection) -> None:
+        """
+        Возвращает в очередь записи, взятые воркером, но не доставленные
+        (сервис был остановлен во время доставки).
+        """
+        await conn.execute("UPDATE notification_outbox SET status = 'pending' WHERE status = 'sending'")
+        await conn.commit()
+
+    @staticmethod
+    async def claim_due(conn: aiosqlite.Connection, limit: int, lookahead: float = 0.0) -> List[Dict]:
+        """
+        Забирает записи, которые пора доставлять, и помечает их как взятые.
+
+        :param limit: максимальное количество записей
+        :param lookahead: вместе с записями, которым пора, забрать новые (не повторные)
+                          записи тех же получателей, ожидающие сводки не дольше `lookahead` сек
+        :return: список записей [{id, job_id, transport, recipient, message, attempts}, ...]
+        """
+        now = time.time()
+        async with conn.execute(
+                "SELECT id, job_id, transport, recipient, message, attempts FROM notification_outbox "
+                "WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (now, limit)) as cursor:
+            rows = [dict(row) async for row in cursor]
+
+        if rows and lookahead > 0:
+            # Сообщения тех же получателей, попавшие в соседнюю сводку, уходят в этот пакет
+            claimed = {row["id"] for row in rows}
+            for transport, recipient in {(row["transport"], row["recipient"]) for row in rows}:
+                async with conn.execute(
+                        "SELECT id, job_id, transport, recipient, message, attempts FROM notification_outbox "
+                        "WHERE transport = ? AND recipient = ? AND status = 'pending' AND attempts = 0 "
+                        "AND next_attempt_at > ? AND next_attempt_at <= ? ORDER BY next_attempt_at",
+                        (transport, recipient, now, now + lookahead)) as cursor:
+                    rows.extend([dict(row) async for row in cursor if row["id"] not in claimed])
+
+        if rows:
+            await conn.executemany("UPDATE notification_outbox SET status = 'sending' WHERE id = ?",
+                                   [(row["id"],) for row in rows])
+            await conn.commit()
+        return rows
+
+    @staticmethod
+    async def next_due_in(conn: aiosqlite.Connection) -> Optional[float]:
+        """
+        Через сколько секунд наступит время ближайшей доставки.
+
+        :return: секунды или None, если очередь пуста
+        """
+        async with conn.execute(
+                "SELECT MIN(next_attempt_at) FROM notification_outbox WHERE status = 'pending'") as cursor:
+            row = await cursor.fetchone()
+        if not row or row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    @staticmethod
+    async def mark_sent(conn: aiosqlite.Connection, ids: List[int]) -> None:
+        """Помечает записи как доставленные."""
+        await conn.executemany(
+            "UPDATE notification_outbox SET status = 'sent', attempts = attempts + 1, "
+            "sent_at = CURRENT_TIMESTAMP, last_error = NULL WHERE id = ?",
+            [(i,) for i in ids])
+        await conn.commit()
+
+    @staticmethod
+    async def mark_retry(conn: aiosqlite.Connection, ids: List[int], delay: float, error: str) -> None:
+        """Возвращает записи в очередь для повторной попытки через `delay` секунд."""
+        await conn.executemany(
+            "UPDATE notification_outbox SET status = 'pending', attempts = attempts + 1, "
+            "next_attempt_at = ?, last_error = ? WHERE id = ?",
+            [(time.time() + delay, error, i) for i in ids])
+        await conn.commit()
+
+    @staticmethod
+    async def mark_failed(conn: aiosqlite.Connection, ids: List[int], error: str) -> None:
+        """Помечает записи как недоставленные (попытки исчерпаны)."""
+        await conn.executemany(
+            "UPDATE notification_outbox SET status = 'failed', attempts = attempts + 1, "
+            "last_error = ? WHERE id = ?",
+            [(error, i) for i in ids])
+        await conn.commit()
@@ -0,0 +1,275 @@
+import json
+import time
+import queue
+import asyncio
+from typing import Dict, List, Optional
+
+import httpx
+
+from errors import DeliveryError
+
+
+class AsyncRateLimiter:
+    """
+    Ограничитель частоты (token bucket) для asyncio.
+    Ожидающие получают разрешение в порядке очереди.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        """
+        :param rate: разрешений в секунду
+        :param capacity: сколько разрешений можно получить подряд без ожидания
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Ждет и забирает одно разрешение."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def format_digest(messages: List[str]) -> List[str]:
+    """
+    Строки сводки из нескольких напоминаний: заголовок и по строке на напоминание.
+    Одинаковые сообщения (например, повтор интервального напоминания) выводятся один раз.
+
+    :return: строки сводки, для одного сообщения - только оно само
+    """
+    unique = list(dict.fromkeys(messages))
+    if len(unique) == 1:
+        return unique
+    return [f"🔔 Напоминания ({len(unique)}):"] + [f"• {message}" for message in unique]
+
+
+class Transport:
+    """
+    Базовый класс транспорта уведомлений.
+
+    Транспорт получает получателя (его формат зависит от транспорта:
+    chat_id, URL, пустая строка) и текст сообщения.
+    Все методы вызываются в цикле asyncio воркера доставки.
+
+    Атрибуты:
+        name (str): Имя транспорта в таблицах `notification_outbox` и `user_notifications`.
+        max_batch (int): Сколько сообщений одному получателю можно отправить одним вызовом.
+    """
+
+    name = ""
+    max_batch = 1
+
+    async def open(self, http: httpx.AsyncClient) -> None:
+        """
+        Подготовка транспорта при запуске воркера.
+
+        :param http: общий пул HTTP-соединений воркера
+        """
+        pass
+
+    async def close(self) -> None:
+        """Освобождение ресурсов при остановке воркера."""
+        pass
+
+    async def send(self, recipient: str, message: str) -> None:
+        """
+        Отправляет одно сообщение.
+
+        :raises DeliveryError: сообщение не доставлено
+        """
+        raise NotImplementedError
+
+    async def send_batch(self, recipient: str, messages: List[str]) -> None:
+        """
+        Отправляет несколько сообщений одному получателю.
+        По умолчанию по одному, транспорты с `max_batch > 1` отправляют их вместе.
+
+        :raises DeliveryError: сообщения не доставлены; уже доставленные - в `delivered`
+        """
+        delivered = set()
+        for message in messages:
+            try:
+                await self.send(recipient, message)
+            except DeliveryError as e:
+                e.delivered |= delivered
+                raise
+            delivered.add(message)
+
+
+class TelegramTransport(Transport):
+    """
+    Сообщения в Telegram через Bot API.
+    Частота ограничена лимитами Telegram: общий лимит бота и лимит на один чат.
+    Пакет сообщений одному чату отправляется сводкой в одном сообщении (до 4096 символов).
+    """
+
+    name = "telegram"
+    max_batch = 20
+    max_length = 4096  # Лимит длины сообщения Telegram
+
+    def __init__(self, token: str, rate_global: float = 30.0, rate_per_chat: float = 1.0):
+        """
+        :param token: токен бота
+        :param rate_global: сообщений в секунду для всех чатов
+        :param rate_per_chat: сообщений в секунду в один чат
+        """
+        self.token = token
+        self.rate_global = rate_global
+        self.rate_per_chat = rate_per_chat
+        self._http: Optional[httpx.AsyncClient] = None
+        self._global_limiter: Optional[AsyncRateLimiter] = None
+        self._chat_limiters: Dict[str, AsyncRateLimiter] = {}
+
+    async def open(self, http: httpx.AsyncClient) -> None:
+        self._http = http
+        self._global_limiter = AsyncRateLimiter(self.rate_global, capacity=self.rate_global)
+        self._chat_limiters = {}
+
+    async def send(self, recipient: str, message: str) -> None:
+        limiter = self._chat_limiters.get(recipient)
+        if limiter is None:
+            limiter = self._chat_limiters[recipient] = AsyncRateLimiter(self.rate_per_chat)
+        await limiter.acquire()
+        await self._global_limiter.acquire()
+
+        try:
+            response = await self._http.post(f"https://api.telegram.org/bot{self.token}/sendMessage",
+                                             json={"chat_id": recipient, "text": message})
+        except httpx.HTTPError as e:
+            raise DeliveryError(f"Ошибка соединения с Telegram: {e!r}")
+
+        if response.status_code == 200:
+            return
+        try:
+            retry_after = response.json().get("parameters", {}).get("retry_after")
+        except ValueError:
+            retry_after = None
+        if response.status_code == 429 or response.status_code >= 500:
+            raise DeliveryError(f"Telegram ответил {response.status_code}.", retry_after=retry_after)
+        raise DeliveryError(f"Telegram ответил {response.status_code}: {response.text}", permanent=True)
+
+    async def send_batch(self, recipient: str, messages: List[str]) -> None:
+        # Сводка одним сообщением, если длиннее лимита Telegram - несколькими.
+        # Части: (текст, сообщения в нем), строка сообщения не делится между частями
+        lines = format_digest(messages)
+        unique = list(dict.fromkeys(messages))
+        line_messages = [[]] * (len(lines) - len(unique)) + [[message] for message in unique]
+        parts = [("", [])]
+        for line, line_message in zip(lines, line_messages):
+            text, included = parts[-1]
+            candidate = f"{text}\n{line}" if text else line
+            if len(candidate) <= self.max_length or not text:
+                parts[-1] = (candidate[:self.max_length], included + line_message)
+            else:
+                parts.append((line[:self.max_length], line_message))
+
+        delivered = set()
+        for text, included in parts:
+            try:
+                await self.send(recipient, text)
+            except DeliveryError as e:
+                # Доставленные части не повторяются: воркер отметит их сообщения отправленными
+                e.delivered |= delivered
+                raise
+            delivered.update(included)
+
+
+class DesktopTransport(Transport):
+    """Системное уведомление Ubuntu (notify-send). Получатель не используется."""
+
+    name = "desktop"
+    max_batch = 20
+
+    async def send(self, recipient: str, message: str) -> None:
+        try:
+            process = await asyncio.create_subprocess_exec("notify-send", "Органайзер", message)
+        except OSError as e:
+            raise DeliveryError(f"notify-send недоступен: {e}", permanent=True)
+        if await process.wait() != 0:
+            raise DeliveryError("notify-send завершился с ошибкой.")
+
+    async def send_batch(self, recipient: str, messages: List[str]) -> None:
+        await self.send(recipient, "\n".join(format_digest(messages)))  # Одно уведомление на пакет
+
+
+class WebhookTransport(Transport):
+    """
+    POST-запрос на URL получателя.
+    Тело запроса: {"messages": [текст, ...]}, пакет отправляется одним запросом.
+    """
+
+    name = "webhook"
+    max_batch = 100
+
+    def __init__(self):
+        self._http: Optional[httpx.AsyncClient] = None
+
+    async def open(self, http: httpx.AsyncClient) -> None:
+        self._http = http
+
+    async def send(self, recipient: str, message: str) -> None:
+        await self.send_batch(recipient, [message])
+
+    async def send_batch(self, recipient: str, messages: List[str]) -> None:
+        if not recipient:
+            raise DeliveryError("Не указан URL вебхука.", permanent=True)
+        try:
+            response = await self._http.post(recipient, json={"messages": messages})
+        except httpx.HTTPError as e:
+            raise DeliveryError(f"Ошибка соединения с вебхуком: {e!r}")
+        if response.status_code < 300:
+            return
+        retry_after = response.headers.get("Retry-After")
+        if response.status_code == 429 or response.status_code >= 500:
+            raise DeliveryError(f"Вебхук ответил {response.status_code}.",
+                                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None)
+        raise DeliveryError(f"Вебхук ответил {response.status_code}.", permanent=True)
+
+
+class LocalSinkTransport(Transport):
+    """
+    Локальный приемник без сети и рабочего стола: для тестов и замеров.
+
+    Каждое сообщение записывается строкой JSON в файл (если указан)
+    и кладется в потокобезопасную очередь `messages`:
+    {"recipient": ..., "message": ..., "delivered_at": unix time}
+    """
+
+    name = "local"
+    max_batch = 1000
+
+    def __init__(self, path: Optional[str] = None, keep_in_memory: bool = True):
+        """
+        :param path: файл для записи сообщений (JSON Lines), None - не писать в файл
+        :param keep_in_memory: класть сообщения в очередь `messages`
+        """
+        self.path = path
+        self.keep_in_memory = keep_in_memory
+        self.messages: "queue.Queue[Dict]" = queue.Queue()
+        self.delivered = 0  # Доставлено сообщений с момента создания
+        self.batches = 0  # Вызовов отправки (сводка - один вызов)
+
+    async def send(self, recipient: str, message: str) -> None:
+        await self.send_batch(recipient, [message])
+
+    async def send_batch(self, recipient: str, messages: List[str]) -> None:
+        delivered_at = time.time()
+        records = [{"recipient": recipient, "message": message, "delivered_at": delivered_at}
+                   for message in messages]
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        if self.keep_in_memory:
+            for record in records:
+                self.messages.put(record)
+        self.delivered += len(records)
+        self.batches += 1
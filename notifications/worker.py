@@ -0,0 +1,201 @@
+import random
+import asyncio
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from errors import DeliveryError
+from notifications.outbox import NotificationOutbox
+from notifications.transports import Transport
+
+
+class DeliveryWorker:
+    """
+    Воркер доставки уведомлений из очереди `notification_outbox`.
+
+    Работает в отдельном потоке со своим циклом asyncio, поэтому
+    не занимает потоки APScheduler и сервера. Отправка выполняется
+    транспортами (notifications/transports.py) через общий пул HTTP-соединений.
+    Записи одному получателю, взятые за один проход, отправляются пакетом,
+    если транспорт это поддерживает. Неудачные отправки повторяются
+    с экспоненциальной задержкой.
+    """
+
+    def __init__(self, outbox: NotificationOutbox, transports: Dict[str, Transport],
+                 batch_size: int = 50, poll_interval: float = 5.0,
+                 max_attempts: int = 8, retry_base: float = 2.0, retry_max: float = 600.0,
+                 http_timeout: float = 10.0, http_connections: int = 30,
+                 coalesce_window: float = 0.0):
+        """
+        :param outbox: очередь уведомлений
+        :param transports: транспорты {имя: транспорт}
+        :param batch_size: сколько записей забирать из очереди за раз
+        :param poll_interval: максимальная пауза между проверками очереди (сек)
+        :param max_attempts: попыток доставки до статуса failed
+        :param retry_base: задержка перед первой повторной попыткой (сек), дальше удваивается
+        :param retry_max: максимальная задержка между попытками (сек)
+        :param http_timeout: таймаут HTTP-запроса (сек)
+        :param http_connections: размер пула HTTP-соединений
+        :param coalesce_window: окно сбора сводки (сек), см. NotificationOutbox.enqueue
+        """
+        self.outbox = outbox
+        self.transports = transports
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.http_timeout = http_timeout
+        self.http_connections = http_connections
+        self.coalesce_window = coalesce_window
+
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+        self.outbox.add_listener(self.wakeup)  # Новое сообщение в очереди будит воркер
+
+    def start(self) -> None:
+        """Запускает воркер в отдельном потоке."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._run()),
+                                        name="delivery-worker", daemon=True)
+        self._thread.start()
+        print("✅ Запущен воркер доставки уведомлений")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """
+        Останавливает воркер. Начатые отправки завершаются,
+        остальные записи остаются в очереди до следующего запуска.
+        """
+        self._stopping = True
+        self.wakeup()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def wakeup(self) -> None:
+        """Будит воркер (можно вызывать из любого потока)."""
+        loop, event = self._loop, self._wakeup
+        if loop and event and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # Цикл уже остановлен
+
+    async def _run(self) -> None:
+        """Основной цикл: забирает записи, которым пора, и доставляет их."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+
+        limits = httpx.Limits(max_connections=self.http_connections, max_keepalive_connections=10)
+        async with httpx.AsyncClient(timeout=self.http_timeout, limits=limits) as http:
+            for transport in self.transports.values():
+                await transport.open(http)
+            conn = await self.outbox.connect()
+            try:
+                await self.outbox.reset_stale(conn)
+                while not self._stopping:
+                    try:
+                        rows = await self.outbox.claim_due(conn, self.batch_size, lookahead=self.coalesce_window)
+                        if rows:
+                            # Отправка параллельно, запись результатов в очередь последовательно
+                            results = await asyncio.gather(*(self._deliver(transport, recipient, group)
+                                                             for (transport, recipient), group in self._group(rows)))
+                            for ids, error, delay in (result for group in results for result in group):
+                                await self._save_result(conn, ids, error, delay)
+                            continue
+                    except Exception as e:
+                        print(f"⚠️ Ошибка воркера доставки: {e!r}")
+                        await asyncio.sleep(self.poll_interval)
+                        continue
+
+                    # Очередь пуста или время доставки не наступило — спим до ближайшей записи
+                    self._wakeup.clear()
+                    due_in = await self.outbox.next_due_in(conn)
+                    timeout = self.poll_interval if due_in is None else min(due_in, self.poll_interval)
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                await conn.close()
+                for transport in self.transports.values():
+                    await transport.close()
+
+    def _group(self, rows: List[Dict]) -> List[Tuple[Tuple[str, str], List[Dict]]]:
+        """
+        Группирует записи по (транспорт, получатель) с сохранением порядка
+        и делит группы на пакеты не больше `max_batch` транспорта.
+        """
+        groups: Dict[Tuple[str, str], List[Dict]] = {}
+        for row in rows:
+            groups.setdefault((row["transport"], row["recipient"]), []).append(row)
+
+        out = []
+        for key, group in groups.items():
+            transport = self.transports.get(key[0])
+            size = max(1, transport.max_batch if transport else 1)
+            for i in range(0, len(group), size):
+                out.append((key, group[i:i + size]))
+        return out
+
+    async def _deliver(self, transport_name: str, recipient: str,
+                       rows: List[Dict]) -> List[Tuple[List[int], Optional[DeliveryError], Optional[float]]]:
+        """
+        Доставляет пакет записей одному получателю. Не выбрасывает исключений:
+        любая ошибка транспорта возвращается как DeliveryError.
+        Если пакет доставлен частично, доставленные записи отмечаются отправленными
+        и повторно не отправляются.
+
+        :return: [(id записей, ошибка или None, задержка до повтора или None - повтора не будет)]
+        """
+        ids = [row["id"] for row in rows]
+        try:
+            transport = self.transports.get(transport_name)
+            if transport is None:
+                raise DeliveryError(f"Неизвестный транспорт '{transport_name}'.", permanent=True)
+            if len(rows) == 1:
+                await transport.send(recipient, rows[0]["message"])
+            else:
+                await transport.send_batch(recipient, [row["message"] for row in rows])
+        except DeliveryError as e:
+            error = e
+        except Exception as e:
+            # Непредвиденная ошибка транспорта - тоже повтор, чтобы записи не остались в статусе 'sending'
+            error = DeliveryError(f"Ошибка транспорта '{transport_name}': {e!r}")
+        else:
+            return [(ids, None, None)]
+
+        results = []
+        if error.delivered:
+            results.append(([row["id"] for row in rows if row["message"] in error.delivered], None, None))
+            rows = [row for row in rows if row["message"] not in error.delivered]
+            ids = [row["id"] for row in rows]
+            if not rows:
+                return results
+        attempts = max(row["attempts"] for row in rows) + 1
+        if error.permanent or attempts >= self.max_attempts:
+            return results + [(ids, error, None)]
+        return results + [(ids, error, self._retry_delay(attempts, error.retry_after))]
+
+    async def _save_result(self, conn, ids: List[int], error: Optional[DeliveryError],
+                           delay: Optional[float]) -> None:
+        """Записывает результат доставки в очередь."""
+        if error is None:
+            await self.outbox.mark_sent(conn, ids)
+        elif delay is None:
+            await self.outbox.mark_failed(conn, ids, str(error))
+            print(f"⚠️ Уведомления {ids} не доставлены: {error}")
+        else:
+            await self.outbox.mark_retry(conn, ids, delay, str(error))
+
+    def _retry_delay(self, attempts: int, retry_after: Optional[float] = None) -> float:
+        """Задержка перед повтором: экспоненциальная с разбросом или указанная получателем."""
+        if retry_after:
+            return retry_after
+        delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
@@ -0,0 +1,229 @@
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import snowballstemmer
+
+from temporal_parser import PATTERNS as DATE_PATTERNS
+
+METADATA_LIST_PATH = "models/prompts/metadata_list.txt"  # Как в embedding_db
+
+# Числительные: основная форма и косвенные ("тридцати", "сорока", "двухсот")
+NUMBER_WORDS = {
+    "ноль": 0, "нуля": 0, "один": 1, "одна": 1, "одно": 1, "одного": 1, "одной": 1, "одну": 1, "одним": 1,
+    "два": 2, "две": 2, "двух": 2, "двум": 2, "три": 3, "трех": 3, "трем": 3, "четыре": 4, "четырех": 4,
+    "пять": 5, "пяти": 5, "шесть": 6, "шести": 6, "семь": 7, "семи": 7, "восемь": 8, "восьми": 8,
+    "девять": 9, "девяти": 9, "десять": 10, "десяти": 10, "одиннадцать": 11, "одиннадцати": 11,
+    "двенадцать": 12, "двенадцати": 12, "тринадцать": 13, "тринадцати": 13, "четырнадцать": 14,
+    "четырнадцати": 14, "пятнадцать": 15, "пятнадцати": 15, "шестнадцать": 16, "шестнадцати": 16,
+    "семнадцать": 17, "семнадцати": 17, "восемнадцать": 18, "восемнадцати": 18, "девятнадцать": 19,
+    "девятнадцати": 19, "двадцать": 20, "двадцати": 20, "тридцать": 30, "тридцати": 30, "сорок": 40,
+    "сорока": 40, "пятьдесят": 50, "пятидесяти": 50, "шестьдесят": 60, "шестидесяти": 60, "семьдесят": 70,
+    "семидесяти": 70, "восемьдесят": 80, "восьмидесяти": 80, "девяносто": 90, "девяноста": 90,
+    "сто": 100, "ста": 100, "двести": 200, "двухсот": 200, "триста": 300, "трехсот": 300,
+    "четыреста": 400, "четырехсот": 400, "пятьсот": 500, "пятисот": 500, "шестьсот": 600, "шестисот": 600,
+    "семьсот": 700, "семисот": 700, "восемьсот": 800, "восьмисот": 800, "девятьсот": 900, "девятисот": 900,
+    "полтора": 1.5, "полторы": 1.5, "полутора": 1.5,
+}
+MULTIPLIERS = {"тыс": 1_000, "тысяча": 1_000, "тысячи": 1_000, "тысяч": 1_000, "тысячу": 1_000,
+               "млн": 1_000_000, "миллион": 1_000_000, "миллиона": 1_000_000, "миллионов": 1_000_000,
+               "млрд": 1_000_000_000, "миллиард": 1_000_000_000, "миллиарда": 1_000_000_000,
+               "миллиардов": 1_000_000_000}
+
+# Слова сравнения перед числом: оператор фильтра Chroma
+COMPARISONS = {
+    ("не", "меньше"): "$gte", ("не", "менее"): "$gte", ("не", "ниже"): "$gte", ("не", "дешевле"): "$gte",
+    ("как", "минимум"): "$gte", ("минимум",): "$gte", ("от",): "$gte",
+    ("не", "больше"): "$lte", ("не", "более"): "$lte", ("не", "выше"): "$lte", ("не", "дороже"): "$lte",
+    ("как", "максимум"): "$lte", ("максимум",): "$lte", ("до",): "$lte",
+    ("больше",): "$gt", ("более",): "$gt", ("свыше",): "$gt", ("выше",): "$gt", ("дороже",): "$gt",
+    ("старше",): "$gt", ("длиннее",): "$gt", ("тяжелее",): "$gt",
+    ("меньше",): "$lt", ("менее",): "$lt", ("ниже",): "$lt", ("дешевле",): "$lt",
+    ("младше",): "$lt", ("короче",): "$lt", ("легче",): "$lt",
+    ("ровно",): "$eq", ("равно",): "$eq", ("между",): "$gte",  # "между 5 и 10": второе число - $lte
+}
+# Служебные слова не бывают единицей, даже если совпадают с основой ("иена" - "и")
+FUNCTION_WORDS = {"и", "в", "во", "с", "со", "на", "по", "о", "об", "а", "к", "у", "от", "до", "за", "из"}
+
+# Сокращения и знаки единиц - полным названием из metadata_list.txt
+ABBREVIATIONS = [
+    (r"км\s*/\s*ч", " километр в час "), (r"м\s*/\s*с", " метр в секунду "),
+    (r"мм\s*рт\.?\s*ст", " миллиметр ртутного столба "),
+    (r"%", " процент "), (r"₽", " рубль "), (r"\$", " доллар "), (r"€", " евро "), (r"°", " градус "),
+]
+SHORT_UNITS = {
+    "шт": "штука", "чел": "человек", "руб": "рубль", "р": "рубль", "коп": "копейка", "долл": "доллар",
+    "кг": "килограмм", "г": "грамм", "гр": "грамм", "мг": "миллиграмм", "км": "километр", "м": "метр",
+    "см": "сантиметр", "мм": "миллиметр", "л": "литр", "мл": "миллилитр", "сек": "секунда", "мин": "минута",
+    "ч": "час", "ом": "ом", "кв": "квадратный", "куб": "кубический", "вт": "ватт", "квт": "киловатт", "ккал": "килокалория",
+    "кб": "килобайт", "мб": "мегабайт", "гб": "гигабайт", "тб": "терабайт", "гц": "герц", "ггц": "гигагерц",
+}
+# Слова, которые модель по правилам промпта search_filter сводит к единице из списка
+SYNONYMS = {
+    "копеек": "копейка", "дня": "день", "дней": "день", "лет": "год", "людей": "человек", "сотрудник": "человек",
+    "работник": "человек", "пачк": "штука", "упаковк": "штука", "коробк": "штука", "бутылк": "штука",
+    "оценк": "балл", "рейтинг": "балл", "мест": "номер", "ячейк": "номер", "бокс": "номер",
+}
+
+TOKEN = re.compile(r"\d+(?:[.,]\d+)?|\w+")
+TIME = re.compile(r"\b\d{1,2}:\d{2}\b")
+
+
+class QuantityParser:
+    """
+    Локальный разбор чисел и единиц измерения в поисковом запросе вместо модели search_filter.
+
+    Числа: цифрами и словами ("тридцать восемь", "две с половиной тысячи", "полтора"),
+    рубли с копейками сводятся к рублям. Слова сравнения перед числом ("больше",
+    "не меньше", "от ... до") задают оператор. Единица ищется после числа (или перед ним:
+    "полка 3") по словарю metadata_list.txt, слова сравниваются по основам (Snowball).
+    Даты, время и периоды ("1 апреля", "5:00", "за 3 дня") пропускаются - это фильтр дат.
+    """
+
+    def __init__(self, metadata_path: str = METADATA_LIST_PATH):
+        self._stemmer = snowballstemmer.stemmer("russian")
+        self._lock = threading.Lock()  # Стеммер не потокобезопасен
+        self.units: Dict[Tuple[str, ...], str] = {}  # (основы слов единицы): поле метаданных
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#") or ":" not in line:
+                    continue
+                field, description = (part.strip() for part in line.split(":", 1))
+                for unit in description.split(","):
+                    self.units.setdefault(self.stems(unit), field)  # Первое поле из списка ("градус" - температура)
+        self.longest = max(len(unit) for unit in self.units)
+
+    def stems(self, text: str) -> Tuple[str, ...]:
+        with self._lock:
+            return tuple(self._stemmer.stemWord(word) for word in TOKEN.findall(text.lower()))
+
+    def _word(self, word: str) -> str:
+        """Полное название единицы для сокращения или синонима."""
+        if word in SHORT_UNITS:
+            return SHORT_UNITS[word]
+        return next((unit for stem, unit in SYNONYMS.items() if word.startswith(stem)), word)
+
+    def unit_at(self, words: List[str], position: int) -> Tuple[Optional[str], int]:
+        """
+        Поле метаданных единицы, начинающейся с words[position], и число ее слов.
+        Служебные слова и слова короче 3 букв (кроме сокращений SHORT_UNITS) единицей не считаются.
+        """
+        first = words[position] if position < len(words) else ""
+        if first not in SHORT_UNITS and (len(first) < 3 or first in FUNCTION_WORDS):
+            return None, 0
+        stems = self.stems(" ".join(self._word(word) for word in words[position:position + self.longest]))
+        for size in range(min(self.longest, len(stems)), 0, -1):
+            if field := self.units.get(stems[:size]):
+                return field, size
+        return None, 0
+
+    @staticmethod
+    def _strip_dates(text: str) -> str:
+        """Заменяет даты, время и периоды пробелами."""
+        # "3.5 кг" шаблон даты не находит: без года месяц только из двух цифр ("03.05")
+        for name, pattern in (("time", TIME), *DATE_PATTERNS.items()):
+            if name != "day_part":
+                text = pattern.sub(lambda match: " " * len(match.group(0)), text)
+        return text
+
+    @staticmethod
+    def _number(words: List[str], position: int) -> Tuple[Optional[float], int]:
+        """
+        Число, начинающееся с words[position]: "2 тысячи 500", "сто двадцать три",
+        "два с половиной", "3,5".
+
+        :return: (число, число слов) или (None, 0)
+        """
+        total, current, place, end = 0.0, 0.0, None, position
+        while end < len(words):
+            word = words[end]
+            if word[0].isdigit() or word in NUMBER_WORDS:
+                value = float(word.replace(",", ".")) if word[0].isdigit() else NUMBER_WORDS[word]
+                # Следующее слово дополняет разряды числа ("сто двадцать"), иначе это новое число ("5 3")
+                if place is not None and value >= place:
+                    break
+                current += value
+                place = 10 ** (len(str(int(value))) - 1) if value >= 1 and value == int(value) else 1
+                while place > 1 and value % place:
+                    place //= 10
+                end += 1
+            elif word in MULTIPLIERS and end > position:
+                total += (current or 1) * MULTIPLIERS[word]
+                current, place = 0.0, MULTIPLIERS[word]
+                end += 1
+            elif word == "с" and words[end + 1:end + 2] == ["половиной"] and end > position:
+                current += 0.5
+                end += 2
+            else:
+                break
+        if end == position:
+            return None, 0
+        number = total + current
+        return (int(number) if number == int(number) else number), end - position
+
+    def parse(self, text: str) -> Optional[List[dict]]:
+        """
+        Фильтры метаданных по числам запроса в том же виде, что get_filter_response_llm.
+
+        :param text: поисковый запрос
+        :return: [{поле: {оператор: число}}], [] - чисел нет,
+            None - есть число, которое не удалось разобрать (нужна модель)
+        """
+        text = text.lower().replace("ё", "е")
+        for pattern, replacement in ABBREVIATIONS:
+            text = re.sub(pattern, replacement, text)
+        words = TOKEN.findall(self._strip_dates(text))
+
+        quantities = []  # [оператор, число, поле]
+        between = False  # Было "между N", следующее число после "и" - верхняя граница
+        position = 0
+        while position < len(words):
+            number, size = self._number(words, position)
+            if number is None:
+                position += 1
+                continue
+            operator = "$eq"
+            for phrase, phrase_operator in COMPARISONS.items():
+                if tuple(words[max(0, position - len(phrase)):position]) == phrase and len(phrase) <= position:
+                    operator = phrase_operator
+                    if len(phrase) == 2:
+                        break  # "не меньше" важнее "меньше"
+            if between and operator == "$eq" and words[position - 1:position] == ["и"]:
+                operator = "$lte"
+            between = words[position - 1:position] == ["между"]
+            position += size
+            field, unit_size = self.unit_at(words, position)
+            if field is None and position > size:
+                field, before = self.unit_at(words, position - size - 1)  # Единица перед числом: "полка 3"
+                if before != 1:
+                    field = None
+            position += unit_size
+
+            # Копейки после рублей: "15 рублей 50 копеек" - 15.5 рубля
+            if field == "money_rub_cop" and quantities and quantities[-1][2] == "money_rub" \
+                    and quantities[-1][0] == operator == "$eq":
+                quantities[-1][1] = round(quantities[-1][1] + number / 100, 2)
+                continue
+            # "больше 2 и меньше 5 кг", "от 5 и до 10 кг": единица у последнего числа
+            if field is not None:
+                for quantity in reversed(quantities):
+                    if quantity[2] is not None:
+                        break
+                    quantity[2] = field
+            quantities.append([operator, number, field])
+
+        if any(field is None for _, _, field in quantities):
+            return None  # Единица не определена - разбор модели по контексту
+        return [{field: {operator: number}} for operator, number, field in quantities]
+
+
+@lru_cache(maxsize=1)
+def _parser() -> QuantityParser:
+    return QuantityParser()
+
+
+def quantity_filters(text: str) -> Optional[List[dict]]:
+    """Фильтры метаданных по числам запроса, None - разобрать локально не удалось (см. QuantityParser.parse)."""
+    return _parser().parse(text)
@@ -0,0 +1,212 @@
+import re
+import ast
+import math
+import time
+import operator
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+
+from errors import FormulaError
+
+MAX_TEMPLATE_LENGTH = 20000  # Символов в тексте с формулами
+MAX_NODES = 5000  # Узлов во всех формулах текста
+MAX_ITEMS = 10000  # Чисел в списке
+MAX_NUMBER = 1e18  # Модуль любого результата, в том числе промежуточного
+MAX_EXPONENT = 64  # Модуль показателя степени
+MAX_DIGITS = 10  # Знаков округления
+MAX_WIDTH = 100  # Ширина поля и точность в формате вывода ("{x:>10.2f}")
+TIME_LIMIT = 0.1  # Сек. на вычисление всех формул текста
+
+Number = Union[int, float]
+Value = Union[Number, List[Number]]
+Part = Union[str, Tuple[ast.expr, int, str]]  # Текст или (формула, преобразование, формат)
+
+OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+             ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow}
+UNARY = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+FUNCTIONS = ("round", "abs", "int", "float", "sum", "min", "max", "len")
+CONVERSIONS = {-1: None, ord("s"): str, ord("r"): repr, ord("a"): ascii}
+# Формат вывода: [[заполнитель]выравнивание][знак][z][#][0][ширина][разделитель][.точность][тип]
+FORMAT_SPEC = re.compile(r"(?:.?[<>=^])?[+\- ]?z?#?0?(\d*)[,_]?(?:\.(\d+))?[bcdeEfFgGnosxX%]?", re.DOTALL)
+
+
+def _number(value) -> Number:
+    """Проверяет, что значение - конечное число в пределах MAX_NUMBER."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise FormulaError(f"ожидалось число, получено {type(value).__name__}")
+    if isinstance(value, float) and not math.isfinite(value) or abs(value) > MAX_NUMBER:
+        raise FormulaError("слишком большое число")
+    return value
+
+
+def _numbers(value) -> List[Number]:
+    """Проверяет, что значение - список чисел не длиннее MAX_ITEMS."""
+    if not isinstance(value, (list, tuple)):
+        raise FormulaError(f"ожидался список чисел, получено {type(value).__name__}")
+    if len(value) > MAX_ITEMS:
+        raise FormulaError("слишком длинный список")
+    return [_number(item) for item in value]
+
+
+def _validate(node: ast.expr) -> None:
+    """Формула - только числа, переменные, списки, арифметика и функции FUNCTIONS."""
+    for child in ast.walk(node):
+        if isinstance(child, ast.Constant):
+            _number(child.value)
+        elif isinstance(child, ast.Call):
+            if not isinstance(child.func, ast.Name) or child.func.id not in FUNCTIONS:
+                raise FormulaError(f"недопустимая функция {ast.unparse(child.func)}")
+            if child.keywords or any(isinstance(arg, ast.Starred) for arg in child.args):
+                raise FormulaError(f"недопустимые аргументы {child.func.id}")
+        elif isinstance(child, ast.BinOp):
+            if type(child.op) not in OPERATORS:
+                raise FormulaError(f"недопустимая операция {type(child.op).__name__}")
+        elif isinstance(child, ast.UnaryOp):
+            if type(child.op) not in UNARY:
+                raise FormulaError(f"недопустимая операция {type(child.op).__name__}")
+        elif not isinstance(child, (ast.Name, ast.List, ast.Tuple, ast.Load)) \
+                and type(child) not in OPERATORS and type(child) not in UNARY:
+            raise FormulaError(f"недопустимое выражение {type(child).__name__}")
+
+
+@lru_cache(maxsize=1024)
+def compile_template(template: str) -> Tuple[Part, ...]:
+    """
+    Разбирает текст с формулами в фигурных скобках (как f-строку) и проверяет формулы.
+    Разобранные тексты кэшируются: повторный ответ не разбирается заново.
+
+    :param template: текст ответа, например "Итого {round(sum([25, 3.5]), 2)} рублей"
+    :return: части: текст или (формула, преобразование !s/!r, формат после ":")
+    :raises FormulaError: синтаксическая ошибка, недопустимое выражение или превышен размер
+    """
+    if len(template) > MAX_TEMPLATE_LENGTH:
+        raise FormulaError("слишком длинный текст")
+    try:
+        tree = ast.parse("f" + repr(template), mode="eval").body
+    except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+        raise FormulaError(f"ошибка синтаксиса ({getattr(e, 'msg', e)})")
+    if sum(1 for _ in ast.walk(tree)) > MAX_NODES:
+        raise FormulaError("слишком длинная формула")
+
+    parts: List[Part] = []
+    for value in tree.values:
+        if isinstance(value, ast.Constant):
+            parts.append(value.value)
+            continue
+        _validate(value.value)
+        spec = ""
+        if value.format_spec is not None:
+            if not all(isinstance(item, ast.Constant) for item in value.format_spec.values):
+                raise FormulaError("формула в формате вывода")
+            spec = "".join(item.value for item in value.format_spec.values)
+            _check_spec(spec)
+        parts.append((value.value, value.conversion, spec))
+    return tuple(parts)
+
+
+def _check_spec(spec: str) -> None:
+    """Формат вывода - без вложенных полей, ширина и точность не больше MAX_WIDTH."""
+    match = FORMAT_SPEC.fullmatch(spec)
+    if match is None:
+        raise FormulaError(f"недопустимый формат {spec[:20]}")
+    if any(part and int(part) > MAX_WIDTH for part in match.groups()):
+        raise FormulaError("слишком широкий формат")
+
+
+def _call(name: str, args: list) -> Value:
+    if name == "round":
+        if len(args) not in (1, 2):
+            raise FormulaError("round: один или два аргумента")
+        digits = _number(args[1]) if len(args) == 2 else None
+        if digits is not None and (not isinstance(digits, int) or abs(digits) > MAX_DIGITS):
+            raise FormulaError("round: недопустимое число знаков")
+        return round(_number(args[0]), digits) if digits is not None else round(_number(args[0]))
+    if name in ("abs", "int", "float"):
+        if len(args) != 1:
+            raise FormulaError(f"{name}: один аргумент")
+        return {"abs": abs, "int": int, "float": float}[name](_number(args[0]))
+    if name in ("sum", "len"):
+        if len(args) != 1:
+            raise FormulaError(f"{name}: один аргумент - список")
+        values = _numbers(args[0])
+        return _number(math.fsum(values) if any(isinstance(v, float) for v in values) else sum(values)) \
+            if name == "sum" else len(values)
+    # min, max: список или несколько чисел
+    values = _numbers(args[0]) if len(args) == 1 else [_number(arg) for arg in args]
+    if not values:
+        raise FormulaError(f"{name}: пустой список")
+    return min(values) if name == "min" else max(values)
+
+
+def _evaluate(node: ast.expr, names: Dict[str, Value], deadline: float) -> Value:
+    """Вычисляет проверенную формулу без eval: каждый результат проверяется на размер."""
+    if time.perf_counter() > deadline:
+        raise FormulaError("превышено время вычисления")
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.Name):
+        if node.id not in names:
+            raise FormulaError(f"неизвестная переменная {node.id}")
+        return names[node.id]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return _numbers([_evaluate(item, names, deadline) for item in node.elts])
+    if isinstance(node, ast.UnaryOp):
+        return _number(UNARY[type(node.op)](_number(_evaluate(node.operand, names, deadline))))
+    if isinstance(node, ast.BinOp):
+        left = _number(_evaluate(node.left, names, deadline))
+        right = _number(_evaluate(node.right, names, deadline))
+        if isinstance(node.op, ast.Pow) and abs(right) > MAX_EXPONENT:
+            raise FormulaError("слишком большая степень")
+        try:
+            return _number(OPERATORS[type(node.op)](left, right))
+        except ZeroDivisionError:
+            raise FormulaError("деление на ноль")
+        except (OverflowError, ValueError, TypeError) as e:
+            raise FormulaError(str(e))
+    return _call(node.func.id, [_evaluate(arg, names, deadline) for arg in node.args])
+
+
+def _format(value: Value, conversion: int, spec: str) -> str:
+    convert = CONVERSIONS.get(conversion)
+    if convert is not None:
+        value = convert(value)
+    if spec:
+        try:
+            return format(value, spec)
+        except (ValueError, TypeError):
+            raise FormulaError(f"недопустимый формат {spec}")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # "12", а не "12.0"
+    return str(value)
+
+
+def render(template: str, names: Optional[Dict[str, Value]] = None, time_limit: float = TIME_LIMIT) -> str:
+    """
+    Подставляет в текст ответа модели результаты формул в фигурных скобках
+    вместо eval("f'" + текст + "'").
+
+    В формулах допускаются только числа, списки чисел, переменные names,
+    + - * / // % **, унарный минус и функции round, abs, int, float, sum, min, max, len.
+    Размер текста, формул, чисел, списков, ширина формата вывода и время вычисления ограничены.
+
+    :param template: текст ответа с формулами
+    :param names: переменные формул: число или список чисел (например, итоги записей ContextBuilder.aggregates)
+    :param time_limit: сек. на вычисление всех формул
+    :return: текст с результатами формул
+    :raises FormulaError: формула не прошла проверку или не вычислена
+    """
+    names = {name: (_numbers(value) if isinstance(value, (list, tuple)) else _number(value))
+             for name, value in (names or {}).items()}
+    deadline = time.perf_counter() + time_limit
+    out = []
+    for part in compile_template(template):
+        if isinstance(part, str):
+            out.append(part)
+            continue
+        node, conversion, spec = part
+        try:
+            value = _evaluate(node, names, deadline)
+        except RecursionError:
+            raise FormulaError("слишком глубокая вложенность")
+        out.append(_format(value, conversion, spec))
+    return "".join(out)
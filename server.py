@@ -0,0 +1,215 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Response
+from pydantic import BaseModel
+
+from user import user
+from commands import dispatch
+from errors import UserNotFoundError, QueryEmptyError, ModelAnswerError, ModelOverloadedError
+from warmup import warmup
+from config import (LANGSMITH_API_KEY, scheduler, delivery_worker, model_router, call_policy, single_flight,
+                    rate_governor, usage_meter, SERVER_HOST, SERVER_PORT, SERVER_CONCURRENCY, SERVER_QUEUE_SIZE,
+                    SERVER_REQUEST_TIMEOUT, SERVER_SHUTDOWN_TIMEOUT)
+
+if LANGSMITH_API_KEY:
+    os.environ["LANGCHAIN_API_KEY"] = LANGSMITH_API_KEY
+    os.environ["LANGCHAIN_PROJECT"] = "dev_organizer"
+    os.environ["LANGCHAIN_TRACING_V2"] = "true"
+
+
+class CommandExecutor:
+    """
+    Пул потоков для выполнения команд с ограничением очереди.
+
+    Одновременно выполняется `concurrency` команд, еще `queue_size` ждут
+    свободного потока. Если мест нет, команда не принимается (сервер отвечает 429).
+    Место освобождается только когда поток действительно закончил работу,
+    поэтому команды, превысившие таймаут, продолжают занимать место.
+    """
+
+    def __init__(self, concurrency: int, queue_size: int):
+        """
+        :param concurrency: количество потоков для выполнения команд
+        :param queue_size: количество команд, ожидающих свободного потока
+        """
+        self.capacity = concurrency + queue_size
+        self.in_flight = 0  # Принятые и еще не завершенные команды
+        self.accepting = True  # False после начала остановки сервера
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="command")
+
+    def submit(self, fn, *args) -> Optional[Future]:
+        """
+        Ставит команду в очередь.
+
+        :return: Future с результатом или None, если мест нет
+        """
+        with self._lock:
+            if not self.accepting or self.in_flight >= self.capacity:
+                return None
+            self.in_flight += 1
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Future) -> None:
+        """Освобождает место после завершения (или отмены) команды."""
+        with self._lock:
+            self.in_flight -= 1
+            self._idle.notify_all()
+
+    def shutdown(self, timeout: float) -> bool:
+        """
+        Прекращает прием команд и ждет завершения начатых.
+
+        :param timeout: сколько секунд ждать
+        :return: True, если все команды завершились
+        """
+        with self._lock:
+            self.accepting = False
+            finished = self._idle.wait_for(lambda: self.in_flight == 0, timeout=timeout)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        return finished
+
+
+class CommandRequest(BaseModel):
+    alice_id: str  # Идентификатор пользователя
+    text: str  # Запрос пользователя
+
+
+class CommandResponse(BaseModel):
+    answer: str
+
+
+executor = CommandExecutor(SERVER_CONCURRENCY, SERVER_QUEUE_SIZE)
+
+
+def run_command(alice_id: str, text: str) -> str:
+    """
+    Выполняет команду в потоке пула: загружает пользователя и передает запрос диспетчеру.
+    Объект `user` хранит данные отдельно для каждого потока.
+    """
+    user.load_by_alice_id(alice_id=alice_id)
+    try:
+        return str(dispatch(text))
+    except (ModelAnswerError, ModelOverloadedError) as e:
+        return str(e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Прогрев в фоне: сервер отвечает на /health и /ready, команды принимаются после прогрева
+    warmup.start()
+
+    # Запуск APScheduler
+    if not scheduler.running:
+        scheduler.start()
+    delivery_worker.start()  # Доставка уведомлений из очереди
+    print(f"✅ Сервер принимает команды: потоков {SERVER_CONCURRENCY}, очередь {SERVER_QUEUE_SIZE}")
+
+    yield
+
+    # Корректная остановка: новые команды не принимаются, начатые завершаются
+    print("✅ Остановка сервера, ожидание начатых команд")
+    finished = await asyncio.to_thread(executor.shutdown, SERVER_SHUTDOWN_TIMEOUT)
+    if not finished:
+        print(f"⚠️ Не все команды завершились за {SERVER_SHUTDOWN_TIMEOUT} сек.")
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    await asyncio.to_thread(delivery_worker.stop)
+
+
+app = FastAPI(title="Органайзер", lifespan=lifespan)
+
+
+@app.post("/command", response_model=CommandResponse)
+async def command(request: CommandRequest) -> CommandResponse:
+    """Определяет намерение пользователя и выполняет команду."""
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail=str(QueryEmptyError()))
+    if not warmup.ready.is_set():
+        raise HTTPException(status_code=503, detail="Сервер еще не готов, повторите запрос позже.",
+                            headers={"Retry-After": "5"})
+
+    future = executor.submit(run_command, request.alice_id, request.text)
+    if future is None:
+        if not executor.accepting:
+            raise HTTPException(status_code=503, detail="Сервер останавливается.")
+        raise HTTPException(status_code=429, detail="Сервер перегружен, повторите запрос позже.",
+                            headers={"Retry-After": "1"})
+
+    try:
+        answer = await asyncio.wait_for(asyncio.wrap_future(future), timeout=SERVER_REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Время выполнения команды истекло.")
+    except UserNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return CommandResponse(answer=answer)
+
+
+@app.get("/health")
+async def health() -> dict:
+    """Состояние сервера и загрузка пула команд."""
+    return {
+        "status": "ok" if executor.accepting else "stopping",
+        "in_flight": executor.in_flight,
+        "capacity": executor.capacity,
+        "ready": warmup.ready.is_set(),
+    }
+
+
+@app.get("/ready")
+async def ready(response: Response) -> dict:
+    """
+    Проверка готовности для балансировщика: 200 после прогрева, до этого 503.
+    В ответе длительность прогрева по этапам.
+    """
+    status = warmup.status()
+    if status["status"] != "ready" or not executor.accepting:
+        response.status_code = 503
+    return status
+
+
+@app.get("/models")
+async def models() -> dict:
+    """
+    Статистика выбора моделей (models/router.py): по каждому маршруту (промпту)
+    и модели - вызовы, отказы, p95 задержки, токены, стоимость и соответствие SLO.
+    Счетчики повторов и дублирующих запросов (models/call_policy.py),
+    объединенных одинаковых запросов (models/single_flight.py),
+    очередей и квот провайдера по моделям (models/rate_governor.py).
+    """
+    return {
+        "slo": {"p95_latency": model_router.slo_latency, "failure_rate": model_router.slo_failure_rate},
+        "routes": model_router.stats(),
+        "calls": call_policy.stats(),
+        "single_flight": single_flight.stats(),
+        "rate_limits": rate_governor.stats(),
+    }
+
+
+@app.get("/usage")
+async def usage(days: float = 7, by: str = "prompt_name", top: int = 10) -> dict:
+    """
+    Расход токенов, p95 задержки и стоимость вызовов модели (models/usage_meter.py):
+    суммы с момента запуска и отчет по таблице llm_usage за последние days дней.
+    """
+    try:
+        report = usage_meter.report(since=time.time() - days * 86400 if days else None, group_by=by, top=top)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"since_start": usage_meter.totals(), "report": report}
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host=SERVER_HOST, port=SERVER_PORT,
+                timeout_graceful_shutdown=int(SERVER_SHUTDOWN_TIMEOUT))
@@ -1,6 +1,7 @@
 import sqlite3
 import aiosqlite
 import threading
+from contextlib import contextmanager
 from typing import Any, Dict, List, Union, Optional
 
 class SQLiteClient:
@@ -38,6 +39,23 @@ class SQLiteClient:
         conn.commit()
         return result
 
+    @contextmanager
+    def transaction_sync(self):
+        """
+        Синхронная транзакция, которая сразу берет блокировку записи (BEGIN IMMEDIATE):
+        чтение и запись внутри не перемежаются с записью из других потоков и процессов.
+
+        :return: курсор соединения потока
+        """
+        conn = self._get_sync_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn.cursor()
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
     async def execute_async(self, query: str, params: Union[tuple, dict] = ()) -> List[Dict[str, Any]]:
         """Асинхронное выполнение SQL-запроса."""
         async with await self._get_async_connection() as conn:
@@ -0,0 +1,236 @@
+import re
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import pytz
+from dateutil.relativedelta import relativedelta
+from dateparser.search import search_dates
+
+USER_TIMEZONE = "Europe/Moscow"  # Как в services.get_current_time_and_weekday
+
+Period = Tuple[datetime, datetime]
+
+RELATIVE_DAYS = {"позавчера": -2, "вчера": -1, "сегодня": 0, "завтра": 1, "послезавтра": 2}
+NUMBER_WORDS = {
+    "один": 1, "одну": 1, "одного": 1, "два": 2, "две": 2, "двух": 2, "пару": 2, "три": 3, "трех": 3, "трёх": 3,
+    "четыре": 4, "четырех": 4, "четырёх": 4, "пять": 5, "пяти": 5, "шесть": 6, "шести": 6, "семь": 7, "семи": 7,
+    "восемь": 8, "восьми": 8, "девять": 9, "девяти": 9, "десять": 10, "десяти": 10,
+}
+UNITS = {"час": "hours", "ден": "days", "дн": "days", "недел": "weeks", "месяц": "months",
+         "год": "years", "лет": "years"}
+WEEKDAYS = {"понедельник": 0, "вторник": 1, "сред": 2, "четверг": 3, "пятниц": 4, "суббот": 5, "воскресень": 6}
+# Формы названий месяцев: "июнь", "июня", "июне"
+MONTHS = {"январ": 1, "феврал": 2, "март": 3, "апрел": 4, "ма": 5, "июн": 6, "июл": 7, "август": 8,
+          "сентябр": 9, "октябр": 10, "ноябр": 11, "декабр": 12}
+MONTH_FORMS = r"(январ[ьяе]|феврал[ьяе]|март[ае]?|апрел[ьяе]|ма[йяе]|июн[ьяе]|июл[ьяе]|август[ае]?|" \
+              r"сентябр[ьяе]|октябр[ьяе]|ноябр[ьяе]|декабр[ьяе])"
+# Части суток: (с часа, до часа)
+DAY_PARTS = {"утр": (6, 12), "дн": (12, 18), "вечер": (18, 24), "ноч": (0, 6)}
+
+NUMBER = r"(\d+|" + "|".join(NUMBER_WORDS) + r")"
+UNIT = r"(час(?:а|ов)?|день|дня|дней|недел[юиь]|недель|месяц(?:а|ев)?|год(?:а)?|лет)"
+PATTERNS = {
+    # "за неделю", "за последние 3 дня", "последние два месяца"
+    "last": re.compile(r"\b(?:за\s+(?:последн\w*\s+)?|последн(?:ие|ий|юю|их)\s+)" + NUMBER + r"?\s*" + UNIT + r"\b"),
+    "ago": re.compile(r"\b" + NUMBER + r"?\s*" + UNIT + r"\s+назад\b"),
+    "week": re.compile(r"\b(эт(?:ой|у|а)|текущ(?:ей|ую|ая)|прошл(?:ой|ую|ая)|последн(?:ей|юю|яя)|предыдущ(?:ей|ую|ая)|"
+                       r"следующ(?:ей|ую|ая))\s+недел[еиюя]\b"),
+    "month": re.compile(r"\b(эт(?:ом|от)|текущ(?:ем|ий)|прошл(?:ом|ый)|последн(?:ем|ий)|предыдущ(?:ем|ий)|"
+                        r"следующ(?:ем|ий))\s+месяц[еа]?\b"),
+    "year": re.compile(r"\b(эт(?:ом|от)|текущ(?:ем|ий)|прошл(?:ом|ый)|следующ(?:ем|ий))\s+год[уа]?\b"),
+    "weekday": re.compile(r"\b(?:в|во|за)\s+(?:(прошл\w*|эт\w*|следующ\w*)\s+)?"
+                          r"(понедельник|вторник|среду|четверг|пятницу|субботу|воскресенье)\b"),
+    # "15.06", "3.5.2024"; без года месяц только из двух цифр: "1.5 литра" - дробь, а не 1 мая
+    "date": re.compile(r"\b(\d{1,2})\.((?:0[1-9]|1[0-2])(?!\d)|\d{1,2}(?=\.(?:\d{2}|\d{4})\b))"
+                       r"(?:\.(\d{2}|\d{4}))?\b"),
+    "day_month": re.compile(r"\b(\d{1,2})(?:-?го)?\s+" + MONTH_FORMS + r"(?:\s+(\d{4}))?\b"),
+    "month_name": re.compile(r"\b(?:в|за)\s+" + MONTH_FORMS + r"(?:\s+(\d{4}))?\b"),
+    # "в 2023 году", "за 2023 год", "в 2024" (без слова "год" - только в конце фразы: "за 2000 рублей" не год)
+    "year_number": re.compile(r"\b(?:в|за)\s+(\d{4})(?:\s+год[уа]?\b|\s*(?=$|[,.;:!?]))"),
+    "relative_day": re.compile(r"\b(" + "|".join(RELATIVE_DAYS) + r")\b"),
+    "day_part": re.compile(r"\b(утром|утро|днем|вечером|вечер|ночью)\b"),
+}
+# Находка dateparser - дата, если в ней есть месяц, число через точку или "через"/"назад";
+# без них это длительность ("8 часов", "30 минут") или просто число
+DATE_CONTEXT = re.compile(r"\d[./-]\d|\b(?:янв|фев|мар|апр|ма[йяе]|июн|июл|авг|сен|окт|ноя|дек|через|назад)")
+FIRST_YEAR = 1970  # Годы вне FIRST_YEAR..текущий + YEARS_AHEAD считаются ошибкой разбора
+YEARS_AHEAD = 10
+REMINDER_WORDS = re.compile(r"напомина|напомни", re.IGNORECASE)
+
+
+def _number(value: Optional[str]) -> int:
+    if not value:
+        return 1
+    return int(value) if value.isdigit() else NUMBER_WORDS[value]
+
+
+def _unit(value: str) -> str:
+    return next(unit for stem, unit in UNITS.items() if value.startswith(stem))
+
+
+def _month(value: str) -> int:
+    return next(number for stem, number in MONTHS.items() if value.startswith(stem))
+
+
+def _day(moment: datetime) -> Period:
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return start, start + timedelta(days=1) - timedelta(seconds=1)
+
+
+def _span(start: datetime, length: relativedelta) -> Period:
+    """Промежуток от start длиной length (конец - последняя секунда)."""
+    return start, start + length - timedelta(seconds=1)
+
+
+def _shift(text: str) -> int:
+    """Смещение по слову: прошлый -1, следующий +1, этот 0."""
+    if text.startswith(("прошл", "последн", "предыдущ")):
+        return -1
+    if text.startswith("следующ"):
+        return 1
+    return 0
+
+
+def _sane_year(year: int, today: datetime) -> bool:
+    return FIRST_YEAR <= year <= today.year + YEARS_AHEAD
+
+
+def _localize(tz, moment: datetime) -> datetime:
+    """Полночь или время в часовом поясе пользователя (pytz учитывает переходы времени)."""
+    return tz.normalize(tz.localize(moment.replace(tzinfo=None)))
+
+
+def parse_period(text: str, now: Optional[datetime] = None, timezone: str = USER_TIMEZONE,
+                 prefer_past: bool = True) -> Optional[Period]:
+    """
+    Промежуток времени из русской фразы: "вчера", "на прошлой неделе",
+    "в пятницу вечером", "за последние 3 дня", "15 июня", "в мае 2024", "в 2023 году".
+
+    "Последняя неделя" - неделя перед текущей (как в промпте search.txt).
+    Даты без года и дни недели без уточнения относятся к прошлому (prefer_past),
+    так ищут заметки. Если правила не подошли, дата ищется через dateparser.
+
+    :param text: фраза
+    :param now: текущее время (по умолчанию - сейчас в часовом поясе пользователя)
+    :param timezone: часовой пояс пользователя
+    :param prefer_past: даты без года и дни недели - в прошлом
+    :return: (начало, конец) в часовом поясе пользователя или None, если дат нет
+    """
+    tz = pytz.timezone(timezone)
+    now = now.astimezone(tz) if now else datetime.now(tz)
+    text = text.lower().replace("ё", "е")
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    period = None
+
+    if match := PATTERNS["relative_day"].search(text):
+        period = _day(today + timedelta(days=RELATIVE_DAYS[match.group(1)]))
+    elif match := PATTERNS["ago"].search(text):
+        unit, count = _unit(match.group(2)), _number(match.group(1))
+        moment = now - relativedelta(**{unit: count})
+        period = _day(moment) if unit in ("days", "weeks") else (moment, now)
+    elif match := PATTERNS["week"].search(text):
+        monday = today - timedelta(days=today.weekday()) + timedelta(weeks=_shift(match.group(1)))
+        period = _span(monday, relativedelta(weeks=1))
+    elif match := PATTERNS["month"].search(text):
+        first = today.replace(day=1) + relativedelta(months=_shift(match.group(1)))
+        period = _span(first, relativedelta(months=1))
+    elif match := PATTERNS["year"].search(text):
+        first = today.replace(month=1, day=1) + relativedelta(years=_shift(match.group(1)))
+        period = _span(first, relativedelta(years=1))
+    elif match := PATTERNS["weekday"].search(text):
+        weekday = next(number for stem, number in WEEKDAYS.items() if match.group(2).startswith(stem))
+        shift = _shift(match.group(1) or "")
+        day = today - timedelta(days=today.weekday()) + timedelta(days=weekday, weeks=shift)
+        if not match.group(1):
+            # Без уточнения: ближайший такой день в прошлом (или в будущем)
+            if prefer_past and day > today:
+                day -= timedelta(weeks=1)
+            elif not prefer_past and day < today:
+                day += timedelta(weeks=1)
+        period = _day(day)
+    elif match := PATTERNS["date"].search(text):
+        period = _date_period(today, int(match.group(1)), int(match.group(2)), match.group(3), prefer_past)
+    elif match := PATTERNS["day_month"].search(text):
+        period = _date_period(today, int(match.group(1)), _month(match.group(2)), match.group(3), prefer_past)
+    elif match := PATTERNS["month_name"].search(text):
+        month, year = _month(match.group(1)), match.group(2)
+        first = today.replace(year=int(year) if year else today.year, month=month, day=1)
+        if not year and prefer_past and first > today:
+            first -= relativedelta(years=1)
+        period = _span(first, relativedelta(months=1))
+    elif match := PATTERNS["year_number"].search(text):
+        year = int(match.group(1))
+        if _sane_year(year, today):
+            period = _span(today.replace(year=year, month=1, day=1), relativedelta(years=1))
+    elif match := PATTERNS["last"].search(text):
+        unit, count = _unit(match.group(2)), _number(match.group(1))
+        period = (now - relativedelta(**{unit: count}), now)
+    else:
+        period = _dateparser_period(text, now, timezone, prefer_past)
+
+    if period is None:
+        return None
+
+    # Часть суток сужает один день: "вчера вечером"
+    start, end = period
+    if (match := PATTERNS["day_part"].search(text)) and end - start < timedelta(days=1):
+        first_hour, last_hour = next(hours for stem, hours in DAY_PARTS.items() if match.group(1).startswith(stem))
+        start = start.replace(hour=first_hour)
+        end = start.replace(hour=0) + timedelta(hours=last_hour) - timedelta(seconds=1)
+    return _localize(tz, start), _localize(tz, end)
+
+
+def _date_period(today: datetime, day: int, month: int, year: Optional[str], prefer_past: bool) -> Optional[Period]:
+    """День по числу, месяцу и (необязательно) году."""
+    try:
+        if year:
+            return _day(today.replace(year=int(year) + (2000 if len(year) == 2 else 0), month=month, day=day))
+        moment = today.replace(month=month, day=day)
+    except ValueError:
+        return None  # Нет такой даты
+    if prefer_past and moment > today:
+        moment -= relativedelta(years=1)
+    elif not prefer_past and moment < today:
+        moment += relativedelta(years=1)
+    return _day(moment)
+
+
+def _dateparser_period(text: str, now: datetime, timezone: str, prefer_past: bool) -> Optional[Period]:
+    """
+    День из первой даты, найденной dateparser. Принимаются только находки с числом и
+    признаком даты (DATE_CONTEXT) в разумных годах: на словах без чисел, длительностях
+    и отдельных числах dateparser часто ошибается, их лучше оставить модели.
+    """
+    found = search_dates(text, languages=["ru"], settings={
+        "RELATIVE_BASE": now.replace(tzinfo=None),
+        "TIMEZONE": timezone,
+        "PREFER_DATES_FROM": "past" if prefer_past else "future",
+    })
+    found = [moment for phrase, moment in found or []
+             if re.search(r"\d", phrase) and DATE_CONTEXT.search(phrase) and _sane_year(moment.year, now)]
+    if not found:
+        return None
+    return _day(found[0].replace(tzinfo=None))
+
+
+def date_filters(text: str, field: Optional[str] = None, now: Optional[datetime] = None,
+                 prefer_past: Optional[bool] = None) -> List[dict]:
+    """
+    Фильтр по датам для search_manager в том же виде, что строит модель (промпт search.txt),
+    дальше он преобразуется в timestamp через functions.transform_filters.
+
+    :param text: запрос пользователя
+    :param field: "datetime_create" или "datetime_reminder", None - по словам запроса
+    :param prefer_past: см. parse_period, None - заметки в прошлом, напоминания в будущем
+    :return: [{поле: {"$gte": ISO}}, {поле: {"$lte": ISO}}] или [], если дат нет
+    """
+    if field is None:
+        field = "datetime_reminder" if REMINDER_WORDS.search(text) else "datetime_create"
+    if prefer_past is None:
+        prefer_past = field != "datetime_reminder"
+    period = parse_period(text, now=now, prefer_past=prefer_past)
+    if period is None:
+        return []
+    start, end = period
+    return [{field: {"$gte": start.isoformat(timespec="seconds")}},
+            {field: {"$lte": end.isoformat(timespec="seconds")}}]
@@ -0,0 +1,185 @@
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import snowballstemmer
+
+# Служебные слова не несут смысла для поиска по словам ("не" меняет смысл: "не работает")
+STOP_WORDS = {
+    "и", "в", "во", "на", "с", "со", "по", "за", "к", "ко", "от", "до", "из", "у", "о", "об", "а", "но",
+    "или", "ни", "что", "как", "это", "то", "же", "ли", "бы", "для", "при", "про", "над", "под",
+}
+
+
+class TextIndex:
+    """
+    Инвертированный индекс текстов заметок в SQLite с ранжированием BM25.
+
+    Слова приводятся к нижнему регистру, "ё" заменяется на "е", окончания отсекаются
+    стеммером Snowball (русский и английский), поэтому "воду", "воды" и "вода" совпадают.
+    Поиск читает только списки документов для слов запроса (индекс по слову),
+    а не просматривает все заметки.
+
+    Индекс разделен по пользователям (поле "user" метаданных): статистика BM25
+    и поиск считаются по заметкам одного пользователя. Поиск можно ограничить
+    списком (поле "list_name").
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        """
+        :param path: файл SQLite
+        :param k1: насыщение частоты слова в BM25
+        :param b: влияние длины документа в BM25
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._stemmers = {"ru": snowballstemmer.stemmer("russian"), "en": snowballstemmer.stemmer("english")}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                user TEXT NOT NULL,
+                list_name TEXT,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings (doc_id);
+            CREATE INDEX IF NOT EXISTS idx_documents_user ON documents (user);
+        """)
+        self._conn.commit()
+
+    def terms(self, text: str) -> List[str]:
+        """Нормализованные основы слов текста (без служебных слов)."""
+        words = re.findall(r"\w+", text.lower().replace("ё", "е"))
+        out = []
+        for word in words:
+            if word in STOP_WORDS:
+                continue
+            stemmer = self._stemmers["en" if word.isascii() else "ru"]
+            out.append(stemmer.stemWord(word))
+        return out
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def add(self, ids: List[str], texts: List[str], metadatas: Iterable[Optional[Dict]]) -> None:
+        """
+        Добавляет (или заменяет) документы. Записи без пользователя не индексируются.
+        """
+        documents, postings = [], []
+        for doc_id, text, meta in zip(ids, texts, metadatas):
+            user = (meta or {}).get("user")
+            if user is None:
+                continue
+            terms = self.terms(text)
+            list_name = (meta or {}).get("list_name")
+            documents.append((doc_id, str(user), None if list_name is None else str(list_name), len(terms)))
+            postings += [(term, doc_id, tf) for term, tf in Counter(terms).items()]
+        if not documents:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM postings WHERE doc_id = ?", [(doc[0],) for doc in documents])
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (doc_id, user, list_name, length) VALUES (?, ?, ?, ?)", documents)
+            self._conn.executemany("INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)", postings)
+            self._conn.commit()
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM postings WHERE doc_id = ?", [(doc_id,) for doc_id in ids])
+            self._conn.executemany("DELETE FROM documents WHERE doc_id = ?", [(doc_id,) for doc_id in ids])
+            self._conn.commit()
+
+    def _postings(self, terms: List[str], user: Optional[str],
+                  list_name: Optional[str] = None) -> List[Tuple[str, str, int, int]]:
+        """:return: [(слово, doc_id, tf, длина документа)] для слов запроса"""
+        placeholders = ",".join("?" * len(terms))
+        sql = f"""
+            SELECT p.term, p.doc_id, p.tf, d.length FROM postings p
+            JOIN documents d ON d.doc_id = p.doc_id
+            WHERE p.term IN ({placeholders})
+        """
+        params = list(terms)
+        if user is not None:
+            sql += " AND d.user = ?"
+            params.append(str(user))
+        if list_name is not None:
+            sql += " AND d.list_name = ?"
+            params.append(str(list_name))
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def search(self, query: str, user: Optional[str] = None, limit: int = 20,
+               list_name: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Документы, содержащие слова запроса, по убыванию BM25.
+
+        :param user: искать только в заметках пользователя
+        :param list_name: искать только в заметках списка
+        :return: [(doc_id, оценка)]
+        """
+        terms = list(dict.fromkeys(self.terms(query)))
+        if not terms:
+            return []
+        rows = self._postings(terms, user, list_name)
+        if not rows:
+            return []
+
+        # Статистика BM25 - по тем же заметкам, что и поиск
+        conditions = [(field, str(value)) for field, value in (("user", user), ("list_name", list_name))
+                      if value is not None]
+        sql = "SELECT COUNT(*), SUM(length) FROM documents"
+        if conditions:
+            sql += " WHERE " + " AND ".join(f"{field} = ?" for field, _ in conditions)
+        with self._lock:
+            total, total_length = self._conn.execute(sql, [value for _, value in conditions]).fetchone()
+        average_length = (total_length or 0) / max(1, total) or 1
+
+        document_frequency = Counter(term for term, _, _, _ in rows)
+        scores: Dict[str, float] = {}
+        for term, doc_id, tf, length in rows:
+            idf = math.log(1 + (total - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            norm = tf + self.k1 * (1 - self.b + self.b * length / average_length)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def match(self, phrase: str, user: Optional[str] = None) -> Set[str]:
+        """
+        Документы, содержащие все слова фразы (с учетом словоформ).
+        Замена поиска подстроки `$contains` по всем заметкам.
+        """
+        terms = list(dict.fromkeys(self.terms(phrase)))
+        if not terms:
+            return set()
+        found: Dict[str, Set[str]] = {}
+        for term, doc_id, _, _ in self._postings(terms, user):
+            found.setdefault(doc_id, set()).add(term)
+        return {doc_id for doc_id, doc_terms in found.items() if len(doc_terms) == len(terms)}
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Объединение нескольких ранжированных списков (Reciprocal Rank Fusion):
+    оценка документа - сумма 1 / (k + место) по всем спискам.
+
+    :param rankings: списки id по убыванию релевантности
+    :param k: сглаживание, чем больше, тем меньше вес первых мест
+    :return: [(id, оценка)] по убыванию оценки
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,41 @@
+"""
+Отчет о расходе токенов, задержках и стоимости вызовов модели (таблица llm_usage).
+
+Запуск из корня проекта:
+    python usage_report.py                    # по промптам за 7 дней
+    python usage_report.py --by model --days 1
+    python usage_report.py --by user_id --top 20
+"""
+import time
+import argparse
+
+from config import usage_meter
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Расход токенов, задержки и стоимость вызовов модели")
+    parser.add_argument("--by", choices=["prompt_name", "model", "user_id"], default="prompt_name",
+                        help="группировка")
+    parser.add_argument("--days", type=float, default=7, help="за сколько последних дней, 0 - за все время")
+    parser.add_argument("--user", type=int, default=None, help="только вызовы пользователя (id)")
+    parser.add_argument("--top", type=int, default=10, help="строк в отчете")
+    args = parser.parse_args()
+
+    since = time.time() - args.days * 86400 if args.days else None
+    rows = usage_meter.report(since=since, user_id=args.user, group_by=args.by, top=args.top)
+    if not rows:
+        print("Нет вызовов за период")
+        return
+
+    print(f"{args.by:24} {'вызовы':>7} {'ошибки':>7} {'токены':>10} {'запрос':>10} {'ответ':>9} "
+          f"{'из кэша':>9} {'доля':>5} {'p95, с':>7} {'$':>9}")
+    for row in rows:
+        print(f"{str(row[args.by]):24} {row['calls']:7d} {row['errors']:7d} {row['tokens']:10d} "
+              f"{row['prompt_tokens']:10d} {row['completion_tokens']:9d} {row['cached_tokens']:9d} "
+              f"{row['cached_share']:5.2f} {row['p95_latency']:7.2f} {row['cost_usd']:9.4f}")
+    print(f"{'итого':24} {sum(row['calls'] for row in rows):7d} {'':7} {sum(row['tokens'] for row in rows):10d} "
+          f"{'':10} {'':9} {'':9} {'':5} {'':7} {sum(row['cost_usd'] for row in rows):9.4f}")
+
+
+if __name__ == "__main__":
+    main()
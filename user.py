@@ -1,12 +1,15 @@
+import threading
 from typing import Optional, Dict, Any
 from config import sql_db  # Импорт клиента БД
 from errors import UserNotFoundError
 
 
-class User:
+class User(threading.local):
     """
     Класс, представляющий пользователя в системе.
     Позволяет добавлять, загружать и управлять данными пользователя.
+    Данные хранятся отдельно для каждого потока, поэтому общий объект `user`
+    можно использовать при параллельной обработке запросов (server.py).
 
     Атрибуты:
         id (Optional[int]): Уникальный идентификатор пользователя.
@@ -65,6 +68,24 @@ class User:
         """
         return list(self.lists.keys())
 
+    def set_notification(self, transport: str, target: str = "") -> None:
+        """
+        Включает для пользователя доставку уведомлений транспортом (синхронно).
+        Если транспорт уже включен, меняет получателя.
+
+        Args:
+            transport (str): Имя транспорта ("telegram", "desktop", "webhook", "local").
+            target (str): Получатель: chat_id для Telegram, URL для вебхука.
+
+        Returns:
+            None
+        """
+        query = """
+        INSERT INTO user_notifications (user_id, transport, target) VALUES (?, ?, ?)
+        ON CONFLICT (user_id, transport) DO UPDATE SET target = excluded.target
+        """
+        self.db_client.execute_sync(query, (self.id, transport, target))
+
     async def add_user_async(self, name: str, telegram_id: Optional[str] = None,
                              alice_id: Optional[str] = None) -> None:
         """
@@ -114,6 +135,7 @@ class User:
             raise UserNotFoundError(alice_id)
 
         self.fill_data(results[0])
+        self.lists = {}  # Списки предыдущего пользователя потока не нужны
 
         for row in results:
             if row["list_name"]:
@@ -143,6 +165,7 @@ class User:
             return False
 
         self.fill_data(results[0])
+        self.lists = {}  # Списки предыдущего пользователя потока не нужны
 
         for row in results:
             if row["list_name"]:
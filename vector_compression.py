@@ -0,0 +1,200 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from errors import EmbeddingBackendError
+
+METHODS = ("none", "truncate", "pca")
+SIDECAR_DTYPES = ("float16", "int8")
+
+
+class VectorCompressor:
+    """
+    Линейное сжатие эмбеддингов: x -> (x - mean) @ components.T
+
+    Методы:
+        truncate - первые `dims` координат (Matryoshka-обрезка);
+        pca      - проекция на `dims` главных компонент, вычисленных на корпусе заметок.
+    Обрезка - частный случай проекции (единичные компоненты), поэтому
+    оба метода хранятся и применяются одинаково.
+    """
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, method: str):
+        """
+        :param mean: вектор среднего (полная размерность)
+        :param components: матрица проекции [dims x полная размерность]
+        :param method: метод, которым получена проекция
+        """
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+        self.method = method
+
+    @property
+    def dims(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def truncate(cls, full_dims: int, dims: int) -> "VectorCompressor":
+        return cls(np.zeros(full_dims), np.eye(dims, full_dims), "truncate")
+
+    @classmethod
+    def fit_pca(cls, vectors: np.ndarray, dims: int) -> "VectorCompressor":
+        """
+        Вычисляет главные компоненты. Векторов должно быть не меньше `dims`.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(mean, vt[:dims], "pca")
+
+    def transform(self, vectors) -> np.ndarray:
+        """Сжимает векторы [n x полная размерность] -> [n x dims]."""
+        return (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+
+    def save(self, path: str) -> None:
+        np.savez(path, mean=self.mean, components=self.components, method=self.method)
+
+    @classmethod
+    def load(cls, path: str) -> "VectorCompressor":
+        data = np.load(path)
+        return cls(data["mean"], data["components"], str(data["method"]))
+
+
+class CompressedEmbeddings(Embeddings):
+    """
+    Модель эмбеддингов для Chroma, возвращающая сжатые векторы.
+
+    Полные векторы, вычисленные в потоке, доступны через `full_vectors()`,
+    чтобы записать их в VectorSidecar без повторного вычисления.
+    """
+
+    def __init__(self, base: Embeddings, compressor: VectorCompressor):
+        self.base = base
+        self.compressor = compressor
+        self._local = threading.local()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        full = self.base.embed_documents(texts)
+        self._remember(texts, full)
+        return self.compressor.transform(full).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        full = self.base.embed_query(text)
+        self._remember([text], [full])
+        return self.compressor.transform([full])[0].tolist()
+
+    def _remember(self, texts: List[str], vectors: List[List[float]]) -> None:
+        cache = getattr(self._local, "full", None)
+        if cache is None or len(cache) > 1000:  # Векторы, которые никто не забрал, не копятся
+            cache = self._local.full = {}
+        cache.update(zip(texts, vectors))
+
+    def full_vectors(self, texts: List[str]) -> List[List[float]]:
+        """
+        Полные векторы текстов, вычисленных в этом потоке (забираются из кэша),
+        или вычисленные заново.
+        """
+        cache = getattr(self._local, "full", None) or {}
+        missing = [text for text in texts if text not in cache]
+        if missing:
+            cache.update(zip(missing, self.base.embed_documents(missing)))
+        vectors = [cache[text] for text in texts]
+        for text in texts:
+            cache.pop(text, None)
+        return vectors
+
+
+class VectorSidecar:
+    """
+    Полные векторы записей в компактном виде (SQLite рядом с Chroma) для точного
+    переранжирования кандидатов, найденных по сжатым векторам.
+
+    Форматы:
+        float16 - в 2 раза меньше float32, потеря точности незаметна для поиска;
+        int8    - в 4 раза меньше, скалярная квантизация с масштабом на вектор.
+    """
+
+    def __init__(self, path: str, dtype: str = "float16"):
+        """
+        :param path: файл SQLite
+        :param dtype: один из SIDECAR_DTYPES
+        """
+        self.path = path
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS vectors (id TEXT PRIMARY KEY, scale REAL, vector BLOB)")
+        self._conn.commit()
+
+    def _encode(self, vector) -> tuple:
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.dtype == "int8":
+            scale = float(np.abs(vector).max()) / 127 or 1.0
+            return scale, np.round(vector / scale).astype(np.int8).tobytes()
+        return 1.0, vector.astype(np.float16).tobytes()
+
+    def _decode(self, scale: float, blob: bytes) -> np.ndarray:
+        if self.dtype == "int8":
+            return np.frombuffer(blob, dtype=np.int8).astype(np.float32) * scale
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+
+    def put(self, ids: List[str], vectors: Iterable) -> None:
+        rows = [(id_, *self._encode(vector)) for id_, vector in zip(ids, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO vectors (id, scale, vector) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def get(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """:return: {id: вектор float32} для найденных id"""
+        rows = []
+        with self._lock:
+            for i in range(0, len(ids), 500):  # Не больше 500 параметров в запросе
+                chunk = ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows += self._conn.execute(f"SELECT id, scale, vector FROM vectors WHERE id IN ({placeholders})",
+                                           chunk).fetchall()
+        return {id_: self._decode(scale, blob) for id_, scale, blob in rows}
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM vectors WHERE id = ?", [(id_,) for id_ in ids])
+            self._conn.commit()
+
+
+def create_compressor(method: str, dims: int, path: str, base: Embeddings,
+                      fit_texts: Optional[List[str]] = None) -> Optional[VectorCompressor]:
+    """
+    Загружает сохраненную проекцию или создает новую.
+    Проекция фиксируется при первом создании: векторы в коллекции должны быть
+    сжаты одной и той же проекцией.
+
+    :param method: один из METHODS, "none" - без сжатия
+    :param dims: размерность сжатых векторов
+    :param path: файл проекции (.npz)
+    :param base: полная модель эмбеддингов
+    :param fit_texts: тексты для вычисления PCA
+    :return: проекция или None для "none"
+    """
+    if method == "none":
+        return None
+    if method not in METHODS:
+        raise EmbeddingBackendError(f"Неизвестный метод сжатия '{method}', доступны: {', '.join(METHODS)}.")
+    if os.path.exists(path):
+        return VectorCompressor.load(path)
+
+    fit_texts = list(dict.fromkeys(fit_texts or []))
+    if method == "pca" and len(fit_texts) >= dims:
+        print(f"✅ Вычисление PCA для сжатия векторов до {dims} на {len(fit_texts)} текстах")
+        compressor = VectorCompressor.fit_pca(np.array(base.embed_documents(fit_texts)), dims)
+    else:
+        if method == "pca":
+            # PCA не определен, если текстов меньше размерности
+            print(f"⚠️ Для PCA на {dims} измерений мало текстов ({len(fit_texts)}), используется обрезка")
+        compressor = VectorCompressor.truncate(len(base.embed_query("размерность")), dims)
+    compressor.save(path)
+    return compressor
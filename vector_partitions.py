@@ -0,0 +1,148 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from langchain_chroma import Chroma
+from langchain_core.embeddings import Embeddings
+
+
+def partition_key(where: Optional[Dict]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Пользователь и список из условия where: {"user": {"$eq": ...}} и {"list_name": {"$eq": ...}}
+    на верхнем уровне или внутри "$and".
+
+    :return: (user, list_name), None - условия нет
+    """
+    if not where:
+        return None, None
+    clauses = where["$and"] if "$and" in where else [where]
+    found = {}
+    for clause in clauses:
+        for field in ("user", "list_name"):
+            condition = clause.get(field)
+            if isinstance(condition, dict) and "$eq" in condition:
+                found[field] = str(condition["$eq"])
+            elif isinstance(condition, (str, int)):
+                found[field] = str(condition)
+    return found.get("user"), found.get("list_name")
+
+
+class PartitionedStore:
+    """
+    Записи Chroma, разложенные по коллекциям пользователей.
+
+    Заметки пользователя хранятся в коллекции `<prefix>_u<user>` (или, при разбиении
+    по спискам, `<prefix>_u<user>_l<хэш списка>`), записи без пользователя
+    (список метаданных) - в общей коллекции `<prefix>`. Поиск пользователя
+    обходит только его коллекции, а не заметки всех пользователей.
+
+    Коллекция выбирается по условию where ("user", "list_name"), поэтому
+    вызывающему коду ничего не нужно знать о разбиении. Открытые коллекции
+    держатся в LRU-кэше из `max_open` штук.
+    """
+
+    def __init__(self, client, embedding_function: Embeddings, prefix: str,
+                 partition_by_list: bool = False, max_open: int = 64):
+        """
+        :param client: клиент chromadb (PersistentClient)
+        :param embedding_function: модель эмбеддингов
+        :param prefix: имя общей коллекции и префикс коллекций пользователей
+        :param partition_by_list: отдельная коллекция на каждый список пользователя
+        :param max_open: сколько коллекций пользователей держать открытыми
+        """
+        self.client = client
+        self.embedding_function = embedding_function
+        self.prefix = prefix
+        self.partition_by_list = partition_by_list
+        self.max_open = max_open
+        self.shared = self._open_collection(prefix)
+
+        self._lock = threading.Lock()
+        self._open: "OrderedDict[str, Chroma]" = OrderedDict()
+        # chromadb 0.x возвращает имена, 1.x - объекты коллекций
+        self._names = {getattr(collection, "name", collection) for collection in client.list_collections()}
+        self._names = {name for name in self._names if name.startswith(f"{prefix}_u")}
+
+    @property
+    def names(self) -> List[str]:
+        """Имена существующих коллекций пользователей."""
+        with self._lock:
+            return sorted(self._names)
+
+    def _open_collection(self, name: str) -> Chroma:
+        return Chroma(client=self.client, collection_name=name, embedding_function=self.embedding_function)
+
+    def collection_name(self, user: Optional[str], list_name: Optional[str] = None) -> str:
+        """Имя коллекции для записи с такими пользователем и списком."""
+        if user is None:
+            return self.prefix
+        name = f"{self.prefix}_u{user}"
+        if self.partition_by_list and list_name:
+            name += "_l" + hashlib.md5(list_name.encode("utf-8")).hexdigest()[:12]
+        return name
+
+    def get(self, name: str) -> Chroma:
+        """Открывает коллекцию (создает, если ее нет), вытесняя давно не использованные."""
+        if name == self.prefix:
+            return self.shared
+        with self._lock:
+            store = self._open.get(name)
+            if store is not None:
+                self._open.move_to_end(name)
+                return store
+            store = self._open_collection(name)
+            self._names.add(name)
+            self._open[name] = store
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+            return store
+
+    def for_query(self, where: Optional[Dict]) -> List[Chroma]:
+        """
+        Коллекции, в которых нужно искать записи по условию where.
+        Несуществующие коллекции пользователя не создаются.
+        """
+        user, list_name = partition_key(where)
+        if user is None:
+            return [self.shared]
+        if not self.partition_by_list or list_name:
+            name = self.collection_name(user, list_name)
+            return [self.get(name)] if name in self._names else []
+        base = self.collection_name(user)
+        with self._lock:
+            names = sorted(name for name in self._names if name == base or name.startswith(base + "_l"))
+        return [self.get(name) for name in names]
+
+    def split(self, metadatas: List[Optional[Dict]]) -> Dict[str, List[int]]:
+        """
+        Раскладывает записи по коллекциям.
+
+        :return: {имя коллекции: [индексы записей]}
+        """
+        groups: Dict[str, List[int]] = {}
+        for i, meta in enumerate(metadatas):
+            meta = meta or {}
+            user = meta.get("user")
+            name = self.collection_name(None if user is None else str(user), meta.get("list_name"))
+            groups.setdefault(name, []).append(i)
+        return groups
+
+    def migrate_shared(self) -> None:
+        """
+        Переносит заметки пользователей из общей коллекции в их коллекции
+        (данные, записанные до разбиения). Векторы копируются без пересчета.
+        """
+        stored = self.shared.get(include=["embeddings", "documents", "metadatas"])
+        groups = {name: indexes for name, indexes in self.split(stored["metadatas"]).items() if name != self.prefix}
+        if not groups:
+            return
+        print(f"✅ Перенос {sum(map(len, groups.values()))} заметок в коллекции пользователей")
+        for name, indexes in groups.items():
+            self.get(name)._collection.upsert(
+                ids=[stored["ids"][i] for i in indexes],
+                embeddings=[stored["embeddings"][i] for i in indexes],
+                documents=[stored["documents"][i] for i in indexes],
+                metadatas=[stored["metadatas"][i] for i in indexes],
+            )
+            self.shared.delete(ids=[stored["ids"][i] for i in indexes])
@@ -0,0 +1,104 @@
+import time
+import threading
+from typing import Dict, Optional
+
+from config import preload, embedding_db, provider_client
+
+# Типичные запросы разной длины: модель и токенизатор прогреваются на реальных формах ввода
+WARMUP_QUERIES = [
+    "сколько я потратил на продукты",
+    "заправка на азс белнефть позавчера семьдесят два рубля",
+    "что лежит в кладовке на верхней полке",
+    "напомни завтра в девять утра позвонить маме",
+    "найди все заметки про ремонт машины за прошлый месяц, где расходы больше ста рублей",
+]
+METADATA_LIST_PATH = "models/prompts/metadata_list.txt"
+WARMUP_PROMPT = "query_parser"  # Первый промпт любого запроса (commands/dispatcher.py)
+
+
+class WarmUp:
+    """
+    Прогрев сервиса перед приемом запросов.
+
+    Создает сервисы (config.preload), вычисляет эмбеддинги типичных запросов
+    и названий единиц из metadata_list.txt, выполняет поиск в векторной БД
+    и один раз собирает промпт. После этого первый запрос пользователя
+    не ждет загрузки модели, инициализации пулов потоков и чтения файлов.
+
+    Готовность выставляется только после успешного прогрева.
+
+    Атрибуты:
+        ready (threading.Event): Прогрев завершен, можно принимать запросы.
+        durations (dict): Сек. на каждый этап прогрева.
+        error (Exception | None): Ошибка прогрева.
+    """
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.durations: Dict[str, float] = {}
+        self.error: Optional[Exception] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Запускает прогрев в фоновом потоке."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def run(self) -> bool:
+        """
+        Выполняет прогрев в текущем потоке.
+
+        :return: True, если прогрев успешен
+        """
+        try:
+            self._step("Сервисы", preload)
+            self._step("Эмбеддинги запросов", lambda: [embedding_db.embedding_model.embed_query(query)
+                                                        for query in WARMUP_QUERIES])
+            self._step("Эмбеддинги единиц", lambda: embedding_db.embedding_model.embed_documents(
+                [doc.page_content for doc in embedding_db.load_metadata_entries(METADATA_LIST_PATH)]))
+            self._step("Векторный поиск", lambda: embedding_db.vector_store.similarity_search_with_score(
+                query=WARMUP_QUERIES[0], k=1, filter={"system": "metadata_list"}))
+            if embedding_db.cross_encoder_name:
+                self._step("Переранжирование", lambda: embedding_db.get_cross_encoder().predict(
+                    [(WARMUP_QUERIES[0], WARMUP_QUERIES[1])]))
+            self._step("Промпт", lambda: provider_client.load_prompt(WARMUP_PROMPT))
+        except Exception as e:
+            self.error = e
+            print(f"⚠️ Ошибка прогрева, сервис не готов: {e!r}")
+            return False
+
+        self.ready.set()
+        print(f"✅ Прогрев завершен за {self.total:.2f} с: "
+              + ", ".join(f"{name} {seconds:.2f}" for name, seconds in self.durations.items()))
+        return True
+
+    def _step(self, name: str, fn) -> None:
+        """Выполняет этап прогрева и запоминает его длительность."""
+        started = time.perf_counter()
+        fn()
+        self.durations[name] = time.perf_counter() - started
+
+    @property
+    def total(self) -> float:
+        """Общая длительность прогрева, сек."""
+        return sum(self.durations.values())
+
+    def status(self) -> dict:
+        """Состояние прогрева для проверки готовности."""
+        if self.ready.is_set():
+            status = "ready"
+        elif self.error is not None:
+            status = "failed"
+        else:
+            status = "warming_up"
+        return {
+            "status": status,
+            "warmup_seconds": round(self.total, 3),
+            "steps": {name: round(seconds, 3) for name, seconds in self.durations.items()},
+            "error": repr(self.error) if self.error else None,
+        }
+
+
+warmup = WarmUp()